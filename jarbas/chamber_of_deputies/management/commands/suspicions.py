@@ -1,8 +1,11 @@
 import csv
+import io
 import lzma
 import os
 from concurrent.futures import ThreadPoolExecutor
 
+import pyarrow.parquet as pq
+import zstandard
 from bulk_update.helper import bulk_update
 from django.core.exceptions import ObjectDoesNotExist
 
@@ -36,17 +39,69 @@ class Command(LoadCommand):
         self.main()
         print('{:,} reimbursements updated.'.format(self.count))
 
+    EXTENSIONS = {'.xz': 'csv.xz', '.zst': 'csv.zst', '.parquet': 'parquet'}
+    MAGIC_NUMBERS = {
+        b'\xfd7zXZ\x00': 'csv.xz',
+        b'(\xb5/\xfd': 'csv.zst',
+        b'PAR1': 'parquet',
+    }
+
+    def file_format(self):
+        """
+        Detects the format of the suspicions dataset generated by Rosie: first
+        by the file extension, then by the first bytes of the file.
+        """
+        _, extension = os.path.splitext(self.path)
+        if extension in self.EXTENSIONS:
+            return self.EXTENSIONS[extension]
+
+        with open(self.path, 'rb') as file_handler:
+            header = file_handler.read(6)
+        for magic_number, file_format in self.MAGIC_NUMBERS.items():
+            if header.startswith(magic_number):
+                return file_format
+
+        raise ValueError('Unknown suspicions dataset format: {}'.format(self.path))
+
+    def csv_xz_rows(self):
+        with lzma.open(self.path, mode='rt', encoding='utf-8') as file_handler:
+            yield from csv.DictReader(file_handler)
+
+    def csv_zst_rows(self):
+        with open(self.path, 'rb') as compressed:
+            reader = zstandard.ZstdDecompressor().stream_reader(compressed)
+            with io.TextIOWrapper(reader, encoding='utf-8') as file_handler:
+                yield from csv.DictReader(file_handler)
+
+    def parquet_rows(self):
+        """Reads one row group at a time, with values as strings like CSV."""
+        dataset = pq.ParquetFile(self.path)
+        for index in range(dataset.num_row_groups):
+            columns = dataset.read_row_group(index).to_pydict()
+            for values in zip(*columns.values()):
+                yield {
+                    key: '' if value is None else str(value)
+                    for key, value in zip(columns.keys(), values)
+                }
+
+    def rows(self):
+        readers = {
+            'csv.xz': self.csv_xz_rows,
+            'csv.zst': self.csv_zst_rows,
+            'parquet': self.parquet_rows,
+        }
+        return readers[self.file_format()]()
+
     def suspicions(self):
         """Returns a Generator with batches of suspicions."""
         print('Loading suspicions dataset…', end='\r')
-        with lzma.open(self.path, mode='rt', encoding='utf-8') as file_handler:
-            batch = []
-            for row in csv.DictReader(file_handler):
-                batch.append(self.serialize(row))
-                if len(batch) >= self.batch_size:
-                    yield batch
-                    batch = []
-            yield batch
+        batch = []
+        for row in self.rows():
+            batch.append(self.serialize(row))
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        yield batch
 
     def serialize(self, row):
         """
@@ -1,6 +1,12 @@
+import os
+import shutil
 from io import StringIO
+from tempfile import mkdtemp
 from unittest.mock import Mock, call, patch
 
+import pyarrow as pa
+import pyarrow.parquet as pq
+import zstandard
 from django.test import TestCase
 
 from jarbas.chamber_of_deputies.management.commands.suspicions import Command
@@ -185,6 +191,74 @@ class TestFileLoader(TestCommand):
         self.assertEqual(42, serialize.call_count)
 
 
+class TestFileFormats(TestCommand):
+
+    def setUp(self):
+        super().setUp()
+        self.temp_path = mkdtemp()
+        self.command.batch_size = 10
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_path)
+
+    def write(self, name, contents):
+        path = os.path.join(self.temp_path, name)
+        with open(path, 'wb') as file_handler:
+            file_handler.write(contents)
+        return path
+
+    def test_file_format_by_extension(self):
+        for name, expected in (('suspicions.xz', 'csv.xz'),
+                               ('suspicions.zst', 'csv.zst'),
+                               ('suspicions.parquet', 'parquet')):
+            with self.subTest(name=name):
+                self.command.path = name
+                self.assertEqual(expected, self.command.file_format())
+
+    def test_file_format_by_magic_number(self):
+        for contents, expected in ((b'\xfd7zXZ\x00...', 'csv.xz'),
+                                   (b'(\xb5/\xfd...', 'csv.zst'),
+                                   (b'PAR1...', 'parquet')):
+            with self.subTest(expected=expected):
+                self.command.path = self.write('suspicions', contents)
+                self.assertEqual(expected, self.command.file_format())
+
+    def test_unknown_file_format(self):
+        self.command.path = self.write('suspicions.csv', b'document_id\n42\n')
+        with self.assertRaises(ValueError):
+            self.command.file_format()
+
+    @patch('jarbas.chamber_of_deputies.management.commands.suspicions.print')
+    def test_suspicions_from_csv_zst(self, print_):
+        csv = b'document_id,probability,meal_price_outlier\n42,0.5,True\n'
+        compressed = zstandard.ZstdCompressor().compress(csv)
+        self.command.path = self.write('suspicions.zst', compressed)
+        expected = [[{
+            'document_id': 42,
+            'probability': 0.5,
+            'suspicions': {'meal_price_outlier': True}
+        }]]
+        self.assertEqual(expected, list(self.command.suspicions()))
+
+    @patch('jarbas.chamber_of_deputies.management.commands.suspicions.print')
+    def test_suspicions_from_parquet(self, print_):
+        table = pa.Table.from_pydict({
+            'document_id': [42, 43],
+            'meal_price_outlier': [True, False],
+        })
+        self.command.path = os.path.join(self.temp_path, 'suspicions.parquet')
+        pq.write_table(table, self.command.path)
+        expected = [[
+            {
+                'document_id': 42,
+                'probability': None,
+                'suspicions': {'meal_price_outlier': True}
+            },
+            {'document_id': 43, 'probability': None, 'suspicions': None},
+        ]]
+        self.assertEqual(expected, list(self.command.suspicions()))
+
+
 class TestAddArguments(TestCase):
 
     def test_add_arguments(self):
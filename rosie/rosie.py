@@ -5,12 +5,22 @@ I'm a proof-of-concept for the usage of artificial intelligence for social
 control of public administration.
 
 Usage:
-  rosie.py run (chamber_of_deputies|federal_senate) [--output=<directory>]
+  rosie.py run (chamber_of_deputies|federal_senate) [--output=<directory>] [--jobs=<number>] [--incremental] [--profile=<file>] [--output-format=<format>] [--partitions=<number>] [--offline] [--only=<classifier>]
+  rosie.py serve (chamber_of_deputies|federal_senate) [--output=<directory>] [--offline] [--port=<number>] [--socket=<path>]
   rosie.py test [chamber_of_deputies|federal_senate|core]
 
 Options:
   --help                Show this screen
   --output=<directory>  Output directory [default: /tmp/serenata-data]
+  --jobs=<number>       Number of processes running classifiers [default: 1]
+  --incremental         Score only reimbursements new or changed since last run
+  --profile=<file>      Save a JSON report with time and memory of each step
+  --output-format=<format>  Suspicions file format: csv.xz, csv.zst or parquet [default: csv.xz]
+  --partitions=<number>  Run classifiers on this number of partitions of the dataset, one at a time
+  --offline             Use previously downloaded datasets, with no network access
+  --only=<classifier>   Run just this classifier, updating its column in the existing suspicions file
+  --port=<number>       Local TCP port where reimbursements are scored [default: 8000]
+  --socket=<path>       Unix socket where reimbursements are scored (instead of a port)
 """
 import os
 import unittest
@@ -29,9 +39,16 @@ def get_module(arguments):
             return module
 
 
-def run(module, directory):
+def run(module, directory, jobs=1, incremental=False, profile=None,
+        output_format='csv.xz', partitions=None, offline=False, only=None):
     module = getattr(rosie, module)
-    module.main(directory)
+    module.main(directory, jobs, incremental, profile, output_format, partitions,
+                offline, only)
+
+
+def serve(module, directory, offline=False, port=None, socket=None):
+    module = getattr(rosie, module)
+    module.serve(directory, offline, port, socket)
 
 
 def test(module=None):
@@ -57,7 +74,26 @@ def main():
 
     if arguments['run']:
         module = module if module != 'core' else None
-        run(module, arguments['--output'])
+        run(
+            module,
+            arguments['--output'],
+            int(arguments['--jobs']),
+            arguments['--incremental'],
+            arguments['--profile'],
+            arguments['--output-format'],
+            int(arguments['--partitions'] or 0),
+            arguments['--offline'],
+            arguments['--only']
+        )
+
+    if arguments['serve']:
+        serve(
+            module,
+            arguments['--output'],
+            arguments['--offline'],
+            int(arguments['--port']),
+            arguments['--socket']
+        )
 
 
 if __name__ == '__main__':
@@ -0,0 +1,132 @@
+"""
+Times `fit`, `transform` and `predict` of each Chamber of Deputies classifier
+and the whole Rosie pipeline (`rosie.core.Core`) on synthetic datasets (see
+`rosie.benchmarks.synthetic`), with no need of network access. Results are
+saved as JSON and can be compared with the ones of a previous run.
+
+Usage:
+  chamber_of_deputies.py [<rows>...] [--output=<file>] [--compare=<file>] [--seed=<number>]
+
+Options:
+  --help             Show this screen
+  --output=<file>    JSON file to save the results to [default: benchmarks.json]
+  --compare=<file>   JSON file with the results of a previous run
+  --seed=<number>    Seed of the synthetic dataset generator [default: 42]
+
+The default sizes are 100,000, 1,000,000 and 10,000,000 rows. Memory figures
+are the peak of the process so far (they never decrease), thus run a single
+size to measure its memory usage.
+"""
+import json
+import os
+import platform
+import shutil
+from collections import namedtuple
+from tempfile import mkdtemp
+
+import numpy as np
+import pandas as pd
+import sklearn
+from docopt import docopt
+
+from rosie.benchmarks.synthetic import chamber_of_deputies
+from rosie.chamber_of_deputies import settings
+from rosie.core import Core
+from rosie.core.profiling import Profiler
+
+SIZES = (100000, 1000000, 10000000)
+
+SyntheticAdapter = namedtuple('SyntheticAdapter', ('dataset', 'path'))
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'scikit-learn': sklearn.__version__,
+    }
+
+
+def benchmark_classifiers(core, profiler):
+    rows = len(core.dataset)
+    for name, classifier in settings.CLASSIFIERS.items():
+        print(f'  {name}')
+        dataset = core.project(classifier)
+        model = classifier()
+        with profiler('classifier', 'fit', classifier.__name__, rows):
+            model.fit(dataset)
+        with profiler('classifier', 'transform', classifier.__name__, rows):
+            model.transform(dataset)
+        with profiler('classifier', 'predict', classifier.__name__, rows) as step:
+            step['rows_out'] = len(model.predict(dataset))
+
+
+def benchmark_core(core, profiler):
+    print('  core')
+    with profiler('core', 'run', rows_in=len(core.dataset)) as step:
+        core()
+        step['rows_out'] = len(core.suspicions)
+
+
+def benchmark(rows, seed, profiler):
+    with profiler('dataset', 'generate', rows_in=rows) as step:
+        dataset = chamber_of_deputies(rows, seed)
+        step['rows_out'] = len(dataset)
+
+    directory = mkdtemp()
+    try:
+        adapter = SyntheticAdapter(dataset, directory)
+        benchmark_classifiers(Core(settings, adapter), profiler)
+        benchmark_core(Core(settings, adapter), profiler)
+    finally:
+        shutil.rmtree(directory)
+
+
+def key(step):
+    name = step.get('classifier') or step.get('feature') or ''
+    return step['stage'], step['step'], name, step['rows_in']
+
+
+def compare(steps, path):
+    with open(path) as fobj:
+        previous = {key(step): step for step in json.load(fobj)['steps']}
+
+    print(f'\nWall time compared to {path}:')
+    for step in steps:
+        if key(step) not in previous:
+            continue
+        stage, name, subject, rows = key(step)
+        before, after = previous[key(step)]['wall_time'], step['wall_time']
+        ratio = after / before if before else float('inf')
+        label = f'{subject or stage} {name}'
+        print(f'{rows:>12,} {label:<40} {before:>10.3f}s {after:>10.3f}s {ratio:>7.2f}x')
+
+
+def main(sizes=SIZES, output='benchmarks.json', previous=None, seed=42):
+    profiler = Profiler()
+    for rows in sizes:
+        print(f'Benchmarking {rows:,} rows…')
+        benchmark(rows, seed, profiler)
+
+    report = profiler.report()
+    report['environment'] = environment()
+    report['seed'] = seed
+    with open(output, 'w') as fobj:
+        json.dump(report, fobj, indent=2)
+    print(f'Results saved to {output}')
+
+    if previous:
+        compare(profiler.steps, previous)
+
+
+if __name__ == '__main__':
+    arguments = docopt(__doc__)
+    main(
+        tuple(map(int, arguments['<rows>'])) or SIZES,
+        arguments['--output'],
+        arguments['--compare'],
+        int(arguments['--seed'])
+    )
@@ -0,0 +1,65 @@
+"""
+Compares IrregularCompaniesClassifier's vectorized date comparison with the
+previous row by row `DataFrame.apply` on a synthetic dataset:
+
+    $ python -m rosie.benchmarks.irregular_companies [<rows>]
+
+The default is 5,000,000 rows (around the size of the merged Chamber of
+Deputies dataset).
+"""
+import sys
+from timeit import default_timer
+
+import numpy as np
+import pandas as pd
+
+from rosie.chamber_of_deputies.classifiers import IrregularCompaniesClassifier
+
+SITUATIONS = ('ABERTA', 'ATIVA', 'BAIXADA', 'NULA', 'SUSPENSA', 'INAPTA')
+
+
+def synthetic_dataset(rows, seed=42):
+    random = np.random.RandomState(seed)
+    start = np.datetime64('2009-01-01')
+    days = np.timedelta64(1, 'D')
+    issue_date = start + random.randint(0, 3650, rows) * days
+    situation_date = start + random.randint(0, 3650, rows) * days
+    situation_date[random.rand(rows) < .05] = np.datetime64('NaT')
+    return pd.DataFrame({
+        'issue_date': issue_date,
+        'situation': random.choice(SITUATIONS, rows, p=(.8, .1, .04, .02, .02, .02)),
+        'situation_date': situation_date,
+    })
+
+
+def row_by_row(X):
+    """The previous implementation of IrregularCompaniesClassifier.predict."""
+    statuses = ['BAIXADA', 'NULA', 'SUSPENSA', 'INAPTA']
+    outdated = X.apply(lambda row: row['situation_date'] < row['issue_date'],
+                       axis=1)
+    return np.r_[outdated & X['situation'].isin(statuses)]
+
+
+def timed(function, *args):
+    start = default_timer()
+    result = function(*args)
+    return result, default_timer() - start
+
+
+def main(rows=5000000):
+    print(f'Generating {rows:,} rows…')
+    dataset = synthetic_dataset(rows)
+
+    classifier = IrregularCompaniesClassifier()
+    vectorized, vectorized_time = timed(classifier.predict, dataset)
+    print(f'Vectorized: {vectorized_time:.2f}s')
+
+    previous, previous_time = timed(row_by_row, dataset)
+    print(f'Row by row: {previous_time:.2f}s')
+
+    assert np.array_equal(previous, vectorized), 'Predictions differ'
+    print(f'Same predictions, {previous_time / vectorized_time:,.0f}x faster')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
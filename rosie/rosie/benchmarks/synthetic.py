@@ -0,0 +1,164 @@
+"""
+Seeded generator of synthetic Chamber of Deputies datasets, with the same
+columns and data types as the prepared dataset from
+`rosie.chamber_of_deputies.adapter.Adapter` (reimbursements merged with
+companies, with the data types compacted by `Adapter.compact_dtypes`, i.e.
+without text columns no classifier reads, low cardinality text columns as
+categoricals and integer ids as int32) and roughly the same distributions:
+
+* subquotas (categories) in about the proportions of the real data, meals
+  included;
+* recipients are companies (valid CNPJs), people (valid CPFs) or invalid
+  documents; a few companies concentrate most of the expenses;
+* company data (coordinates around state capitals, situation, legal entity)
+  is the same in every row of a company and missing for people;
+* a small share of party expenses (`is_party_expense`).
+"""
+import numpy as np
+import pandas as pd
+
+from rosie.core.classifiers.invalid_cnpj_cpf_classifier import CNPJ_WEIGHTS, CPF_WEIGHTS
+
+SUBQUOTAS = (  # number, description, share of the reimbursements
+    ('1', 'Maintenance of office supporting parliamentary activity', .08),
+    ('3', 'Fuels and lubricants', .27),
+    ('4', 'Consultancy, research and technical work', .02),
+    ('5', 'Publicity of parliamentary activity', .04),
+    ('8', 'Security service provided by specialized company', .005),
+    ('9', 'Flight tickets', .01),
+    ('10', 'Telecommunication', .12),
+    ('11', 'Postal services', .04),
+    ('12', 'Publication subscriptions', .02),
+    ('13', 'Meal', .12),
+    ('14', 'Lodging, except for congressperson from Distrito Federal', .04),
+    ('119', 'Aircraft renting or charter of aircraft', .005),
+    ('120', 'Automotive vehicle renting or charter', .04),
+    ('122', 'Taxi, toll and parking', .07),
+    ('137', 'Participation in course, talk or similar event', .005),
+    ('999', 'Flight ticket issue', .115),
+)
+DOCUMENT_TYPES = ('bill_of_sale', 'simple_receipt', 'expense_made_abroad')
+CAPITALS = (  # state, latitude, longitude
+    ('AC', -9.97, -67.81), ('AL', -9.67, -35.74), ('AM', -3.12, -60.02),
+    ('BA', -12.97, -38.50), ('CE', -3.73, -38.52), ('DF', -15.79, -47.88),
+    ('ES', -20.32, -40.34), ('GO', -16.69, -49.26), ('MA', -2.53, -44.30),
+    ('MG', -19.92, -43.94), ('MS', -20.47, -54.62), ('MT', -15.60, -56.10),
+    ('PA', -1.46, -48.50), ('PB', -7.12, -34.86), ('PE', -8.05, -34.88),
+    ('PI', -5.09, -42.80), ('PR', -25.43, -49.27), ('RJ', -22.91, -43.17),
+    ('RN', -5.79, -35.21), ('RO', -8.76, -63.90), ('RR', 2.82, -60.67),
+    ('RS', -30.03, -51.23), ('SC', -27.60, -48.55), ('SE', -10.91, -37.07),
+    ('SP', -23.55, -46.63), ('TO', -10.18, -48.33),
+)
+SITUATIONS = ('ATIVA', 'BAIXADA', 'SUSPENSA', 'INAPTA', 'NULA')
+LEGAL_ENTITIES = (
+    '206-2 - SOCIEDADE EMPRESARIA LIMITADA',
+    '213-5 - EMPRESARIO (INDIVIDUAL)',
+    '230-5 - EMPRESA INDIVIDUAL DE RESPONSABILIDADE LIMITADA (DE NATUREZA EMPRESARIA)',
+    '205-4 - SOCIEDADE ANONIMA FECHADA',
+    '409-0 - CANDIDATO A CARGO POLITICO ELETIVO',
+)
+STARTING_YEAR, LAST_YEAR = 2009, 2018
+
+
+def documents(random, size, weights):
+    """Random documents (CNPJ or CPF, given its weights) with valid check digits."""
+    length = len(weights[0])
+    digits = random.randint(0, 10, (size, length + 2))
+    for position, weight in enumerate(weights):
+        remainder = (digits[:, :len(weight)] * weight).sum(axis=1) % 11
+        digits[:, length + position] = np.where(remainder < 2, 0, 11 - remainder)
+    return np.array([''.join(map(str, row)) for row in digits], dtype=object)
+
+
+def companies(random, size):
+    """Recipients: mostly companies, some people and a few invalid documents."""
+    kind = random.choice(3, size, p=(.85, .12, .03))
+    recipient_id = documents(random, size, CNPJ_WEIGHTS)
+    recipient_id[kind == 1] = documents(random, (kind == 1).sum(), CPF_WEIGHTS)
+    recipient_id[kind == 2] = random.randint(1, 10 ** 9, (kind == 2).sum()).astype(str)
+
+    capital = random.randint(0, len(CAPITALS), size)
+    _, latitude, longitude = (np.array(values) for values in zip(*CAPITALS))
+    is_company = kind == 0
+    has_coordinates = is_company & (random.rand(size) < .9)
+    days = random.randint(0, 365 * 12, size) * np.timedelta64(1, 'D')
+
+    df = pd.DataFrame({
+        'recipient_id': recipient_id,
+        'recipient': np.where(
+            random.rand(size) < .05,
+            'HOTEL ' + pd.Series(np.arange(size)).astype(str),
+            'EMPRESA ' + pd.Series(np.arange(size)).astype(str),
+        ),
+        'cnpj': np.where(is_company, recipient_id, None),
+        'situation': random.choice(SITUATIONS, size, p=(.91, .05, .02, .015, .005)),
+        'situation_date': np.datetime64('2007-01-01') + days,
+        'legal_entity': random.choice(LEGAL_ENTITIES, size, p=(.5, .3, .14, .055, .005)),
+        'latitude': latitude[capital] + random.normal(0, .5, size),
+        'longitude': longitude[capital] + random.normal(0, .5, size),
+    })
+    company_columns = ['cnpj', 'situation', 'situation_date', 'legal_entity']
+    df.loc[~is_company, company_columns] = None
+    df.loc[~has_coordinates, ['latitude', 'longitude']] = np.nan
+    return df
+
+
+def chamber_of_deputies(rows, seed=42):
+    """A synthetic prepared Chamber of Deputies dataset with `rows` rows."""
+    random = np.random.RandomState(seed)
+
+    numbers, descriptions, shares = zip(*SUBQUOTAS)
+    subquota = random.choice(len(SUBQUOTAS), rows, p=np.array(shares) / sum(shares))
+    is_meal = np.array(descriptions)[subquota] == 'Meal'
+
+    applicants = min(max(rows // 2000, 10), 1500)
+    applicant_id = random.randint(0, applicants, rows)
+    is_party_expense = applicant_id < max(applicants // 50, 1)
+
+    # a few companies concentrate most of the expenses
+    recipients = companies(random, min(max(rows // 20, 50), 500000))
+    popularity = random.lognormal(0, 1.5, len(recipients))
+    recipient = random.choice(len(recipients), rows, p=popularity / popularity.sum())
+    recipients = recipients.iloc[recipient].reset_index(drop=True)
+
+    days = (np.datetime64(f'{LAST_YEAR + 1}-01-01') -
+            np.datetime64(f'{STARTING_YEAR}-01-01')).astype(int)
+    issue_date = np.datetime64(f'{STARTING_YEAR}-01-01') + \
+        random.randint(0, days, rows) * np.timedelta64(1, 'D')
+    issue_date = pd.DatetimeIndex(issue_date)
+
+    net_value = np.where(
+        is_meal,
+        random.lognormal(3.7, .7, rows),
+        random.lognormal(5, 1.2, rows)
+    ).round(2)
+
+    df = pd.DataFrame({
+        'year': issue_date.year,
+        'applicant_id': applicant_id,
+        'document_id': random.permutation(rows) + 1000000,
+        'net_value': net_value,
+        'subquota_number': np.array(numbers)[subquota],
+        'category': np.array(descriptions)[subquota],
+        'recipient': recipients['recipient'],
+        'recipient_id': recipients['recipient_id'],
+        'document_type': pd.Categorical.from_codes(
+            random.choice(3, rows, p=(.7, .27, .03)),
+            categories=DOCUMENT_TYPES
+        ),
+        'issue_date': issue_date,
+        'document_value': net_value,
+        'remark_value': 0.,
+        'month': issue_date.month,
+        'situation': recipients['situation'],
+        'situation_date': recipients['situation_date'],
+        'legal_entity': recipients['legal_entity'],
+        'latitude': recipients['latitude'],
+        'longitude': recipients['longitude'],
+        'is_party_expense': is_party_expense,
+    })
+    for column in ('applicant_id', 'document_id', 'month', 'year'):
+        df[column] = df[column].astype(np.int32)
+    for column in ('category', 'legal_entity', 'recipient', 'situation', 'subquota_number'):
+        df[column] = df[column].astype('category')
+    return df
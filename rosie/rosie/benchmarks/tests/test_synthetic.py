@@ -0,0 +1,50 @@
+from unittest import TestCase
+
+import pandas as pd
+
+from rosie.benchmarks.synthetic import chamber_of_deputies
+from rosie.chamber_of_deputies import settings
+from rosie.chamber_of_deputies.adapter import Adapter
+from rosie.core.classifiers import valid_cnpj_cpf
+
+
+class TestSynthetic(TestCase):
+
+    def setUp(self):
+        self.dataset = chamber_of_deputies(5000)
+
+    def test_size(self):
+        self.assertEqual(5000, len(self.dataset))
+
+    def test_same_dataset_for_the_same_seed(self):
+        pd.testing.assert_frame_equal(self.dataset, chamber_of_deputies(5000))
+        other = chamber_of_deputies(5000, seed=13)
+        self.assertFalse(self.dataset['net_value'].equals(other['net_value']))
+
+    def test_columns_declared_by_classifiers(self):
+        for name, classifier in settings.CLASSIFIERS.items():
+            with self.subTest(name=name):
+                for column in classifier.COLS:
+                    self.assertIn(column, self.dataset.columns)
+        for column in settings.UNIQUE_IDS:
+            self.assertIn(column, self.dataset.columns)
+
+    def test_same_schema_as_the_compacted_dataset(self):
+        compacted = self.dataset.copy()
+        Adapter('/tmp').compact_dtypes(compacted)
+        self.assertEqual(list(compacted.columns), list(self.dataset.columns))
+        pd.testing.assert_series_equal(compacted.dtypes, self.dataset.dtypes)
+
+    def test_mostly_valid_recipient_ids(self):
+        valid = valid_cnpj_cpf(self.dataset['recipient_id'])
+        self.assertGreater(valid.mean(), .9)
+        self.assertLess(valid.mean(), 1)
+
+    def test_company_data_is_missing_for_people(self):
+        is_cpf = self.dataset['recipient_id'].str.len() == 11
+        self.assertTrue(self.dataset.loc[is_cpf, 'situation'].isnull().all())
+        self.assertTrue(self.dataset.loc[~is_cpf, 'situation'].notnull().any())
+
+    def test_meals(self):
+        meals = (self.dataset['category'] == 'Meal').mean()
+        self.assertAlmostEqual(.12, meals, delta=.02)
@@ -1,21 +1,36 @@
+import json
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
 from pathlib import Path
 from re import match
+from time import perf_counter
 
 import numpy as np
 import pandas as pd
-from urllib.error import HTTPError
+from urllib.error import HTTPError, URLError
 
-from serenata_toolbox.chamber_of_deputies.reimbursements import Reimbursements
-from serenata_toolbox.datasets import fetch
+from serenata_toolbox.chamber_of_deputies.reimbursements import (
+    URL,
+    Reimbursements,
+    extract_zip,
+)
+from serenata_toolbox.datasets.downloader import Downloader
+
+from rosie.chamber_of_deputies import settings
+from rosie.core.downloads import Manifest, download
+from rosie.core.profiling import Profiler
 
 
 class Adapter:
 
     STARTING_YEAR = 2009
     COMPANIES_DATASET = '2016-09-03-companies.xz'
+    DATASET_CACHE = 'dataset.feather'
+    DATASET_CACHE_VERSION = 2
+    DOWNLOAD_WORKERS = 4
+    MANIFEST = 'manifest.json'
     REIMBURSEMENTS_PATTERN = r'reimbursements-\d{4}\.csv'
     RENAME_COLUMNS = {
         'subquota_description': 'category',
@@ -23,30 +38,211 @@ class Adapter:
         'cnpj_cpf': 'recipient_id',
         'supplier': 'recipient'
     }
-    DTYPE = {
+    DTYPE = {  # text columns pandas could infer differently in each year
         'applicant_id': np.str,
         'cnpj_cpf': np.str,
         'congressperson_id': np.str,
-        'subquota_number': np.str
+        'congressperson_name': np.str,
+        'document_number': np.str,
+        'leg_of_the_trip': np.str,
+        'party': np.str,
+        'passenger': np.str,
+        'state': np.str,
+        'subquota_group_description': np.str,
+        'subquota_number': np.str,
+        'supplier': np.str,
     }
+    CATEGORIES = ('category', 'legal_entity', 'recipient', 'situation', 'subquota_number')
+    INTEGERS = ('applicant_id', 'document_id', 'month', 'year')
 
-    def __init__(self, path):
+    def __init__(self, path, profiler=None, offline=False, persist=True):
         self.path = path
         self.log = logging.getLogger(__name__)
+        self.profiler = profiler or Profiler()
+        self.offline = offline
+        self.persist = persist
+        self.columns = None  # all columns; Core sets the ones it needs
+        self.stages = {}
 
     @property
     def dataset(self):
-        self.update_datasets()
-        df = self.reimbursements.merge(
-            self.companies,
-            how='left',
-            left_on='cnpj_cpf',
-            right_on='cnpj'
-        )
-        self.prepare_dataset(df)
+        return self.prepare()
+
+    def stage(self, name, function, *args):
+        """Runs a stage of the pipeline once and keeps its result."""
+        if name not in self.stages:
+            self.stages[name] = function(*args)
+        return self.stages[name]
+
+    def fetch(self):
+        """
+        First stage of the pipeline: downloads the source files, unless
+        running offline or they did not change since the last update.
+        """
+        return self.stage('fetch', self.fetch_datasets)
+
+    def load(self):
+        """Second stage: reads reimbursements and companies."""
+        return self.stage('load', self.load_datasets)
+
+    def merge(self):
+        """Third stage: reimbursements merged with companies."""
+        return self.stage('merge', self.merge_datasets)
+
+    def prepare(self, columns=None):
+        """
+        Last stage: the prepared dataset (just the given `columns`, defaulting
+        to the `columns` attribute), read from the on-disk cache when it is
+        up to date. It runs the previous stages only when needed.
+        """
+        columns = columns or self.columns
+        name = ('prepare', tuple(columns) if columns else None)
+        return self.stage(name, self.load_dataset, columns)
+
+    def fetch_datasets(self):
+        if self.offline:
+            self.log.info('Running offline: using previously downloaded files')
+            missing = self.missing_sources()
+            if missing:
+                raise FileNotFoundError(f'Cannot run offline, missing files in '
+                                        f'{self.path}: {", ".join(missing)}')
+            return
+
+        with self.profiler('adapter', 'update'):
+            try:
+                self.update_datasets()
+            except URLError as error:
+                if self.missing_sources():
+                    raise
+                self.log.error(f'Could not update datasets ({error.reason}), '
+                               f'using previously downloaded files')
+
+    def missing_sources(self):
+        missing = [path.name for path in self.source_paths() if not path.exists()]
+        if not self.reimbursements_paths():
+            missing.append(self.REIMBURSEMENTS_PATTERN)
+        return missing
+
+    def load_datasets(self):
+        self.fetch()
+        with self.profiler('adapter', 'load') as step:
+            reimbursements, companies = self.reimbursements, self.companies
+            step['rows_out'] = len(reimbursements)
+        return reimbursements, companies
+
+    def merge_datasets(self):
+        reimbursements, companies = self.load()
+        with self.profiler('adapter', 'merge', rows_in=len(reimbursements)) as step:
+            df = reimbursements.merge(
+                companies,
+                how='left',
+                left_on='cnpj_cpf',
+                right_on='cnpj'
+            )
+            step['rows_out'] = len(df)
+        return df
+
+    def load_dataset(self, columns=None):
+        """
+        Returns the prepared dataset (optionally just the given `columns`)
+        from the columnar cache, rebuilding it from the source files when
+        they changed since the cache was written.
+        """
+        self.fetch()
+        path = Path(self.path) / self.DATASET_CACHE
+        fingerprint = self.fingerprint()
+        if self.persist and self.cached_fingerprint() == fingerprint:
+            self.log.info(f'Loading prepared dataset from {path}')
+            with self.profiler('adapter', 'load') as step:
+                df = pd.read_feather(path, columns=columns)
+                step['rows_out'] = len(df)
+        else:
+            df = self.merge()
+            # the dataset is prepared in place, thus it replaces the results
+            # of the previous stages (no need to keep them in memory)
+            for name in ('load', 'merge'):
+                self.stages.pop(name, None)
+
+            with self.profiler('adapter', 'prepare', rows_in=len(df)) as step:
+                self.prepare_dataset(df)
+                if self.persist:
+                    self.write_cache(df, fingerprint)
+                step['rows_out'] = len(df)
+
+            if columns:
+                df = df[columns]
+
         self.log.info('Dataset ready! Rosie starts her analysis now :)')
         return df
 
+    def partitions(self, columns=None):
+        """
+        Yields the prepared dataset (optionally just the given `columns`) one
+        reimbursements file, i.e. one year, at a time.
+        """
+        self.fetch()
+        with self.profiler('adapter', 'load') as step:
+            companies = self.companies
+            step['rows_out'] = len(companies)
+
+        for path in self.reimbursements_paths():
+            with self.profiler('adapter', 'load') as step:
+                reimbursements = self.read_reimbursements(path)
+                step['rows_out'] = len(reimbursements)
+
+            with self.profiler('adapter', 'merge', rows_in=len(reimbursements)) as step:
+                df = reimbursements.merge(
+                    companies,
+                    how='left',
+                    left_on='cnpj_cpf',
+                    right_on='cnpj'
+                )
+                step['rows_out'] = len(df)
+
+            with self.profiler('adapter', 'prepare', rows_in=len(df)) as step:
+                self.prepare_dataset(df)
+                step['rows_out'] = len(df)
+
+            yield df[columns] if columns else df
+
+    def source_paths(self):
+        return [Path(self.path) / self.COMPANIES_DATASET] + self.reimbursements_paths()
+
+    def fingerprint(self):
+        """Name, size and modification time of each source file."""
+        sources = {}
+        for path in self.source_paths():
+            if path.exists():
+                stat = path.stat()
+                sources[path.name] = [stat.st_size, stat.st_mtime_ns]
+        columns = self.used_columns()
+        return {
+            'version': self.DATASET_CACHE_VERSION,
+            'sources': sources,
+            'columns': sorted(columns) if columns else None,
+        }
+
+    def cached_fingerprint(self):
+        path = Path(self.path) / self.DATASET_CACHE
+        fingerprint_path = path.with_suffix('.json')
+        if not path.exists() or not fingerprint_path.exists():
+            return None
+
+        with fingerprint_path.open() as fobj:
+            return json.load(fobj)
+
+    def write_cache(self, df, fingerprint):
+        path = Path(self.path) / self.DATASET_CACHE
+        fingerprint_path = path.with_suffix('.json')
+        if fingerprint_path.exists():
+            fingerprint_path.unlink()
+
+        self.log.info(f'Saving prepared dataset to {path}')
+        df.reset_index(drop=True, inplace=True)
+        df.to_feather(path)
+        with fingerprint_path.open('w') as fobj:
+            json.dump(fingerprint, fobj)
+
     @property
     def companies(self):
         self.log.info('Loading companies')
@@ -55,46 +251,148 @@ class Adapter:
         df['cnpj'] = df['cnpj'].str.replace(r'\D', '')
         return df
 
-    @property
-    def reimbursements(self):
-        df = pd.DataFrame()
-        paths = (
-            str(path) for path in Path(self.path).glob('*.csv')
+    def reimbursements_paths(self):
+        return sorted(
+            path for path in Path(self.path).glob('*.csv')
             if match(self.REIMBURSEMENTS_PATTERN, path.name)
         )
 
-        for path in paths:
-            self.log.info(f'Loading reimbursements from {path}')
-            year_df = pd.read_csv(path, dtype=self.DTYPE, low_memory=False)
-            df = df.append(year_df)
+    def read_reimbursements(self, path):
+        self.log.info(f'Loading reimbursements from {path}')
+        return pd.read_csv(path, dtype=self.DTYPE, low_memory=False)
+
+    @property
+    def reimbursements(self):
+        """
+        Reads the reimbursements of each year in a pool of threads (pandas'
+        C parser releases the GIL) and concatenates them at once.
+        """
+        paths = self.reimbursements_paths()
+        if not paths:
+            return pd.DataFrame()
 
+        start = perf_counter()
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            years = list(executor.map(self.read_reimbursements, paths))
+        df = pd.concat(years, ignore_index=True, sort=False)
+        elapsed = perf_counter() - start
+        self.log.info(f'Loaded {len(df):,} reimbursements from {len(paths)} '
+                      f'files in {elapsed:.1f}s ({len(df) / elapsed:,.0f} rows/s)')
         return df
 
     def update_datasets(self):
-        self.update_companies()
-        self.update_reimbursements()
+        manifest = Manifest(Path(self.path) / self.MANIFEST)
+        self.update_companies(manifest)
+        self.update_reimbursements(manifest=manifest)
 
-    def update_companies(self):
+    def companies_url(self):
+        return Downloader(self.path).url(self.COMPANIES_DATASET)
+
+    def reimbursements_url(self, year):
+        return URL.format(year)
+
+    def update_companies(self, manifest=None):
         self.log.info('Updating companies')
         os.makedirs(self.path, exist_ok=True)
-        fetch(self.COMPANIES_DATASET, self.path)
+        manifest = manifest or Manifest(Path(self.path) / self.MANIFEST)
+        name = self.COMPANIES_DATASET
+        entry, changed = download(self.companies_url(),
+                                  Path(self.path) / name,
+                                  manifest.get(name))
+        if changed:
+            manifest.update(name, entry)
+        else:
+            self.log.info('Companies are up to date')
 
-    def update_reimbursements(self, years=None):
+    def update_reimbursements(self, years=None, manifest=None):
+        """
+        Downloads (with up to DOWNLOAD_WORKERS concurrent requests) and
+        converts the reimbursements of the given years, skipping the ones
+        that did not change since the last update.
+        """
         if not years:
             next_year = date.today().year + 1
             years = range(self.STARTING_YEAR, next_year)
 
-        for year in years:
-            self.log.info(f'Updating reimbursements from {year}')
-            try:
-                Reimbursements(year, self.path)()
-            except HTTPError as e:
-                self.log.error(f'Could not update Reimbursements from year {year}: {e} - {e.filename}')
+        os.makedirs(self.path, exist_ok=True)
+        manifest = manifest or Manifest(Path(self.path) / self.MANIFEST)
+        with ThreadPoolExecutor(max_workers=self.DOWNLOAD_WORKERS) as executor:
+            futures = {
+                year: executor.submit(self.update_reimbursements_year, year, manifest)
+                for year in years
+            }
+            for year, future in futures.items():
+                try:
+                    future.result()
+                except HTTPError as e:
+                    self.log.error(f'Could not update Reimbursements from year {year}: {e} - {e.filename}')
+
+    def update_reimbursements_year(self, year, manifest):
+        name = f'Ano-{year}.zip'
+        path = Path(self.path) / name
+        self.log.info(f'Updating reimbursements from {year}')
+        entry, changed = download(self.reimbursements_url(year), path, manifest.get(name))
+        csv = Path(self.path) / f'reimbursements-{year}.csv'
+        if not changed and csv.exists():
+            self.log.info(f'Reimbursements from {year} are up to date')
+            return
+
+        extract_zip(str(path), self.path)
+        Reimbursements(year, self.path).clean()
+        manifest.update(name, entry)
 
     def prepare_dataset(self, df):
         self.rename_categories(df)
         self.coerce_dates(df)
         self.rename_columns(df)
+        self.compact_dtypes(df)
+
+    def used_columns(self):
+        """
+        Columns read by the classifiers and the unique identifiers (or None
+        if some classifier does not declare the columns it reads).
+        """
+        columns = set(settings.UNIQUE_IDS) | {settings.PARTITION_KEY}
+        for classifier in settings.CLASSIFIERS.values():
+            declared = getattr(classifier, 'COLS', None)
+            if declared is None:
+                return None
+            columns.update(declared)
+        return columns
+
+    def compact_dtypes(self, df):
+        """
+        Drops object columns no classifier reads, converts low cardinality
+        columns to categoricals and integer ids to the smallest of int32 and
+        int64 their values allow. Returns the memory usage (in bytes) before
+        and after.
+        """
+        before = df.memory_usage(deep=True).sum()
+        used = self.used_columns()
+        if used:
+            unused = [column for column in df.columns
+                      if df[column].dtype == np.object and column not in used]
+            df.drop(columns=unused, inplace=True)
+
+        for column in self.CATEGORIES:
+            if column in df.columns:
+                df[column] = df[column].astype('category')
+
+        int32 = np.iinfo(np.int32)
+        for column in self.INTEGERS:
+            if column not in df.columns:
+                continue
+            values = pd.to_numeric(df[column], errors='coerce')
+            if values.isnull().any():  # not an integer column after all
+                continue
+            fits = values.empty or (int32.min <= values.min() and values.max() <= int32.max)
+            df[column] = values.astype(np.int32 if fits else np.int64)
+
+        after = df.memory_usage(deep=True).sum()
+        self.log.info(f'Dataset memory usage: {before / 1024 ** 2:,.1f} MB '
+                      f'before and {after / 1024 ** 2:,.1f} MB after compacting '
+                      f'data types ({len(df.columns)} columns kept)')
+        return before, after
 
     def rename_columns(self, df):
         self.log.info('Renaming columns to Serenata de Amor standard')
@@ -108,7 +406,9 @@ class Adapter:
         types = ('bill_of_sale', 'simple_receipt', 'expense_made_abroad')
         converters = {number: None for number in range(3, 6)}
         df['document_type'].replace(converters, inplace=True)
-        df['document_type'] = df['document_type'].astype('category')
+        # categories are set explicitly as a single year might miss some type
+        df['document_type'] = pd.Categorical(df['document_type'],
+                                             categories=range(len(types)))
         df['document_type'].cat.rename_categories(types, inplace=True)
 
         # Some classifiers expect a more broad category name for meals
@@ -16,6 +16,9 @@ class ElectionExpensesClassifier(TransformerMixin):
         Brazilian Federal Revenue category of companies, preceded by its code.
     """
 
+    COLS = ['legal_entity']
+    LEARNS_FROM_DATA = False
+
     def fit(self, dataframe):
         pass
 
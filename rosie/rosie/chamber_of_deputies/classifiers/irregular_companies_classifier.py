@@ -1,6 +1,10 @@
 import numpy as np
+import pandas as pd
 from sklearn.base import TransformerMixin
 
+from rosie.chamber_of_deputies import features
+from rosie.core.features import get
+
 
 class IrregularCompaniesClassifier(TransformerMixin):
     """
@@ -22,6 +26,9 @@ class IrregularCompaniesClassifier(TransformerMixin):
         Date when the situation was last updated.
     """
 
+    COLS = ['issue_date', 'situation', 'situation_date']
+    LEARNS_FROM_DATA = False
+
     def fit(self, X):
         return self
 
@@ -30,8 +37,8 @@ class IrregularCompaniesClassifier(TransformerMixin):
 
     def predict(self, X):
         statuses = ['BAIXADA', 'NULA', 'SUSPENSA', 'INAPTA']
-        self._X = X.apply(self.__compare_date, axis=1)
-        return np.r_[self._X & X['situation'].isin(statuses)]
-
-    def __compare_date(self, row):
-        return (row['situation_date'] < row['issue_date'])
+        situation_date = pd.to_datetime(X['situation_date'], errors='coerce')
+        issue_date = get(self, features.coerced_issue_date, X)
+        # comparisons involving NaT are always False
+        outdated = situation_date < issue_date
+        return np.r_[outdated & X['situation'].isin(statuses)]
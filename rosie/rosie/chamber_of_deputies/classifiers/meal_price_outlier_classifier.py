@@ -1,10 +1,11 @@
-import unicodedata
-
 import numpy as np
 import pandas as pd
 from sklearn.base import TransformerMixin
 from sklearn.cluster import KMeans
 
+from rosie.chamber_of_deputies import features
+from rosie.core.features import get
+
 
 class MealPriceOutlierClassifier(TransformerMixin):
     """
@@ -26,8 +27,9 @@ class MealPriceOutlierClassifier(TransformerMixin):
         A CNPJ (Brazilian company ID) or CPF (Brazilian personal tax ID).
     """
 
-    HOTEL_REGEX = r'hote(?:(?:ls?)|is)'
+    HOTEL_REGEX = features.HOTEL_REGEX
     CLUSTER_KEYS = ['mean', 'std']
+    GROUP_KEYS = ['recipient_id']
     COLS = ['applicant_id',
             'category',
             'net_value',
@@ -35,16 +37,18 @@ class MealPriceOutlierClassifier(TransformerMixin):
             'recipient_id']
 
     def fit(self, X):
-        _X = X[self.__applicable_rows(X)]
-        companies = _X.groupby('recipient_id').apply(self.__company_stats) \
-            .reset_index()
+        return self.fit_aggregate(self.aggregate(X))
+
+    def fit_aggregate(self, aggregate):
+        """Same as `fit`, but taking the output of `aggregate` instead."""
+        companies = self.__company_stats(aggregate)
         companies = companies[self.__applicable_company_rows(companies)]
 
         self.cluster_model = KMeans(n_clusters=3)
         self.cluster_model.fit(companies[self.CLUSTER_KEYS])
         companies['cluster'] = self.cluster_model.predict(companies[self.CLUSTER_KEYS])
-        self.clusters = companies.groupby('cluster') \
-            .apply(self.__cluster_stats) \
+        self.clusters = companies.groupby('cluster')[self.CLUSTER_KEYS] \
+            .mean() \
             .reset_index()
         self.clusters['threshold'] = \
             self.clusters['mean'] + 4 * self.clusters['std']
@@ -53,54 +57,70 @@ class MealPriceOutlierClassifier(TransformerMixin):
     def transform(self, X=None):
         pass
 
-    def predict(self, X):
-        _X = X[self.COLS].copy()
-        companies = _X[self.__applicable_rows(_X)] \
-            .groupby('recipient_id').apply(self.__company_stats) \
-            .reset_index()
-        companies['cluster'] = \
-            self.cluster_model.predict(companies[self.CLUSTER_KEYS])
-        companies = pd.merge(companies,
-                             self.clusters[['cluster', 'threshold']],
-                             how='left')
-        _X = pd.merge(_X, companies[['recipient_id', 'threshold']], how='left')
-        known_companies = companies[self.__applicable_company_rows(companies)]
-        known_thresholds = known_companies \
-            .groupby('recipient_id') \
-            .apply(lambda x: x['mean'] + 3 * x['std']) \
-            .reset_index() \
-            .rename(columns={0: 'cnpj_threshold'})
-        _X = pd.merge(_X, known_thresholds, how='left')
-        if 'cnpj_threshold' in _X.columns:
-            _X.loc[_X['cnpj_threshold'].notnull(),
-                   'threshold'] = _X['cnpj_threshold']
-        _X['y'] = 1
-        is_outlier = self.__applicable_rows(_X) & \
-            _X['threshold'].notnull() & \
-            (_X['net_value'] > _X['threshold'])
-        _X.loc[is_outlier, 'y'] = -1
-        return _X['y']
+    def predict(self, X, aggregate=None):
+        """
+        Company statistics are calculated from `X` unless `aggregate` (the
+        output of `aggregate` for a larger dataset) is given, which allows
+        predicting one part of the dataset at a time.
+        """
+        _X = X[self.COLS]
+        applicable_rows = self.__applicable_rows(_X)
+        if aggregate is None:
+            aggregate = self.aggregate(_X)
+        companies = self.__company_stats(aggregate)
+        if len(companies):
+            companies['cluster'] = \
+                self.cluster_model.predict(companies[self.CLUSTER_KEYS])
+        else:
+            companies['cluster'] = np.array((), dtype=np.int)
+        thresholds = self.clusters.set_index('cluster')['threshold']
+        companies['threshold'] = companies['cluster'].map(thresholds)
+
+        known_companies = self.__applicable_company_rows(companies)
+        companies.loc[known_companies, 'threshold'] = \
+            companies['mean'] + 3 * companies['std']
+
+        threshold = _X['recipient_id'].map(companies['threshold'])
+        is_outlier = applicable_rows & \
+            threshold.notnull() & \
+            (_X['net_value'] > threshold)
+        return np.where(is_outlier, -1, 1)
+
+    def aggregate(self, X):
+        """
+        Number of expenses, sum and sum of squares of their values for each
+        pair of company and congressperson (considering just the applicable
+        rows). Aggregates of parts of a dataset can be concatenated into the
+        aggregate of the whole dataset.
+        """
+        X = X[self.__applicable_rows(X)]
+        grouped = X.assign(squared_value=X['net_value'] ** 2) \
+            .groupby(['recipient_id', 'applicant_id'])
+        return pd.DataFrame({
+            'records': grouped.size(),
+            'total': grouped['net_value'].sum(),
+            'squared_total': grouped['squared_value'].sum(),
+        }).reset_index()
 
     def __applicable_rows(self, X):
-        return (X['category'] == 'Meal') & \
-            (X['recipient_id'].str.len() == 14) & \
-            (~X['recipient'].fillna('').apply(self.__normalize_string).str.contains(self.HOTEL_REGEX))
+        return get(self, features.is_meal, X) & \
+            get(self, features.is_company, X) & \
+            ~get(self, features.is_hotel, X)
 
     def __applicable_company_rows(self, companies):
         return (companies['congresspeople'] > 3) & (companies['records'] > 20)
 
-    def __company_stats(self, X):
-        stats = {'mean': np.mean(X['net_value']),
-                 'std': np.std(X['net_value']),
-                 'congresspeople': len(np.unique(X['applicant_id'])),
-                 'records': len(X)}
-        return pd.Series(stats)
-
-    def __cluster_stats(self, X):
-        stats = {'mean': np.mean(X['mean']),
-                 'std': np.mean(X['std'])}
-        return pd.Series(stats)
-
-    def __normalize_string(self, string):
-        nfkd_form = unicodedata.normalize('NFKD', string.lower())
-        return nfkd_form.encode('ASCII', 'ignore').decode('utf-8')
+    def __company_stats(self, aggregate):
+        """Statistics for each company, indexed by `recipient_id`."""
+        keys = ['recipient_id', 'applicant_id']
+        pairs = aggregate.groupby(keys)[['records', 'total', 'squared_total']].sum()
+        grouped = pairs.groupby(level='recipient_id')
+        records = grouped['records'].sum()
+        mean = grouped['total'].sum() / records
+        variance = grouped['squared_total'].sum() / records - mean ** 2
+        return pd.DataFrame({
+            'mean': mean,
+            'std': np.sqrt(variance.clip(lower=0)),
+            'congresspeople': grouped.size(),
+            'records': records,
+        })
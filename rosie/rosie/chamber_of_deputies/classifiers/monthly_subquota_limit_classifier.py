@@ -1,6 +1,12 @@
+from datetime import date
+
 import numpy as np
 import pandas as pd
 from sklearn.base import TransformerMixin
+from sklearn.utils.validation import check_is_fitted
+
+from rosie.chamber_of_deputies import features
+from rosie.core.features import get
 
 
 class MonthlySubquotaLimitClassifier(TransformerMixin):
@@ -26,132 +32,91 @@ class MonthlySubquotaLimitClassifier(TransformerMixin):
     """
 
     KEYS = ['applicant_id', 'month', 'year']
+    GROUP_KEYS = KEYS
+    PARTITION_KEY = 'applicant_id'
     COLS = ['applicant_id',
             'issue_date',
             'month',
             'net_value',
             'subquota_number',
             'year']
-
-    def fit(self, X):
-        self.X = X
-        self._X = self.X[self.COLS].copy()
-        self.__create_columns()
+    LEARNS_FROM_DATA = False  # fitting only parses the LIMITS
+    LIMITS_COLS = ['subquota_number', 'start', 'end', 'monthly_limit']
+    LIMITS = [
+        # Automotive vehicle renting or charter (From 12/2013 to 03/2015)
+        ('120', date(2013, 12, 1), date(2015, 3, 1), 1000000),
+        # Automotive vehicle renting or charter (From 04/2015 to 04/2017)
+        ('120', date(2015, 4, 1), date(2017, 4, 1), 1090000),
+        # Automotive vehicle renting or charter (From 05/2017)
+        ('120', date(2017, 5, 1), None, 1271300),
+        # Taxi, toll and parking (From 12/2013 to 03/2015)
+        ('122', date(2013, 12, 1), date(2015, 3, 1), 250000),
+        # Taxi, toll and parking (From 04/2015)
+        ('122', date(2015, 4, 1), None, 270000),
+        # Fuels and lubricants (From 07/2009 to 03/2015)
+        ('3', date(2009, 7, 1), date(2015, 3, 1), 450000),
+        # Fuels and lubricants (From 04/2015 to 08/2015)
+        ('3', date(2015, 4, 1), date(2015, 8, 1), 490000),
+        # Fuels and lubricants (From 9/2015)
+        ('3', date(2015, 9, 1), None, 600000),
+        # Security service provided by specialized company (From 07/2009 to 4/2014)
+        ('8', date(2009, 7, 1), date(2014, 4, 1), 450000),
+        # Security service provided by specialized company (From 05/2014 to 3/2015)
+        ('8', date(2014, 5, 1), date(2015, 3, 1), 800000),
+        # Security service provided by specialized company (From 04/2015)
+        ('8', date(2015, 4, 1), None, 870000),
+        # Participation in course, talk or similar event (From 10/2015)
+        ('137', date(2015, 10, 1), None, 769716),
+    ]
+
+    def fit(self, X=None):
+        limits = pd.DataFrame(self.LIMITS, columns=self.LIMITS_COLS)
+        for column in ('start', 'end'):
+            limits[column] = pd.to_datetime(limits[column])
+        self.limits = limits.sort_values('start')
         return self
 
     def transform(self, X=None):
-        self.limits = [
-            {
-                # Automotive vehicle renting or charter (From 12/2013 to 03/2015)
-                'data': self._X.query('(subquota_number == "120") & '
-                                      '(reimbursement_month >= datetime(2013, 12, 1)) & '
-                                      '(reimbursement_month <= datetime(2015, 3, 1))'),
-                'monthly_limit': 1000000,
-            },
-            {
-                # Automotive vehicle renting or charter (From 04/2015 to 04/2017)
-                'data': self._X.query('(subquota_number == "120") & '
-                                      '(reimbursement_month >= datetime(2015, 4, 1)) & '
-                                      '(reimbursement_month <= datetime(2017, 4, 1))'),
-                'monthly_limit': 1090000,
-            },
-            {
-                # Automotive vehicle renting or charter (From 05/2017)
-                'data': self._X.query('(subquota_number == "120") & '
-                                      '(reimbursement_month >= datetime(2017, 5, 1))'),
-                'monthly_limit': 1271300,
-            },
-            {
-                # Taxi, toll and parking (From 12/2013 to 03/2015)
-                'data': self._X.query('(subquota_number == "122") & '
-                                      '(reimbursement_month >= datetime(2013, 12, 1)) & '
-                                      '(reimbursement_month <= datetime(2015, 3, 1))'),
-                'monthly_limit': 250000,
-            },
-            {
-                # Taxi, toll and parking (From 04/2015)
-                'data': self._X.query('(subquota_number == "122") & '
-                                      '(reimbursement_month >= datetime(2015, 4, 1))'),
-                'monthly_limit': 270000,
-            },
-            {
-                # Fuels and lubricants (From 07/2009 to 03/2015)
-                'data': self._X.query('(subquota_number == "3") & '
-                                      '(reimbursement_month >= datetime(2009, 7, 1)) & '
-                                      '(reimbursement_month <= datetime(2015, 3, 1))'),
-                'monthly_limit': 450000,
-            },
-            {
-                # Fuels and lubricants (From 04/2015 to 08/2015)
-                'data': self._X.query('(subquota_number == "3") & '
-                                      '(reimbursement_month >= datetime(2015, 4, 1)) & '
-                                      '(reimbursement_month <= datetime(2015, 8, 1))'),
-                'monthly_limit': 490000,
-            },
-            {
-                # Fuels and lubricants (From 9/2015)
-                'data': self._X.query('(subquota_number == "3") & '
-                                      '(reimbursement_month >= datetime(2015, 9, 1))'),
-                'monthly_limit': 600000,
-            },
-            {
-                # Security service provided by specialized company (From 07/2009 to 4/2014)
-                'data': self._X.query('(subquota_number == "8") & '
-                                      '(reimbursement_month >= datetime(2009, 7, 1)) & '
-                                      '(reimbursement_month <= datetime(2014, 4, 1))'),
-                'monthly_limit': 450000,
-            },
-            {
-                # Security service provided by specialized company (From 05/2014 to 3/2015)
-                'data': self._X.query('(subquota_number == "8") & '
-                                      '(reimbursement_month >= datetime(2014, 5, 1)) & '
-                                      '(reimbursement_month <= datetime(2015, 3, 1))'),
-                'monthly_limit': 800000,
-            },
-            {
-                # Security service provided by specialized company (From 04/2015)
-                'data': self._X.query('(subquota_number == "8") & '
-                                      '(reimbursement_month >= datetime(2015, 4, 1))'),
-                'monthly_limit': 870000,
-            },
-            {
-                # Participation in course, talk or similar event (From 10/2015)
-                'data': self._X.query('(subquota_number == "137") & '
-                                      '(reimbursement_month >= datetime(2015, 10, 1))'),
-                'monthly_limit': 769716,
-            },
-        ]
         return self
 
-    def predict(self, X=None):
-        self._X['is_over_monthly_subquota_limit'] = False
-        for metadata in self.limits:
-            data, monthly_limit = metadata['data'], metadata['monthly_limit']
-            if len(data):
-                surplus_reimbursements = self.__find_surplus_reimbursements(data, monthly_limit)
-                self._X.loc[surplus_reimbursements.index,
-                            'is_over_monthly_subquota_limit'] = True
-        results = self._X.loc[self.X.index, 'is_over_monthly_subquota_limit']
-        return np.r_[results]
+    def predict(self, X):
+        check_is_fitted(self, ['limits'])
 
-    def predict_proba(self, X=None):
-        return 1.
+        _X = self.__create_columns(X)
+        _X = self.__join_limits(_X)
+        _X.sort_values(['coerced_issue_date', 'position'],
+                       kind='mergesort', inplace=True)
+        keys = ['subquota_number'] + self.KEYS
+        cumsum = _X.groupby(keys)['net_value_int'].cumsum()
+        surplus = _X.loc[cumsum > _X['monthly_limit'], 'position']
 
-    def __create_columns(self):
-        self._X['net_value_int'] = (self._X['net_value'] * 100).apply(int)
+        results = np.zeros(len(X), dtype=np.bool)
+        results[surplus.values] = True
+        return results
 
-        self._X['coerced_issue_date'] = \
-            pd.to_datetime(self._X['issue_date'], errors='coerce')
-        self._X.sort_values('coerced_issue_date', kind='mergesort', inplace=True)
-
-        reimbursement_month = self._X[['year', 'month']].copy()
-        reimbursement_month['day'] = 1
-        self._X['reimbursement_month'] = pd.to_datetime(reimbursement_month)
-
-    def __find_surplus_reimbursements(self, data, monthly_limit):
-        grouped = data.groupby(self.KEYS).apply(self.__create_cumsum_cols)
-        return grouped[grouped['cumsum_net_value'] > monthly_limit]
+    def predict_proba(self, X=None):
+        return 1.
 
-    def __create_cumsum_cols(self, subset):
-        subset['cumsum_net_value'] = subset['net_value_int'].cumsum()
-        return subset
+    def __create_columns(self, X):
+        _X = X[self.COLS].copy()
+        _X['position'] = np.arange(len(_X))
+        _X['net_value_int'] = get(self, features.net_value_cents, X)
+        _X['coerced_issue_date'] = get(self, features.coerced_issue_date, X)
+        _X['reimbursement_month'] = get(self, features.reimbursement_month, X)
+        return _X
+
+    def __join_limits(self, X):
+        """
+        Interval join matching each row to the limit of its subquota number
+        in force in its reimbursement month (rows with no limit are dropped).
+        """
+        X = X[X['subquota_number'].isin(self.limits['subquota_number'])]
+        # merge_asof requires `by` columns of the same type (not categorical)
+        X = X.assign(subquota_number=X['subquota_number'].astype(np.str))
+        X = pd.merge_asof(X.sort_values('reimbursement_month'),
+                          self.limits,
+                          left_on='reimbursement_month',
+                          right_on='start',
+                          by='subquota_number')
+        in_force = X['end'].isnull() | (X['reimbursement_month'] <= X['end'])
+        return X[in_force & X['monthly_limit'].notnull()]
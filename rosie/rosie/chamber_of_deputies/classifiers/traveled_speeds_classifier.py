@@ -1,11 +1,99 @@
-from itertools import combinations
-
 import numpy as np
 import pandas as pd
 from sklearn.base import TransformerMixin
 from sklearn.utils.validation import check_is_fitted
 
-from geopy.distance import vincenty as distance
+from geopy.distance import geodesic
+
+from rosie.chamber_of_deputies import features
+from rosie.core.features import get
+
+EARTH_RADIUS = 6371.0088  # mean radius, in km
+
+
+def haversine(latitudes, longitudes, other_latitudes, other_longitudes):
+    """Great-circle distances (km) between two arrays of coordinates."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (latitudes,
+                                              longitudes,
+                                              other_latitudes,
+                                              other_longitudes))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + \
+        np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def pairs_within_groups(sizes):
+    """
+    Given the sizes of consecutive groups of rows, returns two arrays with the
+    positions of every pair of rows (i, j), i < j, in the same group.
+    """
+    ends = np.repeat(np.cumsum(sizes), sizes)
+    partners = ends - np.arange(ends.size) - 1
+    first = np.repeat(np.arange(ends.size), partners)
+    offsets = np.arange(first.size) - \
+        np.repeat(np.cumsum(partners) - partners, partners)
+    return first, first + offsets + 1
+
+
+class DistanceCache:
+    """
+    Distances between pairs of places where expenses were made, so the ones
+    visited on many days (e.g. a congressperson's usual restaurant and hotel)
+    are measured just once. Each pair is keyed by a hash of the unordered pair
+    of recipients, including their coordinates (thus a recipient whose
+    address changes is measured again). Only the `max_pairs` most recently
+    added pairs are kept.
+    """
+
+    MAX_PAIRS = 2 * 10 ** 6
+
+    def __init__(self, precise=False, max_pairs=MAX_PAIRS):
+        self.precise = precise
+        self.max_pairs = max_pairs
+        self.distances = pd.Series((), index=pd.Index((), dtype=np.uint64),
+                                   dtype=np.float64)
+        self.changed = False
+
+    def __len__(self):
+        return len(self.distances)
+
+    @staticmethod
+    def places(X):
+        """A hash of each row's recipient and coordinates."""
+        columns = ['recipient_id', 'latitude', 'longitude']
+        return pd.util.hash_pandas_object(X[columns], index=False).values
+
+    @staticmethod
+    def keys(places, other_places):
+        """A hash of each unordered pair of places."""
+        pairs = pd.DataFrame({'first': np.minimum(places, other_places),
+                              'second': np.maximum(places, other_places)})
+        return pd.util.hash_pandas_object(pairs, index=False).values
+
+    def get(self, keys, measure):
+        """
+        Distances for each key. Keys not in the cache are measured (once for
+        each distinct key) by calling `measure` with their positions in `keys`.
+        """
+        positions = self.distances.index.get_indexer(keys)
+        distances = np.empty(len(keys), dtype=np.float64)
+        found = positions >= 0
+        distances[found] = self.distances.values[positions[found]]
+
+        missing = np.flatnonzero(~found)
+        if missing.size:
+            unique, first, inverse = np.unique(keys[missing],
+                                               return_index=True,
+                                               return_inverse=True)
+            measured = np.asarray(measure(missing[first]), dtype=np.float64)
+            distances[missing] = measured[inverse]
+            self.add(unique, measured)
+        return distances
+
+    def add(self, keys, distances):
+        new = pd.Series(distances, index=pd.Index(keys, dtype=np.uint64))
+        self.distances = pd.concat([self.distances, new]).iloc[-self.max_pairs:]
+        self.changed = True
 
 
 class TraveledSpeedsClassifier(TransformerMixin):
@@ -25,6 +113,9 @@ class TraveledSpeedsClassifier(TransformerMixin):
         If the row corresponds to a party expense or not. The model will be
         applied just in rows where the value is equal to `False`.
 
+    recipient_id : string column
+        A CNPJ (Brazilian company ID), whose coordinates are the ones below.
+
     issue_date : datetime column
         Date when the expense was made.
 
@@ -33,83 +124,154 @@ class TraveledSpeedsClassifier(TransformerMixin):
 
     longitude : float column
         Longitude of the place where the expense was made.
+
+    Distances are great-circle distances computed with the haversine formula
+    on a spherical Earth, which differ from geodesic distances on the WGS-84
+    ellipsoid by less than 0.5%. Use `precise_distances=True` to compute them
+    with geopy's `geodesic` instead (much slower).
+
+    Distances between pairs of recipients are kept in a `cache` (see
+    `DistanceCache`), which Rosie saves next to the trained model and reuses
+    in later runs.
     """
 
     AGG_KEYS = ['applicant_id', 'issue_date']
+    GROUP_KEYS = AGG_KEYS
+    PARTITION_KEY = 'applicant_id'
     COLS = ['applicant_id',
             'category',
             'is_party_expense',
             'issue_date',
             'latitude',
-            'longitude']
+            'longitude',
+            'recipient_id']
+    cache = None
 
-    def __init__(self, contamination=.001):
+    def __init__(self, contamination=.001, precise_distances=False):
         if contamination in [0, 1]:
             raise ValueError('contamination must be greater than 0 and less than 1')
 
         self.contamination = contamination
+        self.precise_distances = precise_distances
+
+    def __getstate__(self):
+        # the cache is persisted on its own (see `rosie.core.models`)
+        state = self.__dict__.copy()
+        state.pop('cache', None)
+        return state
 
     def fit(self, X):
-        _X = self.__aggregate_dataset(X)
+        return self.fit_aggregate(self.aggregate(X))
+
+    def fit_aggregate(self, aggregate):
+        """Same as `fit`, but taking the output of `aggregate` instead."""
+        _X = aggregate.copy()
         self.polynomial = np.polyfit(_X['expenses'].astype(np.long),
                                      _X['distance_traveled'].astype(np.long),
                                      3)
         self._polynomial_fn = np.poly1d(self.polynomial)
+        _X = self.__add_distance_columns(_X)
+        self.threshold = self.__threshold_for_contamination(_X, self.contamination)
         return self
 
     def transform(self, X=None):
         pass
 
     def predict(self, X):
-        check_is_fitted(self, ['polynomial', '_polynomial_fn'])
+        check_is_fitted(self, ['polynomial', '_polynomial_fn', 'threshold'])
 
-        _X = X[self.COLS].copy()
-        _X = self.__aggregate_dataset(_X)
-        _X = self.__classify_dataset(_X)
-        _X = pd.merge(X, _X, how='left', left_on=self.AGG_KEYS, right_on=self.AGG_KEYS)
-        is_outlier = self.__applicable_rows(_X) & \
+        _X = X[self.COLS]
+        applicable_rows = self.__applicable_rows(_X)
+        aggregated = self.__classify_dataset(self.aggregate(_X))
+        _X = pd.merge(_X, aggregated, how='left', on=self.AGG_KEYS)
+        is_outlier = applicable_rows & \
             (_X['expenses_threshold_outlier'] | _X['traveled_speed_outlier'])
         y = is_outlier.astype(np.int).replace({1: -1, 0: 1})
         return y
 
-    def __aggregate_dataset(self, X):
+    def aggregate(self, X):
+        """
+        Number of expenses and distance traveled by each congressperson in
+        each day. As these groups are made of the expenses of a single
+        congressperson, aggregates of datasets split by `applicant_id` can be
+        concatenated into the aggregate of the whole dataset.
+        """
         X = X[self.__applicable_rows(X)]
-        distances_traveled = X.groupby(self.AGG_KEYS) \
-            .apply(self.__calculate_sum_distances).reset_index() \
-            .rename(columns={0: 'distance_traveled'})
-        expenses = X.groupby(self.AGG_KEYS)['applicant_id'].agg(len) \
-            .rename('expenses').reset_index()
-        _X = pd.merge(distances_traveled, expenses,
-                      left_on=self.AGG_KEYS,
-                      right_on=self.AGG_KEYS)
+        grouped = X.groupby(self.AGG_KEYS)
+        _X = grouped.size().rename('expenses').reset_index()
+        _X.insert(len(self.AGG_KEYS),
+                  'distance_traveled',
+                  self.__calculate_sum_distances(X, grouped.ngroup().values))
         return _X
 
-    def __classify_dataset(self, X):
+    def __add_distance_columns(self, X):
         X['expected_distance'] = self._polynomial_fn(X['expenses'])
         X['diff_distance'] = abs(X['expected_distance'] - X['distance_traveled'])
         X['expenses_threshold_outlier'] = X['expenses'] > 8
-        threshold = self.__threshold_for_contamination(X, self.contamination)
-        X['traveled_speed_outlier'] = X['diff_distance'] > threshold
+        return X
+
+    def __classify_dataset(self, X):
+        X = self.__add_distance_columns(X)
+        X['traveled_speed_outlier'] = X['diff_distance'] > self.threshold
         return X
 
     def __applicable_rows(self, X):
-        return (X['category'] == 'Meal') & \
-            (-73.992222 < X['longitude']) & (X['longitude'] < -34.7916667) & \
-            (-33.742222 < X['latitude']) & (X['latitude'] < 5.2722222) & \
-            ~X['is_party_expense'] & \
-            X[['latitude', 'longitude']].notnull().all(axis=1)
+        return get(self, features.is_meal, X) & \
+            get(self, features.valid_coordinates, X) & \
+            ~X['is_party_expense'].values
 
-    def __calculate_sum_distances(self, X):
-        coordinate_list = X[['latitude', 'longitude']].values
-        edges = list(combinations(coordinate_list, 2))
-        return np.sum([distance(edge[0][1:], edge[1][1:]).km for edge in edges])
+    def __calculate_sum_distances(self, X, groups):
+        """
+        Sum of the distances between every pair of expenses of each group,
+        computed for all groups at once (`groups` holds each row's group
+        number, as given by `GroupBy.ngroup`).
+        """
+        order = np.argsort(groups, kind='mergesort')
+        sizes = np.bincount(groups, minlength=groups.max() + 1 if groups.size else 0)
+        first, second = pairs_within_groups(sizes)
 
-    def __threshold_for_contamination(self, X, expected_contamination):
-        possible_thresholds = range(1, int(X['expected_distance'].max()), 50)
-        results = [(self.__contamination(X, t), t) for t in possible_thresholds]
-        best_choice = min(results, key=lambda x: abs(x[0] - expected_contamination))
-        return best_choice[1]
+        # Points used to be built from `coordinates[1:]`, which geopy reads
+        # as (longitude, 0). This is kept so fitted models and predictions do
+        # not change.
+        latitudes = X['longitude'].values[order]
+        longitudes = np.zeros_like(latitudes)
+
+        def measure(pairs):
+            a, b = first[pairs], second[pairs]
+            if self.precise_distances:
+                return [geodesic(*points).km for points in zip(
+                    zip(latitudes[a], longitudes[a]),
+                    zip(latitudes[b], longitudes[b])
+                )]
+            return haversine(latitudes[a], longitudes[a],
+                             latitudes[b], longitudes[b])
 
-    def __contamination(self, X, threshold):
-        return (X['diff_distance'] > threshold).sum() / \
+        places = DistanceCache.places(X)[order]
+        keys = DistanceCache.keys(places[first], places[second])
+        distances = self.__distance_cache().get(keys, measure)
+
+        return np.bincount(groups[order][first],
+                           weights=distances,
+                           minlength=sizes.size)
+
+    def __distance_cache(self):
+        if self.cache is None or self.cache.precise != self.precise_distances:
+            self.cache = DistanceCache(self.precise_distances)
+        return self.cache
+
+    def __threshold_for_contamination(self, X, expected_contamination):
+        """
+        Picks, among thresholds from 1 to the maximum expected distance in
+        steps of 50 km, the one whose contamination is the closest to the
+        expected one. Counting the distances above each threshold is a binary
+        search in the sorted distances.
+        """
+        possible_thresholds = np.arange(1, int(X['expected_distance'].max()), 50)
+        diff_distances = X['diff_distance'].values
+        diff_distances = np.sort(diff_distances[~np.isnan(diff_distances)])
+        above = diff_distances.size - \
+            np.searchsorted(diff_distances, possible_thresholds, side='right')
+        contamination = above / \
             (len(X) - X['expenses_threshold_outlier'].sum())
+        best_choice = np.argmin(np.abs(contamination - expected_contamination))
+        return int(possible_thresholds[best_choice])
@@ -0,0 +1,62 @@
+"""
+Derived columns of the Chamber of Deputies reimbursements shared by its
+classifiers (see `rosie.core.features`).
+"""
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+HOTEL_REGEX = r'hote(?:(?:ls?)|is)'
+
+
+def normalize_string(string):
+    nfkd_form = unicodedata.normalize('NFKD', string.lower())
+    return nfkd_form.encode('ASCII', 'ignore').decode('utf-8')
+
+
+def _normalized_names(recipients):
+    """Codes of each recipient and its distinct names, normalized once."""
+    codes, names = pd.factorize(recipients)
+    names = [normalize_string(name) for name in names]
+    # missing names (code -1) pick the last item
+    return codes, np.array(names + [None], dtype=np.object)
+
+
+def is_hotel(X):
+    """Whether the recipient's name mentions a hotel (missing names do not)."""
+    codes, names = _normalized_names(X['recipient'])
+    matches = pd.Series(names).str.contains(HOTEL_REGEX)
+    return matches.fillna(False).values.astype(np.bool)[codes]
+
+
+def is_company(X):
+    """Whether the recipient is identified by a CNPJ (14 digits)."""
+    return (X['recipient_id'].str.len() == 14).values
+
+
+def is_meal(X):
+    return (X['category'] == 'Meal').values
+
+
+def valid_coordinates(X):
+    """Whether the expense has coordinates within Brazil's boundaries."""
+    return ((-73.992222 < X['longitude']) & (X['longitude'] < -34.7916667) &
+            (-33.742222 < X['latitude']) & (X['latitude'] < 5.2722222) &
+            X[['latitude', 'longitude']].notnull().all(axis=1)).values
+
+
+def coerced_issue_date(X):
+    """`issue_date` as datetimes (NaT where it cannot be parsed)."""
+    return pd.to_datetime(X['issue_date'], errors='coerce').values
+
+
+def reimbursement_month(X):
+    """First day of the quota month and year of each expense."""
+    month = X[['year', 'month']].copy()
+    month['day'] = 1
+    return pd.to_datetime(month).values
+
+
+def net_value_cents(X):
+    return (X['net_value'] * 100).astype(np.int64).values
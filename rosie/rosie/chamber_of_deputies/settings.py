@@ -15,3 +15,14 @@ CLASSIFIERS = {
 }
 
 UNIQUE_IDS = ['applicant_id', 'year', 'document_id']
+
+PARTITION_KEY = 'applicant_id'
+
+# columns merged from the companies dataset, which `rosie.py serve` fills in
+# the submitted rows from previous reimbursements to the same company
+COMPANY_KEY = 'recipient_id'
+COMPANY_COLUMNS = ['latitude',
+                   'legal_entity',
+                   'longitude',
+                   'situation',
+                   'situation_date']
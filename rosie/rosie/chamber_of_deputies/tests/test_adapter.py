@@ -1,14 +1,20 @@
+import json
+import os
 import shutil
 from datetime import date
+from io import BytesIO
 from pathlib import Path
 from tempfile import mkdtemp
 from unittest import TestCase
-from unittest.mock import call, patch
+from unittest.mock import MagicMock, PropertyMock, call, patch
+from urllib.error import URLError
+from zipfile import ZipFile
 
 import pandas as pd
 from freezegun import freeze_time
 
 from rosie.chamber_of_deputies.adapter import Adapter
+from rosie.core.tests.server import LocalServer
 
 
 FIXTURES = Path() / 'rosie' / 'chamber_of_deputies' / 'tests' / 'fixtures'
@@ -38,10 +44,9 @@ class TestAdapter(TestCase):
         shutil.rmtree(cls.temp_path)
 
     def setUp(self):
-        with patch.object(Adapter, 'update_datasets'):
-            adapter = Adapter(self.temp_path)
-            adapter.log.disabled = True
-            self.dataset = adapter.dataset
+        adapter = Adapter(self.temp_path, offline=True)
+        adapter.log.disabled = True
+        self.dataset = adapter.dataset
 
 
     def test_load_all_years(self):
@@ -69,25 +74,218 @@ class TestAdapter(TestCase):
         party_expenses = self.dataset[self.dataset.is_party_expense == True]
         self.assertEqual(1, len(party_expenses))
 
-    @freeze_time('2010-11-12')
-    @patch('rosie.chamber_of_deputies.adapter.fetch')
-    @patch('rosie.chamber_of_deputies.adapter.Reimbursements')
-    def test_update(self, reimbursements, fetch):
-        adapter = Adapter(self.temp_path)
-        adapter.dataset  # triggers update methods
-
-        reimbursements.assert_has_calls((
-            call(2009, self.temp_path),
-            call()(),
-            call(2010, self.temp_path),
-            call()()
-        ))
-        fetch.assert_called_once_with(Adapter.COMPANIES_DATASET, self.temp_path)
-
-    @patch('rosie.chamber_of_deputies.adapter.fetch')
-    @patch('rosie.chamber_of_deputies.adapter.Reimbursements')
-    def test_coerce_dates(self, reimbursements, fetch):
-        adapter = Adapter(self.temp_path)
+    def test_dataset_cache(self):
+        path = Path(self.temp_path) / Adapter.DATASET_CACHE
+        self.assertTrue(path.exists())
+        self.assertTrue(path.with_suffix('.json').exists())
+
+    @patch.object(Adapter, 'reimbursements', new_callable=PropertyMock)
+    def test_load_dataset_from_cache(self, reimbursements):
+        adapter = Adapter(self.temp_path, offline=True)
+        df = adapter.load_dataset()
+        reimbursements.assert_not_called()
+        self.assertEqual(6, len(df))
+        self.assertEqual('category', df['document_type'].dtype.name)
+
+    @patch.object(Adapter, 'reimbursements', new_callable=PropertyMock)
+    def test_load_dataset_with_column_projection(self, reimbursements):
+        adapter = Adapter(self.temp_path, offline=True)
+        df = adapter.load_dataset(['applicant_id', 'net_value'])
+        self.assertEqual(['applicant_id', 'net_value'], df.columns.tolist())
+
+    def test_partitions(self):
+        adapter = Adapter(self.temp_path, offline=True)
+        partitions = list(adapter.partitions(['year', 'document_type']))
+        self.assertEqual(5, len(partitions))
+        self.assertEqual(6, sum(len(df) for df in partitions))
+        categories = ['bill_of_sale', 'simple_receipt', 'expense_made_abroad']
+        for df in partitions:
+            with self.subTest():
+                self.assertEqual(['year', 'document_type'], df.columns.tolist())
+                self.assertEqual(1, df['year'].nunique())
+                self.assertEqual(categories, df['document_type'].cat.categories.tolist())
+
+    def test_dataset_cache_is_invalidated_when_sources_change(self):
+        adapter = Adapter(self.temp_path, offline=True)
+        source = Path(self.temp_path) / 'reimbursements-2016.csv'
+        stat = source.stat()
+        os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertNotEqual(adapter.cached_fingerprint(), adapter.fingerprint())
+        adapter.load_dataset()
+        self.assertEqual(adapter.cached_fingerprint(), adapter.fingerprint())
+
+    def test_coerce_dates(self):
+        adapter = Adapter(self.temp_path, offline=True)
         df = adapter.dataset
         self.assertIn(date(2011, 9, 6), [ts.date() for ts in df.situation_date])
         self.assertIn(date(2009, 6, 1), [ts.date() for ts in df.issue_date])
+
+    def test_reimbursements(self):
+        adapter = Adapter(self.temp_path, offline=True)
+        adapter.log.disabled = False
+        with self.assertLogs(adapter.log, 'INFO') as logs:
+            df = adapter.reimbursements
+        self.assertEqual(list(range(6)), df.index.tolist())
+        self.assertEqual([2009, 2010, 2011, 2011, 2012, 2016], sorted(df['year']))
+        self.assertEqual(object, df['cnpj_cpf'].dtype)
+        self.assertRegex(logs.output[-1], r'Loaded 6 reimbursements from 5 files .* rows/s')
+
+    @patch.object(Adapter, 'merge_datasets', autospec=True,
+                  side_effect=Adapter.merge_datasets)
+    @patch.object(Adapter, 'update_datasets')
+    def test_stages_run_once(self, update_datasets, merge_datasets):
+        adapter = Adapter(self.temp_path, persist=False)
+        self.assertIs(adapter.dataset, adapter.dataset)
+        self.assertIs(adapter.fetch(), adapter.fetch())
+        update_datasets.assert_called_once_with()
+        merge_datasets.assert_called_once_with(adapter)
+
+    def test_prepare_with_columns(self):
+        adapter = Adapter(self.temp_path, offline=True)
+        df = adapter.prepare(['applicant_id', 'net_value'])
+        self.assertEqual(['applicant_id', 'net_value'], df.columns.tolist())
+        self.assertIs(df, adapter.prepare(['applicant_id', 'net_value']))
+        self.assertIsNot(df, adapter.dataset)
+
+    def test_prepared_dataset_is_not_persisted(self):
+        temp_path = mkdtemp()
+        for path in Path(self.temp_path).glob('*'):
+            if path.name != Adapter.DATASET_CACHE:
+                shutil.copy2(path, Path(temp_path) / path.name)
+        adapter = Adapter(temp_path, offline=True, persist=False)
+        self.assertEqual(6, len(adapter.dataset))
+        self.assertFalse((Path(temp_path) / Adapter.DATASET_CACHE).exists())
+        shutil.rmtree(temp_path)
+
+    @patch.object(Adapter, 'update_datasets')
+    def test_offline(self, update_datasets):
+        adapter = Adapter(self.temp_path, offline=True)
+        self.assertEqual(6, len(adapter.dataset))
+        update_datasets.assert_not_called()
+
+    def test_offline_without_downloaded_files(self):
+        temp_path = mkdtemp()
+        with self.assertRaises(FileNotFoundError):
+            Adapter(temp_path, offline=True).dataset
+        shutil.rmtree(temp_path)
+
+    @patch.object(Adapter, 'update_datasets', side_effect=URLError('No network'))
+    def test_unreachable_network(self, update_datasets):
+        adapter = Adapter(self.temp_path)
+        self.assertEqual(6, len(adapter.dataset))
+        update_datasets.assert_called_once_with()
+
+    def test_compact_dtypes(self):
+        self.assertNotIn('congressperson_name', self.dataset.columns)
+        self.assertNotIn('address', self.dataset.columns)
+        self.assertIn('recipient_id', self.dataset.columns)
+        self.assertIn('net_value', self.dataset.columns)
+        for column in ('category', 'legal_entity', 'situation', 'subquota_number'):
+            with self.subTest(column=column):
+                self.assertEqual('category', self.dataset[column].dtype.name)
+        for column in ('applicant_id', 'document_id', 'month', 'year'):
+            with self.subTest(column=column):
+                self.assertEqual('int32', self.dataset[column].dtype.name)
+
+    def test_compact_dtypes_reports_memory_usage(self):
+        adapter = Adapter(self.temp_path, offline=True)
+        df = pd.DataFrame({
+            'applicant_id': ['1', '2', '3'],
+            'category': ['Meal', 'Meal', 'Fuel'],
+            'address': ['Rua A', 'Rua B', 'Rua C'],
+        })
+        before, after = adapter.compact_dtypes(df)
+        self.assertLess(after, before)
+        self.assertEqual(['applicant_id', 'category'], df.columns.tolist())
+
+
+def zipped(year, contents):
+    buffer = BytesIO()
+    with ZipFile(buffer, 'w') as archive:
+        archive.writestr(f'Ano-{year}.csv', contents)
+    return buffer.getvalue()
+
+
+class TestUpdate(TestCase):
+
+    def setUp(self):
+        self.temp_path = mkdtemp()
+        self.files = {f'/Ano-{year}.zip': zipped(year, str(year)) for year in range(2009, 2019)}
+        self.files['/companies.xz'] = b'companies'
+        self.adapter = Adapter(self.temp_path)
+        self.adapter.log.disabled = True
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_path)
+
+    def update(self, server):
+        def converter(year, path):
+            def clean():
+                source = Path(path) / f'Ano-{year}.csv'
+                shutil.copy2(source, Path(path) / f'reimbursements-{year}.csv')
+            return MagicMock(clean=clean)
+
+        urls = {
+            'companies_url': lambda: server.url('/companies.xz'),
+            'reimbursements_url': lambda year: server.url(f'/Ano-{year}.zip'),
+        }
+        with patch.multiple(self.adapter, **urls), \
+                patch('rosie.chamber_of_deputies.adapter.Reimbursements') as reimbursements:
+            reimbursements.side_effect = converter
+            self.adapter.update_datasets()
+        return reimbursements
+
+    @freeze_time('2010-11-12')
+    def test_update(self):
+        with LocalServer(self.files) as server:
+            reimbursements = self.update(server)
+
+        reimbursements.assert_has_calls((call(2009, self.temp_path), call(2010, self.temp_path)),
+                                        any_order=True)
+        self.assertEqual(2, reimbursements.call_count)
+        path = Path(self.temp_path)
+        self.assertEqual(b'companies', (path / Adapter.COMPANIES_DATASET).read_bytes())
+        self.assertEqual('2010', (path / 'reimbursements-2010.csv').read_text())
+
+        with (path / Adapter.MANIFEST).open() as fobj:
+            manifest = json.load(fobj)
+        self.assertEqual({Adapter.COMPANIES_DATASET, 'Ano-2009.zip', 'Ano-2010.zip'},
+                         set(manifest))
+        for entry in manifest.values():
+            with self.subTest():
+                self.assertEqual({'url', 'etag', 'last_modified', 'size', 'sha256'},
+                                 set(entry))
+
+    @freeze_time('2010-11-12')
+    def test_update_skips_unchanged_files(self):
+        with LocalServer(self.files) as server:
+            self.update(server)
+            self.files['/Ano-2010.zip'] = zipped(2010, '2010, revised')
+            reimbursements = self.update(server)
+
+        reimbursements.assert_called_once_with(2010, self.temp_path)
+        self.assertCountEqual(['/companies.xz', '/Ano-2009.zip'], server.paths(304))
+        path = Path(self.temp_path) / 'reimbursements-2010.csv'
+        self.assertEqual('2010, revised', path.read_text())
+
+    @freeze_time('2010-11-12')
+    def test_update_converts_missing_reimbursements(self):
+        with LocalServer(self.files) as server:
+            self.update(server)
+            (Path(self.temp_path) / 'reimbursements-2009.csv').unlink()
+            reimbursements = self.update(server)
+        reimbursements.assert_called_once_with(2009, self.temp_path)
+
+    @freeze_time('2018-11-12')
+    def test_update_with_bounded_concurrency(self):
+        with LocalServer(self.files, delay=.1) as server:
+            self.update(server)
+        self.assertLessEqual(server.max_active, Adapter.DOWNLOAD_WORKERS)
+        self.assertGreater(server.max_active, 1)
+
+    @freeze_time('2010-11-12')
+    def test_update_with_missing_year(self):
+        del self.files['/Ano-2010.zip']
+        with LocalServer(self.files) as server:
+            reimbursements = self.update(server)
+        reimbursements.assert_called_once_with(2009, self.temp_path)
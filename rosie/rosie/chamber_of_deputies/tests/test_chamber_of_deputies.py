@@ -1,4 +1,3 @@
-import os
 import shutil
 from pathlib import Path
 from tempfile import mkdtemp
@@ -22,12 +21,13 @@ class TestChamberOfDeputies(TestCase):
         self.temp_dir = mkdtemp()
         self.classifier = MagicMock()
         self.classifier.__name__ = 'MockedClassifier'
+        self.classifier.COLS = None
 
     def tearDown(self):
         shutil.rmtree(self.temp_dir)
 
     @patch.object(Adapter, 'dataset', new_callable=PropertyMock)
-    @patch('rosie.core.joblib')
+    @patch('rosie.core.models.joblib')
     def test_load_trained_model_trains_model_when_not_persisted(self, _, dataset):
         dataset.return_value = self.dataset
         adapter = Adapter(self.temp_dir)
@@ -36,11 +36,13 @@ class TestChamberOfDeputies(TestCase):
         self.classifier.return_value.fit.assert_called_once_with(self.dataset)
 
     @patch.object(Adapter, 'dataset', new_callable=PropertyMock)
-    @patch('rosie.core.joblib')
+    @patch('rosie.core.models.joblib')
     def test_load_trained_model_doesnt_train_model_when_already_persisted(self, _, dataset):
         dataset.return_value = self.dataset
         adapter = Adapter(self.temp_dir)
         subject = Core(settings, adapter)
-        Path(os.path.join(subject.data_path, 'mockedclassifier.pkl')).touch()
+        path = Path(subject.model_path(self.classifier))
+        path.parent.mkdir()
+        path.touch()
         model = subject.load_trained_model(self.classifier)
         model.fit.assert_not_called()
@@ -0,0 +1,36 @@
+from unittest import TestCase
+
+import numpy as np
+import pandas as pd
+
+from rosie.benchmarks.synthetic import chamber_of_deputies
+from rosie.chamber_of_deputies import features
+from rosie.chamber_of_deputies.classifiers import (
+    MealPriceOutlierClassifier,
+    MonthlySubquotaLimitClassifier,
+    TraveledSpeedsClassifier,
+)
+from rosie.core.features import FeatureStore
+
+
+class TestFeatures(TestCase):
+
+    def test_is_hotel(self):
+        X = pd.DataFrame({'recipient': ['Hotel Ávila', None, 'HOTÉIS', 'Hostel', 'Hotel Ávila']})
+        np.testing.assert_array_equal((True, False, True, False, True),
+                                      features.is_hotel(X))
+
+    def test_same_predictions_with_and_without_store(self):
+        dataset = chamber_of_deputies(20000)
+        store = FeatureStore(dataset)
+        classifiers = (MealPriceOutlierClassifier,
+                       MonthlySubquotaLimitClassifier,
+                       TraveledSpeedsClassifier)
+        for classifier in classifiers:
+            with self.subTest(classifier=classifier.__name__):
+                X = dataset[classifier.COLS]
+                model = classifier().fit(X)
+                expected = np.asarray(model.predict(X))
+                with store.attached(model):
+                    np.testing.assert_array_equal(expected, model.predict(X))
+        self.assertIn(features.is_meal, store.cache)
@@ -59,3 +59,19 @@ class TestIrregularCompaniesClassifier(TestCase):
             result, *_ = self.subject.predict(company)
             with self.subTest():
                 self.assertEqual(result, status.expected, msg=company)
+
+    def test_missing_dates_are_not_suspicious(self):
+        dataset = pd.DataFrame({
+            'situation': ('SUSPENSA',) * 3,
+            'situation_date': (pd.NaT, date(2013, 1, 1), pd.NaT),
+            'issue_date': (pd.Timestamp(2013, 1, 30), pd.NaT, pd.NaT),
+        })
+        self.assertEqual([False] * 3, self.subject.predict(dataset).tolist())
+
+    def test_predict_with_datetime_columns(self):
+        dataset = pd.DataFrame({
+            'situation': ('SUSPENSA', 'SUSPENSA', 'ABERTA'),
+            'situation_date': pd.to_datetime(('2013-01-01',) * 3),
+            'issue_date': pd.to_datetime(('2013-01-30', '2012-12-30', '2013-01-30')),
+        })
+        self.assertEqual([True, False, False], self.subject.predict(dataset).tolist())
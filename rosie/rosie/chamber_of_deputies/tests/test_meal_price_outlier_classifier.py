@@ -89,3 +89,16 @@ class TestMealPriceOutlierClassifier(TestCase):
     def test_predict_inlier_non_meal_expenses_in_companies_also_selling_food(self):
         prediction = self.subject.predict(self.dataset)
         self.assertEqual(1, prediction[79])
+
+    def test_predict_parts_of_the_dataset_with_aggregate(self):
+        expected = self.subject.predict(self.dataset)
+        parts = (self.dataset.iloc[:40], self.dataset.iloc[40:])
+        aggregate = pd.concat([self.subject.aggregate(part) for part in parts])
+        prediction = np.r_[tuple(self.subject.predict(part, aggregate) for part in parts)]
+        assert_array_equal(expected, prediction)
+
+    def test_aggregate_has_one_row_per_company_and_congressperson(self):
+        aggregate = self.subject.aggregate(self.dataset)
+        keys = ['recipient_id', 'applicant_id']
+        self.assertFalse(aggregate.duplicated(keys).any())
+        self.assertLessEqual(aggregate['records'].sum(), len(self.dataset))
@@ -2,6 +2,7 @@ from unittest import TestCase
 
 import numpy as np
 import pandas as pd
+import sklearn
 
 from rosie.chamber_of_deputies.classifiers.monthly_subquota_limit_classifier import MonthlySubquotaLimitClassifier
 
@@ -65,4 +66,19 @@ class TestMonthlySubquotaLimitClassifier(TestCase):
             self.assertEqual(
                 self.prediction[index],
                 row['expected_prediction'],
-                msg='Line {0}: {1}'.format(row, row['test_case_description']))
\ No newline at end of file
+                msg='Line {0}: {1}'.format(row, row['test_case_description']))
+
+    def test_fitted_model_holds_only_the_limits(self):
+        self.assertFalse(hasattr(self.subject, 'X'))
+        self.assertEqual(len(MonthlySubquotaLimitClassifier.LIMITS),
+                         len(self.subject.limits))
+
+    def test_predict_doesnt_depend_on_index_labels(self):
+        dataset = self.dataset.set_index(self.dataset.index[::-1] * 7)
+        prediction = self.subject.predict(dataset)
+        np.testing.assert_array_equal(self.prediction, prediction)
+
+    def test_predict_doesnt_work_before_fitting_the_model(self):
+        subject = MonthlySubquotaLimitClassifier()
+        with self.assertRaises(sklearn.exceptions.NotFittedError):
+            subject.predict(self.dataset)
@@ -1,11 +1,16 @@
+import pickle
 from unittest import TestCase
+from unittest.mock import MagicMock, patch
 
 import numpy as np
 import pandas as pd
 import sklearn
+from geopy.distance import geodesic
 from numpy.testing import assert_array_equal
 
 from rosie.chamber_of_deputies.classifiers.traveled_speeds_classifier import TraveledSpeedsClassifier
+from rosie.chamber_of_deputies.classifiers.traveled_speeds_classifier import DistanceCache
+from rosie.chamber_of_deputies.classifiers.traveled_speeds_classifier import haversine, pairs_within_groups
 
 
 class TestTraveledSpeedsClassifier(TestCase):
@@ -52,11 +57,19 @@ class TestTraveledSpeedsClassifier(TestCase):
         prediction = self.subject.predict(self.dataset)
         self.assertEqual(1, prediction[12])
 
+    def test_fit_learns_a_threshold_for_contamination(self):
+        subject = TraveledSpeedsClassifier(contamination=.6)
+        subject.fit(self.dataset)
+        self.assertEqual(101, subject.threshold)
+
     def test_predict_uses_learned_thresholds_from_fit_dataset(self):
         subject = TraveledSpeedsClassifier(contamination=.6)
         subject.fit(self.dataset)
         assert_array_equal(
-            np.repeat(-1, 6), subject.predict(self.dataset[13:19]))
+            subject.predict(self.dataset)[13:20],
+            subject.predict(self.dataset[13:20]))
+        assert_array_equal(
+            (1, -1, -1, 1, 1, 1, 1), subject.predict(self.dataset[13:20]))
 
     def test_predict_limits_the_number_of_outliers_with_contamination_param(self):
         subject = TraveledSpeedsClassifier(contamination=.5)
@@ -81,3 +94,88 @@ class TestTraveledSpeedsClassifier(TestCase):
     def test_is_company_coordinates_in_brazil(self):
         prediction = self.subject.predict(self.dataset)
         self.assertEqual(1, prediction[28])
+
+    def test_precise_distances_mode(self):
+        subject = TraveledSpeedsClassifier(precise_distances=True)
+        subject.fit(self.dataset)
+        np.testing.assert_allclose(self.subject.polynomial,
+                                   subject.polynomial,
+                                   rtol=.005)
+        assert_array_equal(self.subject.predict(self.dataset),
+                           subject.predict(self.dataset))
+
+    def test_haversine_is_within_half_percent_of_geodesic(self):
+        origins = np.array(((-9.975377, -67.8248977), (-15.7801, -47.9292)))
+        targets = np.array(((-10.6519807, -68.4995996), (-23.5505, -46.6333)))
+        distances = haversine(origins[:, 0], origins[:, 1],
+                              targets[:, 0], targets[:, 1])
+        expected = [geodesic(a, b).km for a, b in zip(origins, targets)]
+        np.testing.assert_allclose(expected, distances, rtol=.005)
+
+    def test_pairs_within_groups(self):
+        first, second = pairs_within_groups(np.array((3, 1, 2)))
+        assert_array_equal((0, 0, 1, 4), first)
+        assert_array_equal((1, 2, 2, 5), second)
+
+    def test_fit_aggregate_of_parts_split_by_applicant(self):
+        applicants = self.dataset['applicant_id'].unique()
+        is_first = self.dataset['applicant_id'].isin(applicants[::2])
+        parts = (self.dataset[is_first], self.dataset[~is_first])
+        aggregate = pd.concat([self.subject.aggregate(part) for part in parts])
+        subject = TraveledSpeedsClassifier().fit_aggregate(aggregate)
+        self.assertEqual(self.subject.threshold, subject.threshold)
+        np.testing.assert_allclose(self.subject.polynomial, subject.polynomial)
+
+    def test_distances_are_cached(self):
+        self.assertTrue(len(self.subject.cache))
+        module = 'rosie.chamber_of_deputies.classifiers.traveled_speeds_classifier'
+        with patch(f'{module}.haversine') as measure:
+            prediction = self.subject.predict(self.dataset)
+        measure.assert_not_called()
+        assert_array_equal(np.repeat(-1, 9), prediction[:9])
+
+    def test_precise_distances_are_cached_apart(self):
+        self.subject.precise_distances = True
+        self.subject.predict(self.dataset)
+        self.assertTrue(self.subject.cache.precise)
+
+    def test_cache_is_not_pickled_with_the_model(self):
+        subject = pickle.loads(pickle.dumps(self.subject))
+        self.assertIsNone(subject.cache)
+        assert_array_equal(self.subject.predict(self.dataset),
+                           subject.predict(self.dataset))
+
+
+class TestDistanceCache(TestCase):
+
+    def setUp(self):
+        self.cache = DistanceCache(max_pairs=3)
+        self.measure = MagicMock(side_effect=lambda positions: positions * 10.)
+
+    def test_keys_of_unordered_pairs(self):
+        places = DistanceCache.places(pd.DataFrame({
+            'recipient_id': ['1', '2', '1'],
+            'latitude': [1., 2., 3.],
+            'longitude': [1., 2., 1.],
+        }))
+        self.assertEqual(3, len(set(places)))  # same recipient, other place
+        keys = DistanceCache.keys(places[[0, 1, 0]], places[[1, 0, 2]])
+        self.assertEqual(keys[0], keys[1])
+        self.assertNotEqual(keys[0], keys[2])
+
+    def test_measures_each_distinct_pair_once(self):
+        keys = np.array((7, 8, 7, 9), dtype=np.uint64)
+        assert_array_equal((0., 10., 0., 30.), self.cache.get(keys, self.measure))
+        assert_array_equal((0, 1, 3), self.measure.call_args[0][0])
+        self.assertTrue(self.cache.changed)
+
+        self.cache.changed = False
+        self.measure.reset_mock()
+        assert_array_equal((30., 0.), self.cache.get(keys[[3, 0]], self.measure))
+        self.measure.assert_not_called()
+        self.assertFalse(self.cache.changed)
+
+    def test_keeps_most_recently_added_pairs(self):
+        self.cache.get(np.array((1, 2, 3), dtype=np.uint64), self.measure)
+        self.cache.get(np.array((2, 4), dtype=np.uint64), self.measure)
+        self.assertEqual([2, 3, 4], sorted(self.cache.distances.index))
@@ -2,7 +2,15 @@ import logging
 import os.path
 
 import numpy as np
-from sklearn.externals import joblib
+
+from rosie.core import output
+from rosie.core.features import FeatureStore
+from rosie.core.incremental import IncrementalRunner
+from rosie.core.models import ModelRegistry
+from rosie.core.parallel import ParallelRunner
+from rosie.core.partitioned import PartitionedRunner
+from rosie.core.profiling import Profiler
+from rosie.core.splice import SpliceRunner
 
 
 class Core:
@@ -24,53 +32,221 @@ class Core:
     * A `dataset` property with the main dataset to be analyzed;
     * A `path` property with the path to the datasets (where the output will be
     saved).
+    * Optionally, a `columns` attribute: before reading the dataset, Core sets
+    it to the only columns it needs (see `Core.columns`), so the adapter can
+    load just them.
+
+    Each classifier should declare the columns it reads in a `COLS` list (the
+    ones described in its docstring). Classifiers are fitted and run with a
+    frame holding only these columns; classifiers without `COLS` get the whole
+    dataset. Classifiers whose `fit` learns nothing from the data (e.g. fixed
+    rules or limits) may set `LEARNS_FROM_DATA = False`, so they can be fitted
+    on any part of the dataset.
+
+    Optionally `jobs` sets the number of worker processes used to run the
+    classifiers in parallel (default is 1, i.e. no parallelism) and
+    `incremental` makes Rosie score only the rows that are new or changed since
+    the previous run (it requires UNIQUE_IDS). A `profiler` (see
+    `rosie.core.profiling.Profiler`) collects time and memory usage of each
+    classifier step. `output_format` is one of the formats in
+    `rosie.core.output` (default is `csv.xz`).
+
+    Fitted models are saved in a `models` directory inside the adapter's path
+    (see `rosie.core.models.ModelRegistry`) and reused while neither the
+    classifier's code nor the data it was fitted on change, as well as the
+    caches some models keep across runs.
+
+    Derived columns requested by classifiers through `rosie.core.features`
+    are computed once and shared by all of them in the `features` store.
+
+    With a number of `partitions`, the dataset is never loaded as a whole (see
+    `rosie.core.partitioned.PartitionedRunner`): the settings module should
+    also have a PARTITION_KEY (str) and the adapter a `partitions` method.
+
+    With the name of a classifier in `only`, just this classifier runs and its
+    predictions replace its column in the suspicions file of a previous run
+    (see `rosie.core.splice.SpliceRunner`).
     """
 
-    def __init__(self, settings, adapter):
+    def __init__(self, settings, adapter, jobs=1, incremental=False,
+                 profiler=None, output_format='csv.xz', partitions=None,
+                 only=None):
+        output.check(output_format)  # before any work, as it is used last
         self.log = logging.getLogger(__name__)
         self.settings = settings
-        self.dataset = adapter.dataset
+        self.jobs = jobs
+        self.incremental = incremental
+        self.profiler = profiler or Profiler()
+        self.output_format = output_format
+        self.partitions = partitions
+        self.only = only
         self.data_path = adapter.path
+        self.models = ModelRegistry(os.path.join(self.data_path, 'models'))
+        self.features = FeatureStore(profiler=self.profiler)
+        if only:
+            SpliceRunner.check(self, only)
+        if partitions:
+            PartitionedRunner.check(self)
+            self.adapter = adapter  # datasets are read one partition at a time
+            self.dataset, self.suspicions = None, None
+            return
+
+        columns = self.columns()
+        if columns and hasattr(adapter, 'columns'):
+            adapter.columns = columns
+        self.dataset = adapter.dataset
+        self.features.reset(self.dataset)
         if self.settings.UNIQUE_IDS:
             self.suspicions = self.dataset[self.settings.UNIQUE_IDS].copy()
         else:
             self.suspicions = self.dataset.copy()
 
     def __call__(self):
-        total = len(self.settings.CLASSIFIERS)
-        running = 1
-        for name, classifier in self.settings.CLASSIFIERS.items():
-            self.log.info(f'Running classifier {running} of {total}: {name}')
-            model = self.load_trained_model(classifier)
-            self.predict(model, name)
-            running += 1
-
-        output = os.path.join(self.data_path, 'suspicions.xz')
-        kwargs = dict(compression='xz', encoding='utf-8', index=False)
-        self.suspicions.to_csv(output, **kwargs)
-
-    def load_trained_model(self, classifier):
-        filename = '{}.pkl'.format(classifier.__name__.lower())
-        path = os.path.join(self.data_path, filename)
-
-        # palliative: this outputs a model too large for joblib
-        if classifier.__name__ == 'MonthlySubquotaLimitClassifier':
-            model = classifier()
-            model.fit(self.dataset)
+        if self.only:
+            SpliceRunner(self, self.only)()
+            return
+
+        if self.partitions:
+            PartitionedRunner(self, self.partitions)()
+            return
+
+        index = None
+        if self.settings.UNIQUE_IDS:
+            index = IncrementalRunner(self)
+
+        updated = self.incremental and index is not None and index()
+        if not updated and self.jobs > 1:
+            self.predict_in_parallel()
+        elif not updated:
+            total = len(self.settings.CLASSIFIERS)
+            running = 1
+            for name, classifier in self.settings.CLASSIFIERS.items():
+                self.log.info(f'Running classifier {running} of {total}: {name}')
+                model = self.load_trained_model(classifier)
+                self.predict(model, name)
+                running += 1
 
+        if index:
+            index.save()
+
+        with self.profiler('output', 'save', rows_in=len(self.suspicions)):
+            path = output.save(self.suspicions, self.data_path, self.output_format)
+        self.log.info(f'Suspicions saved to {path}')
+
+    def columns(self):
+        """
+        Unique identifiers plus the columns declared by all classifiers (or
+        just the one in `only`), or None if any column of the dataset might be
+        needed (i.e. when there are no UNIQUE_IDS, as the whole dataset is
+        saved with the suspicions, or when a classifier does not declare its
+        columns).
+        """
+        if not self.settings.UNIQUE_IDS:
+            return None
+
+        columns = list(self.settings.UNIQUE_IDS)
+        classifiers = self.settings.CLASSIFIERS
+        if self.only:
+            classifiers = {self.only: classifiers[self.only]}
+        for classifier in classifiers.values():
+            declared = getattr(classifier, 'COLS', None)
+            if declared is None:
+                return None
+            columns.extend(col for col in declared if col not in columns)
+        return columns
+
+    def project(self, classifier, dataset=None):
+        """
+        Only the columns declared in the classifier's `COLS` (the dataset
+        itself if it declares none or if there is no other column).
+        """
+        dataset = self.dataset if dataset is None else dataset
+        columns = getattr(classifier, 'COLS', None)
+        if columns is None or list(dataset.columns) == list(columns):
+            return dataset
+        return dataset[columns]
+
+    def model_path(self, classifier, data=None):
+        """
+        Path of the model of a classifier fitted on `data` (its projection
+        of the dataset by default).
+        """
+        data = self.project(classifier) if data is None else data
+        with self.profiler('classifier', 'fingerprint', classifier.__name__, len(data)):
+            fingerprint = self.models.fingerprint(data)
+        return self.models.path(classifier, fingerprint)
+
+    def load_trained_model(self, classifier, aggregate=None, fingerprint=None,
+                           read=None):
+        """
+        Loads the persisted model or fits a new one, using the classifier's
+        `fit_aggregate` if an `aggregate` of the dataset is given.
+
+        Models of data not in memory (see `PartitionedRunner`) are identified
+        by the `fingerprint` of the classifier's projection of the whole
+        dataset and, if there is no aggregate, fitted on the data frame
+        returned by `read()`.
+        """
+        if fingerprint is None:
+            data = self.project(classifier) if aggregate is None else aggregate
+            path = self.model_path(classifier, data)
         else:
-            if os.path.isfile(path):
-                model = joblib.load(path)
-            else:
+            data = aggregate
+            path = self.models.path(classifier, fingerprint)
+
+        if os.path.isfile(path):
+            with self.profiler('classifier', 'load', classifier.__name__):
+                model = self.models.load(path)
+                self.models.load_cache(model)
+        else:
+            data = read() if data is None else data
+            with self.profiler('classifier', 'fit', classifier.__name__, len(data)):
                 model = classifier()
-                model.fit(self.dataset)
-                joblib.dump(model, path)
+                self.models.load_cache(model)
+                with self.features.attached(model):
+                    if aggregate is None:
+                        model.fit(data)
+                    else:
+                        model.fit_aggregate(aggregate)
+            self.models.save(model, path, classifier)
+            self.models.save_cache(model)
 
         return model
 
     def predict(self, model, name):
-        model.transform(self.dataset)
-        prediction = model.predict(self.dataset)
+        prediction = self.run_classifier(model)
+        self.add_suspicions(name, prediction)
+
+    def predict_in_parallel(self):
+        self.log.info(f'Running {len(self.settings.CLASSIFIERS)} classifiers '
+                      f'with {self.jobs} workers')
+        predictions = ParallelRunner(self, self.jobs)()
+        for name in self.settings.CLASSIFIERS:  # keeps the column order
+            self.add_suspicions(name, predictions[name])
+
+    def run_classifier(self, model, dataset=None, aggregate=None):
+        dataset = self.project(model, dataset)
+        name, rows = model.__class__.__name__, len(dataset)
+        with self.features.attached(model):
+            with self.profiler('classifier', 'transform', name, rows):
+                model.transform(dataset)
+            with self.profiler('classifier', 'predict', name, rows) as step:
+                if aggregate is None:
+                    prediction = model.predict(dataset)
+                else:
+                    prediction = model.predict(dataset, aggregate)
+                step['rows_out'] = len(prediction)
+        self.models.save_cache(model)
+        return prediction
+
+    def add_suspicions(self, name, prediction, rows=None):
+        if rows is not None:  # updates just some of the rows
+            prediction = np.r_[prediction]
+            if prediction.dtype == np.int:
+                prediction = prediction == -1
+            self.suspicions.loc[rows, name] = prediction
+            return
+
         self.suspicions[name] = prediction
         if prediction.dtype == np.int:
             self.suspicions.loc[prediction == 1, name] = False
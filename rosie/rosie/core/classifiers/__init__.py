@@ -1 +1 @@
-from rosie.core.classifiers.invalid_cnpj_cpf_classifier import InvalidCnpjCpfClassifier
\ No newline at end of file
+from rosie.core.classifiers.invalid_cnpj_cpf_classifier import InvalidCnpjCpfClassifier, valid_cnpj_cpf
\ No newline at end of file
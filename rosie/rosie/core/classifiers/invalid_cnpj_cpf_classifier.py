@@ -1,6 +1,58 @@
 import numpy as np
+import pandas as pd
 from sklearn.base import TransformerMixin
-from brutils import cpf, cnpj
+
+CPF_WEIGHTS = (np.arange(10, 1, -1), np.arange(11, 1, -1))
+CNPJ_WEIGHTS = (np.r_[np.arange(5, 1, -1), np.arange(9, 1, -1)],
+                np.r_[np.arange(6, 1, -1), np.arange(9, 1, -1)])
+
+
+def _digits(ids, length):
+    """
+    Converts an array of strings (up to `length` characters) into a matrix of
+    digits, left padded with zeros. Also returns a mask of the rows made of
+    digits only.
+    """
+    padded = np.array([value.zfill(length) for value in ids], dtype=f'U{length}')
+    matrix = padded.view(np.uint32).reshape(len(ids), length).astype(np.int64) - 48
+    return matrix, ((matrix >= 0) & (matrix <= 9)).all(axis=1)
+
+
+def _check_digits_match(matrix, weights):
+    """Validates the two last columns of `matrix` as mod 11 check digits."""
+    valid = np.ones(len(matrix), dtype=np.bool)
+    for weight in weights:
+        digits = matrix[:, :len(weight)]
+        remainder = (digits * weight).sum(axis=1) % 11
+        expected = np.where(remainder < 2, 0, 11 - remainder)
+        valid &= matrix[:, len(weight)] == expected
+    return valid
+
+
+def _valid(ids, length, weights):
+    matrix, only_digits = _digits(ids, length)
+    lengths = np.array([len(value) for value in ids], dtype=np.int64)
+    repeated = (matrix == matrix[:, :1]).all(axis=1)
+    return (lengths <= length) & only_digits & ~repeated & \
+        _check_digits_match(matrix, weights)
+
+
+def valid_cnpj_cpf(recipient_ids):
+    """
+    Vectorized validation of CNPJ and CPF check digits, equivalent to
+    `brutils.cnpj.validate(str(value).zfill(14))` or
+    `brutils.cpf.validate(str(value).zfill(11))` for each value. Each distinct
+    value is validated only once. Returns a boolean array.
+    """
+    codes, uniques = pd.factorize(pd.Series(recipient_ids))
+    uniques = np.array([str(value) for value in uniques], dtype=object)
+    valid = np.zeros(len(uniques), dtype=np.bool)
+    if len(uniques):
+        valid = _valid(uniques, 11, CPF_WEIGHTS) | \
+            _valid(uniques, 14, CNPJ_WEIGHTS)
+
+    # missing values (code -1) are never valid
+    return np.r_[valid, False][codes]
 
 
 class InvalidCnpjCpfClassifier(TransformerMixin):
@@ -19,6 +71,11 @@ class InvalidCnpjCpfClassifier(TransformerMixin):
     recipient_id : string column
         A CNPJ (Brazilian company ID) or CPF (Brazilian personal tax ID).
     """
+
+    COLS = ['document_type', 'recipient_id']
+    LEARNS_FROM_DATA = False
+    DOCUMENT_TYPES = ('bill_of_sale', 'simple_receipt', 'unknown')
+
     def fit(self, dataframe):
         return self
 
@@ -26,9 +83,5 @@ class InvalidCnpjCpfClassifier(TransformerMixin):
         return self
 
     def predict(self, dataframe):
-        def is_invalid(row):
-            valid_cpf = cpf.validate(str(row['recipient_id']).zfill(11))
-            valid_cnpj = cnpj.validate(str(row['recipient_id']).zfill(14))
-            good_doctype = row['document_type'] in ('bill_of_sale', 'simple_receipt', 'unknown')
-            return good_doctype and (not (valid_cpf or valid_cnpj))
-        return np.r_[dataframe.apply(is_invalid, axis=1)]
+        good_doctype = dataframe['document_type'].isin(self.DOCUMENT_TYPES).values
+        return good_doctype & ~valid_cnpj_cpf(dataframe['recipient_id'])
@@ -0,0 +1,94 @@
+"""
+Conditional downloads of the source datasets.
+
+A freshness manifest (a JSON file in the data directory) records the ETag,
+Last-Modified, size and SHA-256 hash of each downloaded file. The next
+download of the same file sends `If-None-Match` and `If-Modified-Since`
+headers, so an unchanged file costs a `304 Not Modified` response. When the
+server ignores these headers, the hash of the new download is compared to the
+one in the manifest, so unchanged files can still be told apart and the
+(slow) conversion that follows the download can be skipped.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from threading import Lock
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+CHUNK_SIZE = 2 ** 20
+
+
+class Manifest:
+    """Thread-safe mapping of file names to their freshness entries."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock = Lock()
+        self.entries = {}
+        if self.path.exists():
+            with self.path.open() as fobj:
+                self.entries = json.load(fobj)
+
+    def get(self, name):
+        with self.lock:
+            return self.entries.get(name)
+
+    def update(self, name, entry):
+        """Records the entry of a file and saves the manifest to disk."""
+        with self.lock:
+            self.entries[name] = entry
+            tmp = self.path.with_suffix('.tmp')
+            with tmp.open('w') as fobj:
+                json.dump(self.entries, fobj, indent=2, sort_keys=True)
+            os.replace(str(tmp), str(self.path))
+
+
+def download(url, path, entry=None, timeout=60):
+    """
+    Downloads `url` to `path` unless it did not change since the download
+    described by `entry` (an entry of the manifest, if any). Returns the
+    current entry of the file and whether its contents changed. The file at
+    `path` is only replaced after the download is complete.
+    """
+    path = Path(path)
+    headers = {}
+    if entry and path.exists() and path.stat().st_size == entry.get('size'):
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+    else:
+        entry = None
+
+    try:
+        response = urlopen(Request(url, headers=headers), timeout=timeout)
+    except HTTPError as error:
+        if error.code == 304:
+            return entry, False
+        raise
+
+    digest, size = hashlib.sha256(), 0
+    with response, NamedTemporaryFile(dir=str(path.parent), delete=False) as tmp:
+        try:
+            for chunk in iter(lambda: response.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                size += len(chunk)
+                tmp.write(chunk)
+        except BaseException:
+            tmp.close()
+            os.remove(tmp.name)
+            raise
+
+    new_entry = {
+        'url': url,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'size': size,
+        'sha256': digest.hexdigest(),
+    }
+    os.replace(tmp.name, str(path))
+    changed = not entry or entry.get('sha256') != new_entry['sha256']
+    return new_entry, changed
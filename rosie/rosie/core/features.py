@@ -0,0 +1,115 @@
+"""
+Derived columns shared by classifiers.
+
+Some classifiers derive the same columns from the dataset (e.g. dates parsed
+from `issue_date`, or masks of the rows they apply to). A feature is a
+function taking a data frame and returning one value for each of its rows:
+
+    def is_meal(X):
+        return (X['category'] == 'Meal').values
+
+Classifiers ask for features with `get`:
+
+    meals = X[get(self, is_meal, X)]
+
+While `Core` runs a classifier it attaches its `FeatureStore` to the model,
+so each feature is computed once for the whole dataset, kept in memory and
+shared by every classifier asking for it (features are identified by their
+function, and their values must not be modified). Models used on their own, with no store attached, just call the
+function.
+
+Cached features are evicted, least recently used first, when their total
+size goes over the store's `budget` (in bytes).
+"""
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from rosie.core.profiling import Profiler
+
+
+def get(model, feature, X):
+    """Values of `feature` for the rows of X, using the model's store if any."""
+    store = getattr(model, 'features', None)
+    if store is None:
+        return np.asarray(feature(X))
+    return store.get(feature, X)
+
+
+def nbytes(values):
+    if isinstance(values, np.ndarray) and values.dtype != np.object:
+        return values.nbytes
+    return int(pd.Series(values).memory_usage(index=False, deep=True))
+
+
+class FeatureStore:
+
+    BUDGET = 512 * 1024 ** 2
+
+    def __init__(self, dataset=None, budget=BUDGET, profiler=None):
+        self.log = logging.getLogger(__name__)
+        self.budget = budget
+        self.profiler = profiler or Profiler()
+        self.reset(dataset)
+
+    def reset(self, dataset):
+        """Drops all cached features, which will refer to `dataset` from now."""
+        self.dataset = dataset
+        self.cache = OrderedDict()
+        self.size = 0
+
+    @contextmanager
+    def attached(self, model):
+        """Lets the model use this store, which is not persisted with it."""
+        model.features = self
+        try:
+            yield model
+        finally:
+            del model.features
+
+    def get(self, feature, X):
+        """
+        Values of `feature` for the rows of X. If X has the same rows as the
+        dataset, the feature is computed for the whole dataset and cached. If
+        it has just some of them, the cached feature is used if there is one,
+        otherwise the feature is computed only for these rows (and not
+        cached).
+        """
+        if self.dataset is None:
+            return self.compute(feature, X)
+
+        if X is self.dataset or X.index.equals(self.dataset.index):
+            if feature in self.cache:
+                self.cache.move_to_end(feature)
+                return self.cache[feature][0]
+            values = self.compute(feature, self.dataset)
+            self.store(feature, values)
+            return values
+
+        if feature in self.cache and self.dataset.index.is_unique:
+            positions = self.dataset.index.get_indexer(X.index)
+            if (positions >= 0).all():
+                self.cache.move_to_end(feature)
+                return self.cache[feature][0][positions]
+
+        return self.compute(feature, X)
+
+    def compute(self, feature, X):
+        with self.profiler('feature', 'compute', feature=feature.__name__,
+                           rows_in=len(X)) as step:
+            values = np.asarray(feature(X))
+            step['rows_out'] = len(values)
+        return values
+
+    def store(self, feature, values):
+        size = nbytes(values)
+        while self.cache and self.size + size > self.budget:
+            evicted, (_, evicted_size) = self.cache.popitem(last=False)
+            self.size -= evicted_size
+            self.log.debug(f'Evicting feature {evicted.__name__}')
+        if size <= self.budget:
+            self.cache[feature] = (values, size)
+            self.size += size
@@ -0,0 +1,82 @@
+"""
+Parallel predictions for group-local classifiers.
+
+Classifiers whose predictions for a row depend only on the rows of the same
+group (e.g. the expenses of a congressperson in a day) can predict each part
+of the dataset independently, as long as no group is split. A classifier opts
+in by declaring a `PARTITION_KEY`, one of its `GROUP_KEYS` (e.g.
+`applicant_id`): rows are assigned to partitions by a hash of this column, so
+all rows of a group land in the same partition.
+
+    predictions = predict(model, X, processes=4)
+
+runs `model.predict` for each partition in a pool of processes and
+reassembles the predictions in the original row order. `ParallelRunner`
+(see `rosie.core.parallel`) uses `partition_rows` and `reassemble` to spread
+partitions of these classifiers across its own workers.
+"""
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+
+
+def partition_key(classifier):
+    """The classifier's PARTITION_KEY, or None if it did not opt in."""
+    key = getattr(classifier, 'PARTITION_KEY', None)
+    if key and key not in (getattr(classifier, 'GROUP_KEYS', None) or ()):
+        name = getattr(classifier, '__name__', classifier.__class__.__name__)
+        raise ValueError(f'PARTITION_KEY of {name} must be one of its GROUP_KEYS')
+    return key
+
+
+def partition_numbers(X, key, partitions):
+    """Partition of each row of X, from a hash of its `key` column."""
+    hashes = pd.util.hash_pandas_object(X[key], index=False).values
+    return hashes % partitions
+
+
+def partition_rows(X, key, partitions, partition):
+    """Positions of the rows of X in the given partition."""
+    return np.flatnonzero(partition_numbers(X, key, partitions) == partition)
+
+
+def reassemble(length, parts):
+    """
+    Predictions for all `length` rows from an iterable of (positions,
+    predictions) pairs, one for each partition.
+    """
+    parts = [(rows, np.asarray(values)) for rows, values in parts if len(rows)]
+    if not parts:
+        return np.array(())
+
+    positions, predictions = zip(*parts)
+    positions = np.concatenate(positions)
+    predictions = np.concatenate(predictions)
+    result = np.empty(length, dtype=predictions.dtype)
+    result[positions] = predictions
+    return result
+
+
+def _predict(args):
+    model, X = args
+    return np.asarray(model.predict(X))
+
+
+def predict(model, X, processes, partitions=None):
+    """
+    Runs `model.predict` on `partitions` (default is one per process)
+    partitions of X in a pool of processes.
+    """
+    key = partition_key(model)
+    if not key:
+        raise ValueError(f'{model.__class__.__name__} has no PARTITION_KEY')
+
+    partitions = partitions or processes
+    numbers = partition_numbers(X, key, partitions)
+    positions = [np.flatnonzero(numbers == number) for number in range(partitions)]
+    positions = [rows for rows in positions if len(rows)]
+    tasks = [(model, X.iloc[rows]) for rows in positions]
+    with Pool(processes) as pool:
+        predictions = pool.map(_predict, tasks)
+    return reassemble(len(X), zip(positions, predictions))
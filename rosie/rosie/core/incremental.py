@@ -0,0 +1,173 @@
+"""
+Incremental runs: score only the rows that are new or changed since the
+previous run.
+
+After every run Rosie saves a sidecar index next to the suspicions file. It
+holds the `UNIQUE_IDS` of each row, a hash of the row content and the
+predictions of each classifier, as well as a digest of the model each
+classifier used (see `rosie.core.models.ModelRegistry.digest`). In the next
+incremental run rows whose hash did not change keep their previous
+predictions, and each classifier scores only the changed rows plus the rows
+sharing a group with them (as declared by the classifier's `GROUP_KEYS`, e.g.
+the same applicant and day). The index keeps the group columns as well, so
+groups that lost a row (deleted, or moved to another group) are scored again
+too.
+
+Models are fitted again when the data changes, thus a classifier whose model
+learned something different from the new data (e.g. other clusters of
+companies) scores all rows, as its previous predictions could differ from
+the ones of the new model.
+"""
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+HASH_COLUMN = '_hash'
+GROUP_PREFIX = '_'  # keeps group columns apart from ids and predictions
+
+
+def row_hashes(dataset):
+    return pd.util.hash_pandas_object(dataset, index=False).values
+
+
+def missing(rows, other, columns):
+    """Whether each row has no row in `other` with the same `columns`."""
+    merged = rows[columns].merge(other[columns].drop_duplicates(),
+                                 how='left',
+                                 on=columns,
+                                 indicator=True)
+    return (merged['_merge'] == 'left_only').values
+
+
+class IncrementalRunner:
+
+    FILENAME = 'suspicions-index.pkl'
+
+    def __init__(self, core):
+        self.core = core
+        self.ids = list(core.settings.UNIQUE_IDS)
+        self.path = os.path.join(core.data_path, self.FILENAME)
+        self.log = logging.getLogger(__name__)
+        self._hashes = None
+
+    @staticmethod
+    def read(path):
+        """Suspicions and digests of the models (by classifier) in an index."""
+        index = pd.read_pickle(path)
+        if isinstance(index, pd.DataFrame):  # saved before models were recorded
+            return index, {}
+        return index['suspicions'], index['models']
+
+    @staticmethod
+    def write(path, suspicions, models):
+        pd.to_pickle({'suspicions': suspicions, 'models': models}, path)
+
+    def digest(self, classifier):
+        """Digest of the classifier's model trained on the current dataset."""
+        path = self.core.models.paths.get(classifier)
+        if path is None:  # e.g. trained in a worker process
+            path = self.core.model_path(classifier)
+        return self.core.models.digest(path)
+
+    @property
+    def hashes(self):
+        if self._hashes is None:
+            self._hashes = row_hashes(self.core.dataset)
+        return self._hashes
+
+    def __call__(self):
+        """
+        Updates `core.suspicions` scoring only what changed. Returns `False`
+        (and does nothing) if there is no previous run to start from.
+        """
+        if not os.path.isfile(self.path):
+            self.log.info('No previous run found, scoring all reimbursements')
+            return False
+
+        previous, models = self.read(self.path)
+        dtypes = self.core.dataset[self.ids].dtypes
+        if not previous[self.ids].dtypes.equals(dtypes):
+            self.log.info('Unique identifiers changed their data types since '
+                          'the previous run, scoring all reimbursements')
+            return False
+
+        changed, stale = self.changed_rows(previous)
+        self.log.info(f'{changed.sum():,} new or changed reimbursements '
+                      f'out of {len(changed):,}')
+
+        total = len(self.core.settings.CLASSIFIERS)
+        running = 1
+        for name, classifier in self.core.settings.CLASSIFIERS.items():
+            model = self.core.load_trained_model(classifier)
+            if name in previous.columns and models.get(name) == self.digest(classifier):
+                self.core.suspicions[name] = self.previous_values(previous, name)
+                rows = self.context_rows(classifier, changed, previous, stale)
+            else:  # classifier added or model changed since the previous run
+                rows = np.ones(len(changed), dtype=np.bool)
+
+            self.log.info(f'Running classifier {running} of {total}: {name} '
+                          f'({rows.sum():,} rows)')
+            if rows.all():
+                self.core.predict(model, name)
+            elif rows.any():
+                dataset = self.core.dataset[rows]
+                prediction = self.core.run_classifier(model, dataset)
+                self.core.add_suspicions(name, prediction, rows)
+            running += 1
+
+        return True
+
+    def changed_rows(self, previous):
+        """
+        Whether each current row is new or changed, and whether each row of
+        the previous run was deleted or changed since then.
+        """
+        current = self.core.dataset[self.ids].copy()
+        current[HASH_COLUMN] = self.hashes
+        columns = self.ids + [HASH_COLUMN]
+        return missing(current, previous, columns), missing(previous, current, columns)
+
+    def previous_values(self, previous, name):
+        previous = previous[self.ids + [name]].drop_duplicates(self.ids)
+        merged = self.core.dataset[self.ids].merge(previous, how='left', on=self.ids)
+        return merged[name].values
+
+    def context_rows(self, classifier, changed, previous, stale):
+        """
+        Changed rows plus the rows in their groups, as well as in the groups
+        the stale rows of the previous run were in.
+        """
+        keys = getattr(classifier, 'GROUP_KEYS', None)
+        if not keys:
+            return changed
+        columns = [GROUP_PREFIX + key for key in keys]
+        if not set(columns).issubset(previous.columns):  # saved without groups
+            return np.ones(len(changed), dtype=np.bool)
+        if not changed.any() and not stale.any():
+            return changed
+
+        # hashes match whatever the integer width or categorical data type
+        groups = row_hashes(self.core.dataset[keys])
+        affected = np.concatenate((groups[changed],
+                                   row_hashes(previous.loc[stale, columns])))
+        return np.isin(groups, affected)
+
+    def keys(self):
+        """Group columns of the classifiers, which are kept in the index."""
+        keys = []
+        for classifier in self.core.settings.CLASSIFIERS.values():
+            for key in getattr(classifier, 'GROUP_KEYS', None) or ():
+                if key not in keys:
+                    keys.append(key)
+        return keys
+
+    def save(self):
+        index = self.core.suspicions.copy()
+        for key in self.keys():
+            index[GROUP_PREFIX + key] = self.core.dataset[key].values
+        index[HASH_COLUMN] = self.hashes
+        models = {name: self.digest(classifier)
+                  for name, classifier in self.core.settings.CLASSIFIERS.items()}
+        self.write(self.path, index, models)
@@ -0,0 +1,189 @@
+"""
+Content-addressed storage of fitted models.
+
+Each model is saved as `<classifier>-<version>-<fingerprint>.pkl`, where the
+version is a hash of the source code of the classifier's module and of the
+Rosie modules it imports, e.g. its features (and of scikit-learn's version,
+as pickles are not portable across its releases) and the
+fingerprint is a hash of the data the model was fitted on (see
+`Fingerprint`). Thus a model is
+only reused while neither the classifier nor its training data change;
+otherwise Rosie looks for a file that does not exist and fits a new model.
+
+Only the `keep` most recently used models of each classifier are kept in the
+directory, older ones are deleted whenever a new one is saved.
+
+Classifiers may also declare a `cache` attribute, holding results worth
+keeping across runs whatever data they are used on (e.g. distances between places, see
+`TraveledSpeedsClassifier`). The cache is saved apart from the model, as
+`<classifier>-<version>.cache`, whenever its `changed` flag is set, and
+loaded into every model of the same classifier version.
+"""
+import hashlib
+import inspect
+import logging
+import os
+import sys
+from glob import glob
+
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.externals import joblib
+
+
+class Fingerprint:
+    """
+    Hash of the contents and column names of data frames, updated one data
+    frame at a time. Rows are combined regardless of their order, so the
+    same rows give the same fingerprint whether they are read at once or one
+    partition at a time (see `rosie.core.partitioned`).
+    """
+
+    def __init__(self):
+        self.columns = None
+        self.rows = 0
+        self.sums = [0, 0]
+
+    def update(self, data):
+        hashes = pd.util.hash_pandas_object(data, index=False).values
+        self.columns = list(data.columns)
+        self.rows += len(hashes)
+        # sums wrap around, a second hash of each row makes collisions unlikely
+        for index, values in enumerate((hashes, pd.util.hash_array(hashes))):
+            total = int(values.sum(dtype=np.uint64))
+            self.sums[index] = (self.sums[index] + total) % 2 ** 64
+        return self
+
+    def hexdigest(self):
+        content = f'{self.columns!r}\n{self.rows}\n{self.sums[0]}\n{self.sums[1]}'
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()[:16]
+
+
+class ModelRegistry:
+
+    def __init__(self, directory, keep=2):
+        self.directory = directory
+        self.keep = keep
+        self.log = logging.getLogger(__name__)
+        self.paths = {}  # model last loaded or saved for each classifier
+
+    @staticmethod
+    def modules(classifier):
+        """
+        The classifier's module and the Rosie modules it uses (imported as
+        modules or through their functions and classes), sorted by name.
+        """
+        module = inspect.getmodule(classifier)
+        if module is None:
+            return []
+
+        names = {module.__name__}
+        for value in vars(module).values():
+            name = value.__name__ if inspect.ismodule(value) else \
+                getattr(value, '__module__', None)
+            if isinstance(name, str) and name.split('.')[0] == 'rosie':
+                names.add(name)
+        return [sys.modules[name] for name in sorted(names) if name in sys.modules]
+
+    @staticmethod
+    def version(classifier):
+        """
+        Hash of the classifier's name, the source code of the modules it
+        uses (see `modules`) and scikit-learn version.
+        """
+        sources = [sklearn.__version__, classifier.__name__]
+        try:
+            sources.extend(inspect.getsource(module)
+                           for module in ModelRegistry.modules(classifier))
+        except (OSError, TypeError):  # e.g. classes defined interactively
+            pass
+        digest = hashlib.sha256('\n'.join(sources).encode('utf-8'))
+        return digest.hexdigest()[:12]
+
+    @staticmethod
+    def fingerprint(data):
+        """Hash of the contents and column names of a data frame."""
+        return Fingerprint().update(data).hexdigest()
+
+    def prefix(self, classifier):
+        return classifier.__name__.lower()
+
+    def path(self, classifier, fingerprint):
+        version = self.version(classifier)
+        filename = f'{self.prefix(classifier)}-{version}-{fingerprint}.pkl'
+        return os.path.join(self.directory, filename)
+
+    def artifacts(self, classifier):
+        """Saved models of a classifier, most recently used first."""
+        pattern = os.path.join(self.directory, f'{self.prefix(classifier)}-*.pkl')
+        return sorted(glob(pattern), key=os.path.getmtime, reverse=True)
+
+    def cache_path(self, classifier):
+        version = self.version(classifier)
+        return os.path.join(self.directory, f'{self.prefix(classifier)}-{version}.cache')
+
+    def load(self, path):
+        """
+        Loads a model memory-mapping its NumPy arrays, and marks it as
+        recently used. Arrays are mapped copy-on-write, as some pandas
+        operations (e.g. `merge_asof`) refuse read-only buffers.
+        """
+        os.utime(path)
+        model = joblib.load(path, mmap_mode='c')
+        self.paths[model.__class__] = path
+        return model
+
+    def save(self, model, path, classifier):
+        os.makedirs(self.directory, exist_ok=True)
+        joblib.dump(model, path)
+        self.paths[classifier] = path
+        self.evict(classifier)
+
+    @staticmethod
+    def digest(path):
+        """
+        Hash of the contents of a saved model: models fitted on different
+        data but learning nothing from it (e.g. a table of limits) have the
+        same digest.
+        """
+        digest = hashlib.sha256()
+        with open(path, 'rb') as fobj:
+            for block in iter(lambda: fobj.read(2 ** 20), b''):
+                digest.update(block)
+        return digest.hexdigest()[:16]
+
+    def load_cache(self, model):
+        """Replaces the model's cache by the persisted one, if any."""
+        path = self.cache_path(model.__class__)
+        if hasattr(model.__class__, 'cache') and os.path.isfile(path):
+            model.cache = joblib.load(path)
+
+    def save_cache(self, model):
+        """Saves the model's cache if it changed since it was loaded."""
+        cache = getattr(model, 'cache', None)
+        if not hasattr(model.__class__, 'cache') or cache is None or not cache.changed:
+            return
+
+        cache.changed = False
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.cache_path(model.__class__)
+        temporary = f'{path}.{os.getpid()}'  # workers may save concurrently
+        joblib.dump(cache, temporary)
+        os.replace(temporary, path)
+
+    def evict(self, classifier):
+        """
+        Deletes all but the `keep` most recently used models of a classifier,
+        including the ones saved before this registry existed (directly in
+        the data directory as `<classifier>.pkl`) and the caches of other
+        versions of the classifier.
+        """
+        legacy = os.path.join(os.path.dirname(self.directory),
+                              f'{self.prefix(classifier)}.pkl')
+        caches = glob(os.path.join(self.directory, f'{self.prefix(classifier)}-*.cache'))
+        caches = [path for path in caches if path != self.cache_path(classifier)]
+        for path in self.artifacts(classifier)[self.keep:] + [legacy] + caches:
+            if os.path.isfile(path):
+                self.log.info(f'Removing outdated model {path}')
+                os.remove(path)
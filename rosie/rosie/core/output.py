@@ -0,0 +1,173 @@
+"""
+Writers for the suspicions dataset. Each format is written in chunks of rows
+(so no giant CSV string is built in memory) and compressed using several
+threads:
+
+* `csv.xz`: CSV compressed by the `xz` command line tool with one thread per
+CPU (falling back to Python's single-threaded `lzma` if `xz` is not
+available);
+* `csv.zst`: CSV compressed with Zstandard using one thread per CPU;
+* `parquet`: Parquet file with one row group per chunk.
+
+Writers accept several data frames (with the same columns) one after the
+other, so suspicions can be streamed to the file:
+
+    with writer(directory, 'parquet') as suspicions:
+        for partition in partitions:
+            suspicions.write(partition)
+"""
+import lzma
+import shutil
+import subprocess
+from contextlib import ExitStack
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import zstandard
+
+CHUNK_SIZE = 2 ** 17
+FILENAMES = {
+    'csv.xz': 'suspicions.xz',
+    'csv.zst': 'suspicions.zst',
+    'parquet': 'suspicions.parquet',
+}
+
+
+def chunks(df, chunk_size=CHUNK_SIZE):
+    for start in range(0, max(len(df), 1), chunk_size):
+        yield start, df.iloc[start:start + chunk_size]
+
+
+def csv_chunks(df, chunk_size=CHUNK_SIZE, header=True):
+    for start, chunk in chunks(df, chunk_size):
+        csv = chunk.to_csv(header=header and start == 0, index=False)
+        yield csv.encode('utf-8')
+
+
+class Writer:
+
+    def __init__(self, path):
+        self.path = path
+        self.stack = ExitStack()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.stack.close()
+
+
+class CsvWriter(Writer):
+    """Writes the header just before the first chunk of rows."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.header = True
+        self.stream = None
+
+    def write(self, df):
+        for data in csv_chunks(df, header=self.header):
+            self.stream.write(data)
+        self.header = False
+
+
+class CsvXzWriter(CsvWriter):
+
+    def __init__(self, path):
+        super().__init__(path)
+        xz = shutil.which('xz')
+        if not xz:
+            self.stream = self.stack.enter_context(lzma.open(path, 'wb'))
+            return
+
+        fobj = self.stack.enter_context(open(path, 'wb'))
+        command = (xz, '--compress', '--stdout', '--threads=0')
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=fobj)
+
+        def wait():
+            if process.wait():
+                raise subprocess.CalledProcessError(process.returncode, command)
+
+        self.stack.callback(wait)
+        self.stream = self.stack.enter_context(process.stdin)
+
+
+class CsvZstWriter(CsvWriter):
+
+    def __init__(self, path):
+        super().__init__(path)
+        compressor = zstandard.ZstdCompressor(threads=-1)
+        fobj = self.stack.enter_context(open(path, 'wb'))
+        self.stream = self.stack.enter_context(compressor.stream_writer(fobj))
+
+
+class ParquetWriter(Writer):
+    """The schema comes from the first data frame written."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.schema = None
+        self.writer = None
+
+    def write(self, df):
+        if self.writer is None:
+            self.schema = pa.Schema.from_pandas(df, preserve_index=False)
+            self.writer = pq.ParquetWriter(str(self.path), self.schema)
+            self.stack.callback(self.writer.close)
+
+        for _, chunk in chunks(df):
+            table = pa.Table.from_pandas(chunk, schema=self.schema, preserve_index=False)
+            self.writer.write_table(table)
+
+
+WRITERS = {
+    'csv.xz': CsvXzWriter,
+    'csv.zst': CsvZstWriter,
+    'parquet': ParquetWriter,
+}
+
+
+def check(output_format):
+    """Raises ValueError if `output_format` is not one of the known formats."""
+    if output_format not in WRITERS:
+        formats = ', '.join(WRITERS)
+        raise ValueError(f'Output format must be one of: {formats}')
+
+
+def path(directory, output_format='csv.xz'):
+    check(output_format)
+    return Path(directory) / FILENAMES[output_format]
+
+
+def writer(directory, output_format='csv.xz'):
+    """Opens a writer for the suspicions file in the given format."""
+    suspicions = path(directory, output_format)
+    return WRITERS[output_format](suspicions)
+
+
+def read(directory, output_format='csv.xz', dtype=None):
+    """
+    Reads a suspicions file in the given format. CSV columns are parsed as
+    the given `dtype` (a type or a dict of types by column, as in
+    `pandas.read_csv`).
+    """
+    suspicions = path(directory, output_format)
+    if output_format == 'parquet':
+        return pd.read_parquet(suspicions)
+    if output_format == 'csv.zst':
+        with open(suspicions, 'rb') as fobj:
+            with zstandard.ZstdDecompressor().stream_reader(fobj) as stream:
+                return pd.read_csv(stream, dtype=dtype)
+    return pd.read_csv(suspicions, dtype=dtype, compression='xz')
+
+
+def save(df, directory, output_format='csv.xz'):
+    """Saves `df` in the given format and returns the path of the file."""
+    with writer(directory, output_format) as suspicions:
+        suspicions.write(df)
+    return suspicions.path
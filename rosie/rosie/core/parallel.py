@@ -0,0 +1,206 @@
+"""
+Helpers to run Rosie's classifiers in worker processes.
+
+The main process dumps the columns the classifiers read once to a file in
+the data directory, with text columns as categoricals. Each worker then loads
+it with `mmap_mode='r'` when it starts, so numeric columns and the codes of
+categorical ones are shared through the page cache: only the distinct values
+of text columns are unpickled in every worker. Text columns are decoded (to
+objects referencing these distinct values) just for the classifier running.
+
+Workers do not build a whole `Core` (with its suspicions and feature store),
+only a `Worker` able to load models and run classifiers.
+
+Classifiers declaring a PARTITION_KEY (see `rosie.core.grouped`) are fitted
+first and then predict one partition of the dataset per task, so a slow
+group-local classifier is spread across all workers.
+"""
+import logging
+import os
+import shutil
+from collections import defaultdict
+from importlib import import_module
+from multiprocessing import Pool
+from tempfile import mkdtemp
+
+import numpy as np
+from sklearn.externals import joblib
+
+from rosie.core import grouped
+from rosie.core.features import FeatureStore
+from rosie.core.models import ModelRegistry
+from rosie.core.profiling import Profiler
+
+_worker = {}
+
+
+def shared(dataset, columns=None):
+    """
+    The `columns` of the dataset (all of them if None) to be shared with
+    workers, with object columns as categoricals. Returns the data frame and
+    the names of the columns converted.
+    """
+    if columns is not None:
+        dataset = dataset[columns]
+    converted = [column for column in dataset.columns
+                 if dataset[column].dtype == np.object]
+    if converted:
+        dataset = dataset.assign(**{column: dataset[column].astype('category')
+                                    for column in converted})
+    return dataset, converted
+
+
+class Worker:
+    """
+    The parts of a `Core` instance a worker process needs: loading (or
+    fitting) models and running classifiers on the shared dataset. Features
+    are not cached, as each worker runs just a few classifiers.
+    """
+
+    def __init__(self, core_class, settings, dataset, converted, data_path):
+        self.core_class = core_class
+        self.settings = settings
+        self.dataset = dataset
+        self.converted = set(converted)
+        self.profiler = Profiler()
+        self.models = ModelRegistry(os.path.join(data_path, 'models'))
+        self.features = FeatureStore(profiler=self.profiler)
+
+    def project(self, classifier, dataset=None):
+        """Projection of the dataset (see `Core.project`) with text decoded."""
+        dataset = self.core_class.project(self, classifier, dataset)
+        decode = self.converted.intersection(dataset.columns)
+        if not decode:
+            return dataset
+        return dataset.assign(**{column: dataset[column].astype(np.object)
+                                 for column in decode})
+
+    def model_path(self, classifier, data=None):
+        return self.core_class.model_path(self, classifier, data)
+
+    def load_trained_model(self, classifier, aggregate=None):
+        return self.core_class.load_trained_model(self, classifier, aggregate)
+
+    def run_classifier(self, model, dataset=None, aggregate=None):
+        return self.core_class.run_classifier(self, model, dataset, aggregate)
+
+
+def initialize(core_class, settings_module, dataset_path, data_path):
+    """Loads settings and the memory-mapped dataset once per worker."""
+    settings = import_module(settings_module)
+    dataset, converted = joblib.load(dataset_path, mmap_mode='r')
+    _worker['core'] = Worker(core_class, settings, dataset, converted, data_path)
+
+
+def model(name):
+    """Trains (or loads) a classifier once per worker."""
+    core = _worker['core']
+    models = _worker.setdefault('models', {})
+    if name not in models:
+        classifier = core.settings.CLASSIFIERS[name]
+        models[name] = core.load_trained_model(classifier)
+    return models[name]
+
+
+def fit(name):
+    """Trains (or loads) a classifier inside a worker, persisting it."""
+    core = _worker['core']
+    core.profiler = core.features.profiler = Profiler()
+    model(name)
+    return name, core.profiler.steps
+
+
+def run(task):
+    """
+    Runs a classifier inside a worker, on the whole dataset or (if `task`
+    has a partition number) just on the rows of that partition.
+    """
+    name, partition, partitions = task
+    core = _worker['core']
+    core.profiler = core.features.profiler = Profiler()
+    if partition is None:
+        return name, None, core.run_classifier(model(name)), core.profiler.steps
+
+    classifier = core.settings.CLASSIFIERS[name]
+    key = grouped.partition_key(classifier)
+    rows = grouped.partition_rows(core.dataset, key, partitions, partition)
+    prediction = ()
+    if len(rows):
+        dataset = core.dataset.iloc[rows]
+        prediction = core.run_classifier(model(name), dataset)
+    return name, rows, prediction, core.profiler.steps
+
+
+class ParallelRunner:
+    """
+    Runs each classifier of a `Core` instance in a pool of `jobs` processes
+    and returns a dict with the predictions keyed by classifier name.
+
+    Classifiers are handed to workers one at a time, so the slow ones (e.g.
+    `TraveledSpeedsClassifier`) do not hold back the cheap ones.
+    """
+
+    def __init__(self, core, jobs):
+        self.core = core
+        self.jobs = jobs
+        self.log = logging.getLogger(__name__)
+
+    def __call__(self):
+        directory = mkdtemp(dir=self.core.data_path)
+        dataset_path = os.path.join(directory, 'dataset.pkl')
+        try:
+            joblib.dump(shared(self.core.dataset, self.columns()), dataset_path)
+            return self.run(dataset_path)
+        finally:
+            shutil.rmtree(directory)
+
+    def columns(self):
+        """Columns declared by the classifiers (None if any declares none)."""
+        columns = []
+        for classifier in self.core.settings.CLASSIFIERS.values():
+            declared = getattr(classifier, 'COLS', None)
+            if declared is None:
+                return None
+            columns.extend(col for col in declared if col not in columns)
+        return columns
+
+    def tasks(self):
+        """
+        One task for each classifier, or one for each partition in the case
+        of classifiers with a PARTITION_KEY.
+        """
+        for name, classifier in self.core.settings.CLASSIFIERS.items():
+            if grouped.partition_key(classifier):
+                for partition in range(self.jobs):
+                    yield name, partition, self.jobs
+            else:
+                yield name, None, None
+
+    def run(self, dataset_path):
+        tasks = tuple(self.tasks())
+        partitioned = {name for name, partition, _ in tasks if partition is not None}
+        initargs = (
+            self.core.__class__,
+            self.core.settings.__name__,
+            dataset_path,
+            self.core.data_path
+        )
+        predictions, parts = {}, defaultdict(list)
+        with Pool(self.jobs, initialize, initargs) as pool:
+            # fits these models once, before their partitions run in parallel
+            for name, steps in pool.imap_unordered(fit, sorted(partitioned)):
+                self.core.profiler.extend(steps)
+
+            for name, rows, prediction, steps in pool.imap_unordered(run, tasks):
+                self.core.profiler.extend(steps)
+                if rows is None:
+                    self.log.info(f'Classifier {name} finished')
+                    predictions[name] = prediction
+                    continue
+
+                parts[name].append((rows, prediction))
+                if len(parts[name]) == self.jobs:
+                    self.log.info(f'Classifier {name} finished')
+                    length = len(self.core.dataset)
+                    predictions[name] = grouped.reassemble(length, parts.pop(name))
+        return predictions
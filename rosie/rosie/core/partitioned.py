@@ -0,0 +1,182 @@
+"""
+Out-of-core execution: runs Rosie's classifiers one partition of the dataset
+at a time instead of loading the whole dataset in memory.
+
+The adapter yields the prepared dataset in chunks (e.g. one year at a time)
+and each chunk is split in `partitions` files on disk by a hash of the
+settings' PARTITION_KEY (e.g. `applicant_id`). Then each partition is read,
+classified and appended to the suspicions file.
+
+Classifiers fit in this scheme when their groups never cross partitions:
+row-local classifiers (no GROUP_KEYS) and classifiers whose GROUP_KEYS
+include the PARTITION_KEY. Others (e.g. `MealPriceOutlierClassifier`,
+grouping by company) must implement `aggregate(X)`, returning a compact
+aggregate of X that can be concatenated with the aggregates of the other
+partitions, and accept it in `predict(X, aggregate)`. Models that learn from
+the whole dataset also need `fit_aggregate(aggregate)`.
+
+Models are identified by a fingerprint of each classifier's projection of the
+whole dataset, computed while splitting it, which is the same as in runs
+loading the whole dataset (see `rosie.core.models.Fingerprint`): both modes
+share persisted models. Models to be fitted are fitted on the aggregate if
+the classifier has `fit_aggregate`, on the partition in memory if it does
+not learn from the data (`LEARNS_FROM_DATA = False`), otherwise on its
+projection of all partitions (i.e. the whole dataset in memory).
+"""
+import logging
+import os
+import shutil
+from collections import defaultdict
+from functools import partial
+from tempfile import mkdtemp
+
+import pandas as pd
+
+from rosie.core import output
+from rosie.core.models import Fingerprint
+
+
+class PartitionedRunner:
+
+    def __init__(self, core, partitions):
+        self.core = core
+        self.partitions = partitions
+        self.log = logging.getLogger(__name__)
+        self.directory = None
+        self.files = defaultdict(list)
+        self.fingerprints = {}
+
+    @staticmethod
+    def check(core):
+        """Raises ValueError if `core` cannot run in partitioned mode."""
+        settings = core.settings
+        key = getattr(settings, 'PARTITION_KEY', None)
+        if not key or not settings.UNIQUE_IDS:
+            raise ValueError('Partitioned mode requires PARTITION_KEY and '
+                             'UNIQUE_IDS settings')
+        if core.incremental:
+            raise ValueError('Partitioned mode cannot run incrementally')
+
+        for name, classifier in settings.CLASSIFIERS.items():
+            if not PartitionedRunner.is_local(classifier, key) and \
+                    not hasattr(classifier, 'aggregate'):
+                raise ValueError(f'Groups of {name} cross partitions by {key}')
+
+    @staticmethod
+    def is_local(classifier, key):
+        """Whether predictions for a partition depend only on its own rows."""
+        keys = getattr(classifier, 'GROUP_KEYS', None)
+        return not keys or key in keys
+
+    def __call__(self):
+        self.directory = mkdtemp(dir=self.core.data_path)
+        try:
+            self.split()
+            return self.run()
+        finally:
+            shutil.rmtree(self.directory)
+
+    def split(self):
+        """
+        Saves each chunk of the dataset to its partition files, and
+        fingerprints the projection of each classifier.
+        """
+        key = self.core.settings.PARTITION_KEY
+        classifiers = self.core.settings.CLASSIFIERS
+        fingerprints = {name: Fingerprint() for name in classifiers}
+        for number, chunk in enumerate(self.core.adapter.partitions(self.core.columns())):
+            self.log.info(f'Splitting {len(chunk):,} rows in partitions')
+            for name, classifier in classifiers.items():
+                fingerprints[name].update(self.core.project(classifier, chunk))
+            hashes = pd.util.hash_pandas_object(chunk[key], index=False)
+            partitions = hashes.values % self.partitions
+            for partition in pd.unique(partitions):
+                path = os.path.join(self.directory, f'{partition}-{number}.pkl')
+                chunk[partitions == partition].to_pickle(path)
+                self.files[partition].append(path)
+
+        self.fingerprints = {name: fingerprint.hexdigest()
+                             for name, fingerprint in fingerprints.items()}
+
+    def read(self, partition):
+        paths = self.files[partition]
+        return pd.concat((pd.read_pickle(path) for path in paths),
+                         ignore_index=True)
+
+    def projection(self, classifier):
+        """The classifier's projection of all partitions."""
+        return pd.concat((self.core.project(classifier, self.read(partition))
+                          for partition in sorted(self.files)), ignore_index=True)
+
+    def fit_data(self, classifier):
+        """Function returning the data to fit the classifier on."""
+        if getattr(classifier, 'LEARNS_FROM_DATA', True):
+            return partial(self.projection, classifier)
+        return partial(self.core.project, classifier, self.core.dataset)
+
+    def model_path(self, name):
+        classifier = self.core.settings.CLASSIFIERS[name]
+        return self.core.models.path(classifier, self.fingerprints[name])
+
+    def aggregates(self):
+        """
+        Aggregates of the whole dataset, for the classifiers that need it to
+        predict (their groups cross partitions) or to be fitted (when there
+        is no persisted model).
+        """
+        key = self.core.settings.PARTITION_KEY
+        classifiers = {
+            name: classifier
+            for name, classifier in self.core.settings.CLASSIFIERS.items()
+            if not self.is_local(classifier, key) or
+            (hasattr(classifier, 'fit_aggregate') and
+             not os.path.isfile(self.model_path(name)))
+        }
+        if not classifiers:
+            return {}
+
+        parts = defaultdict(list)
+        for partition in sorted(self.files):
+            dataset = self.read(partition)
+            for name, classifier in classifiers.items():
+                self.log.info(f'Aggregating partition {partition} for {name}')
+                projection = self.core.project(classifier, dataset)
+                parts[name].append(classifier().aggregate(projection))
+
+        return {name: pd.concat(parts[name], ignore_index=True)
+                for name in classifiers}
+
+    def run(self):
+        settings = self.core.settings
+        aggregates = self.aggregates()
+        models = {}
+        with output.writer(self.core.data_path, self.core.output_format) as suspicions:
+            for partition in sorted(self.files):
+                self.log.info(f'Running classifiers on partition {partition} '
+                              f'of {self.partitions}')
+                self.core.dataset = self.read(partition)
+                self.core.features.reset(self.core.dataset)
+                self.core.suspicions = self.core.dataset[settings.UNIQUE_IDS].copy()
+                for name, classifier in settings.CLASSIFIERS.items():
+                    if name not in models:
+                        aggregate = None
+                        if hasattr(classifier, 'fit_aggregate'):
+                            aggregate = aggregates.get(name)
+                        models[name] = self.core.load_trained_model(
+                            classifier,
+                            aggregate,
+                            self.fingerprints[name],
+                            self.fit_data(classifier)
+                        )
+
+                    aggregate = None
+                    if not self.is_local(classifier, settings.PARTITION_KEY):
+                        aggregate = aggregates[name]
+                    prediction = self.core.run_classifier(models[name], aggregate=aggregate)
+                    self.core.add_suspicions(name, prediction)
+
+                with self.core.profiler('output', 'save', rows_in=len(self.core.suspicions)):
+                    suspicions.write(self.core.suspicions)
+
+        self.log.info(f'Suspicions saved to {suspicions.path}')
+        return suspicions.path
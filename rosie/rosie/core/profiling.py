@@ -0,0 +1,72 @@
+import json
+import logging
+import resource
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+from time import perf_counter, process_time
+
+
+def peak_rss():
+    """Peak resident set size of this process, in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':  # bytes in macOS, kilobytes elsewhere
+        return peak / 1024 ** 2
+    return peak / 1024
+
+
+class Profiler:
+    """
+    Records wall time, CPU time, peak RSS and row counts of each step of a
+    Rosie run. Steps are grouped by stage (e.g. `adapter`, `classifier`) and
+    classifier steps are also labeled with the classifier name:
+
+        with profiler('classifier', 'predict', 'MyClassifier', rows_in=42) as step:
+            prediction = model.predict(dataset)
+            step['rows_out'] = len(prediction)
+
+    Steps computing derived columns (see `rosie.core.features`) are labeled
+    with the feature name instead:
+
+        with profiler('feature', 'compute', feature='is_meal', rows_in=42):
+            values = is_meal(dataset)
+
+    CPU time and memory refer to the current process only.
+    """
+
+    def __init__(self):
+        self.log = logging.getLogger(__name__)
+        self.started_at = datetime.now().isoformat()
+        self.steps = []
+
+    @contextmanager
+    def __call__(self, stage, step, classifier=None, rows_in=None, feature=None):
+        record = {'stage': stage, 'step': step}
+        if classifier:
+            record['classifier'] = classifier
+        if feature:
+            record['feature'] = feature
+        record['rows_in'] = rows_in
+        record['rows_out'] = None
+
+        wall, cpu, rss = perf_counter(), process_time(), peak_rss()
+        try:
+            yield record
+        finally:
+            record['wall_time'] = perf_counter() - wall
+            record['cpu_time'] = process_time() - cpu
+            record['peak_rss_mb'] = peak_rss()
+            record['peak_rss_delta_mb'] = record['peak_rss_mb'] - rss
+            self.steps.append(record)
+
+    def extend(self, steps):
+        """Adds steps recorded elsewhere (e.g. by a worker process)."""
+        self.steps.extend(steps)
+
+    def report(self):
+        return {'started_at': self.started_at, 'steps': self.steps}
+
+    def save(self, path):
+        self.log.info(f'Saving profiling report to {path}')
+        with open(path, 'w') as fobj:
+            json.dump(self.report(), fobj, indent=2)
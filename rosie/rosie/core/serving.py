@@ -0,0 +1,253 @@
+"""
+Scoring daemon: keeps the trained models and the context they need in
+memory, so new reimbursements are scored in milliseconds instead of a whole
+Rosie run.
+
+A `Scorer` takes a `Core` instance (i.e. the dataset already loaded) and, for
+each classifier, prepares what scoring a few rows needs besides the rows
+themselves:
+
+* Classifiers with no GROUP_KEYS only need the rows;
+* Classifiers whose groups are local to the PARTITION_KEY (e.g. expenses of a
+  congressperson in a month), or that cannot aggregate, need the rows of
+  the dataset in the same groups, found through a sorted hash index;
+* Other classifiers need their aggregate of the dataset (e.g. statistics of
+  each company), of which only the groups of the new rows are used.
+
+Rows missing the settings' COMPANY_COLUMNS (the ones merged from the
+companies dataset) get them from the latest row of the same COMPANY_KEY in
+the dataset. Predictions are the same as in a run on the dataset plus the
+new rows, with the same models.
+
+`serve` exposes a scorer over HTTP, on a local TCP port or a Unix socket:
+
+    POST /score with a JSON list of rows (using the dataset column names)
+    GET / with the classifiers and number of rows in memory
+
+Requests are handled one at a time. Models call `predict` directly (no
+profiling or feature store) and their caches are saved when the server
+stops.
+"""
+import json
+import logging
+import os
+import socketserver
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_categorical_dtype, is_datetime64_any_dtype
+
+from rosie.core.partitioned import PartitionedRunner
+
+
+def hashes(df, columns):
+    return pd.util.hash_pandas_object(df[columns], index=False).values
+
+
+class GroupIndex:
+    """Finds the rows of a data frame in the same groups as other rows."""
+
+    def __init__(self, df, keys):
+        self.keys = keys
+        values = hashes(df, keys)
+        self.order = np.argsort(values, kind='mergesort')
+        self.hashes = values[self.order]
+
+    def rows(self, other):
+        """Positions (sorted) of the rows in the same groups as `other`'s."""
+        values = np.unique(hashes(other, self.keys))
+        start = np.searchsorted(self.hashes, values, side='left')
+        lengths = np.searchsorted(self.hashes, values, side='right') - start
+        offsets = np.arange(lengths.sum()) - \
+            np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return np.sort(self.order[np.repeat(start, lengths) + offsets])
+
+
+class Scorer:
+
+    def __init__(self, core):
+        self.log = logging.getLogger(__name__)
+        self.core = core
+        self.settings = core.settings
+        dataset = core.dataset
+        self.ids = self.settings.UNIQUE_IDS
+        if self.ids:
+            self.row_ids = hashes(dataset, self.ids)
+            self.sorted_ids = np.sort(self.row_ids)
+
+        self.company_key = getattr(self.settings, 'COMPANY_KEY', None)
+        self.companies = None
+        if self.company_key:
+            columns = getattr(self.settings, 'COMPANY_COLUMNS', [])
+            self.companies = dataset[[self.company_key] + columns] \
+                .drop_duplicates(self.company_key, keep='last') \
+                .set_index(self.company_key)
+
+        self.models, self.contexts = {}, {}
+        key = getattr(self.settings, 'PARTITION_KEY', None)
+        for name, classifier in self.settings.CLASSIFIERS.items():
+            self.log.info(f'Loading classifier {name}')
+            self.models[name] = core.load_trained_model(classifier)
+            keys = getattr(classifier, 'GROUP_KEYS', None)
+            if not keys:
+                continue
+            if PartitionedRunner.is_local(classifier, key) or \
+                    not hasattr(classifier, 'aggregate'):
+                self.contexts[name] = ('rows', GroupIndex(dataset, keys))
+            else:
+                with core.features.attached(self.models[name]) as model:
+                    aggregate = model.aggregate(core.project(classifier))
+                self.contexts[name] = ('aggregate', aggregate, GroupIndex(aggregate, keys))
+
+        # cached features refer to the rows of the dataset, not to the batches
+        core.features.reset(None)
+
+    def close(self):
+        """Saves what models cached while scoring (see `ModelRegistry`)."""
+        for model in self.models.values():
+            self.core.models.save_cache(model)
+
+    def status(self):
+        return {'classifiers': list(self.models), 'rows': len(self.core.dataset)}
+
+    def prepare(self, rows):
+        """
+        Data frame of the submitted rows (a list of dicts), with the data
+        types of the dataset and the company columns it misses.
+        """
+        batch = pd.DataFrame.from_records(rows)
+        if self.companies is not None and self.company_key in batch:
+            for column in self.companies.columns.difference(batch.columns):
+                batch[column] = batch[self.company_key].map(self.companies[column])
+
+        dataset = self.core.dataset
+        for column in batch.columns.intersection(dataset.columns):
+            dtype = dataset[column].dtype
+            if is_categorical_dtype(dtype):  # keeps values not in categories
+                dtype = dtype.categories.dtype
+            if is_datetime64_any_dtype(dtype):
+                batch[column] = pd.to_datetime(batch[column], errors='coerce')
+            elif batch[column].dtype != dtype:
+                batch[column] = batch[column].astype(dtype)
+        return batch
+
+    def known(self, batch):
+        """Whether each row of the batch is already in the dataset."""
+        if not self.ids or not len(self.sorted_ids):
+            return np.zeros(len(batch), dtype=np.bool)
+        values = hashes(batch, self.ids)
+        positions = np.searchsorted(self.sorted_ids, values)
+        return self.sorted_ids[positions.clip(max=len(self.sorted_ids) - 1)] == values
+
+    def predict(self, name, batch, known):
+        model = self.models[name]
+        context = self.contexts.get(name)
+        if context is None:
+            return model.predict(self.core.project(model, batch))
+
+        if context[0] == 'aggregate':
+            _, aggregate, index = context
+            new = self.core.project(model, batch[~known])
+            aggregate = pd.concat([aggregate.iloc[index.rows(batch)],
+                                   model.aggregate(new)], ignore_index=True)
+            return model.predict(self.core.project(model, batch), aggregate)
+
+        # rows of the dataset in the same groups, but the ones resubmitted
+        _, index = context
+        rows = index.rows(batch)
+        if self.ids:
+            rows = rows[~np.isin(self.row_ids[rows], hashes(batch, self.ids))]
+        context = self.core.project(model, self.core.dataset.iloc[rows])
+        X = pd.concat([context, self.core.project(model, batch)], ignore_index=True)
+        return np.r_[model.predict(X)][len(context):]
+
+    def __call__(self, rows):
+        """Suspicions of each row (a dict) as a data frame."""
+        batch = self.prepare(rows)
+        known = self.known(batch)
+        suspicions = batch[self.ids].copy() if self.ids else pd.DataFrame(index=batch.index)
+        for name in self.models:
+            prediction = np.r_[self.predict(name, batch, known)]
+            if prediction.dtype == np.int:
+                prediction = prediction == -1
+            suspicions[name] = prediction.astype(np.bool)
+        return suspicions
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'  # keeps connections open between requests
+
+    def do_GET(self):
+        if self.path != '/':
+            return self.respond(404, {'error': f'Not found: {self.path}'})
+        self.respond(200, self.server.scorer.status())
+
+    def do_POST(self):
+        if self.path != '/score':
+            return self.respond(404, {'error': f'Not found: {self.path}'})
+
+        started = perf_counter()
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            rows = json.loads(self.rfile.read(length).decode('utf-8'))
+            if not isinstance(rows, list):
+                raise ValueError('expected a list of rows')
+            suspicions = self.server.scorer(rows)
+        except (KeyError, TypeError, ValueError) as error:
+            return self.respond(400, {'error': f'Invalid rows: {error}'})
+
+        elapsed = (perf_counter() - started) * 1000
+        self.respond(200, {
+            'elapsed_ms': round(elapsed, 3),
+            'suspicions': json.loads(suspicions.to_json(orient='records',
+                                                        date_format='iso')),
+        })
+
+    def respond(self, status, content):
+        body = json.dumps(content).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # client addresses of Unix sockets are empty
+        logging.getLogger(__name__).debug(format % args)
+
+
+class UnixHTTPServer(socketserver.UnixStreamServer):
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        super().server_bind()
+
+
+def server(scorer, port=None, socket=None):
+    """An HTTP server (not started) on the Unix `socket` or a local `port`."""
+    if socket:
+        httpd = UnixHTTPServer(socket, Handler)
+    else:
+        httpd = HTTPServer(('127.0.0.1', port), Handler)
+    httpd.scorer = scorer
+    return httpd
+
+
+def serve(core, port=None, socket=None):
+    scorer = Scorer(core)
+    httpd = server(scorer, port, socket)
+    address = socket or f'http://127.0.0.1:{httpd.server_address[1]}'
+    logging.getLogger(__name__).info(f'Rosie is scoring reimbursements at {address}')
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        scorer.close()
+        if socket and os.path.exists(socket):
+            os.remove(socket)
@@ -0,0 +1,101 @@
+"""
+Single classifier runs: scores the dataset with just one classifier and
+splices its column into the suspicions file of a previous run, matching rows
+by `UNIQUE_IDS`. The other columns (and the rows of the previous file) are
+kept as they were, so after changing a classifier only it has to run again.
+
+The sidecar index of incremental runs (see `rosie.core.incremental`) is
+patched as well, so the next incremental run keeps the new predictions.
+"""
+import logging
+import os
+
+import numpy as np
+from pandas.api.types import is_numeric_dtype
+
+from rosie.core import output
+from rosie.core.incremental import IncrementalRunner
+
+
+class SpliceRunner:
+
+    def __init__(self, core, name):
+        self.core = core
+        self.name = name
+        self.ids = list(core.settings.UNIQUE_IDS or ())
+        self.log = logging.getLogger(__name__)
+
+    @staticmethod
+    def check(core, name):
+        """Raises ValueError if `core` cannot run just the `name` classifier."""
+        if name not in core.settings.CLASSIFIERS:
+            names = ', '.join(core.settings.CLASSIFIERS)
+            raise ValueError(f'Unknown classifier {name}, choose one of: {names}')
+        if not core.settings.UNIQUE_IDS:
+            raise ValueError('Running a single classifier requires UNIQUE_IDS')
+        if core.partitions:
+            raise ValueError('Partitioned mode cannot run a single classifier')
+
+    def __call__(self):
+        previous = self.read()
+        classifier = self.core.settings.CLASSIFIERS[self.name]
+        self.log.info(f'Running classifier {self.name}')
+        model = self.core.load_trained_model(classifier)
+        self.core.predict(model, self.name)
+
+        suspicions = self.splice(previous)
+        with self.core.profiler('output', 'save', rows_in=len(suspicions)):
+            path = output.save(suspicions, self.core.data_path, self.core.output_format)
+        self.log.info(f'Suspicions saved to {path}')
+
+        index_path = os.path.join(self.core.data_path, IncrementalRunner.FILENAME)
+        if os.path.isfile(index_path):
+            index, models = IncrementalRunner.read(index_path)
+            models[self.name] = self.core.models.digest(self.core.models.paths[classifier])
+            IncrementalRunner.write(index_path, self.splice(index), models)
+        return path
+
+    def read(self):
+        """Previous suspicions, with identifiers typed as in the dataset."""
+        path = output.path(self.core.data_path, self.core.output_format)
+        if not path.exists():
+            raise FileNotFoundError(f'Cannot run a single classifier without '
+                                    f'the suspicions of a previous run ({path})')
+
+        dtypes = self.core.dataset[self.ids].dtypes
+        as_text = {column: str for column in self.ids if not is_numeric_dtype(dtypes[column])}
+        previous = output.read(self.core.data_path, self.core.output_format, as_text)
+        for column in self.ids:
+            if previous[column].dtype != dtypes[column]:
+                previous[column] = previous[column].astype(dtypes[column])
+        return previous
+
+    def splice(self, previous):
+        """
+        Previous suspicions with the classifier's column replaced (or added)
+        by the current predictions. Previous rows missing from the dataset
+        keep their previous values.
+        """
+        current = self.core.suspicions[self.ids + [self.name]] \
+            .drop_duplicates(self.ids) \
+            .rename(columns={self.name: '_current'})
+        merged = previous[self.ids].merge(current, how='left', on=self.ids)
+        found = merged['_current'].notnull().values
+
+        missing = len(found) - found.sum()
+        if missing:
+            self.log.warning(f'{missing:,} reimbursements of the previous run are '
+                             f'not in the dataset, keeping their {self.name}')
+        new = len(current) - len(merged.loc[found, self.ids].drop_duplicates())
+        if new > 0:
+            self.log.warning(f'{new:,} reimbursements are not in the previous '
+                             f'run, run all classifiers to add them')
+
+        values = merged['_current'].values
+        if self.name in previous:
+            values = np.where(found, values, previous[self.name].values)
+        previous = previous.copy()
+        previous[self.name] = values
+        if found.all():
+            previous[self.name] = previous[self.name].astype(np.bool)
+        return previous
@@ -0,0 +1,92 @@
+from email.utils import formatdate
+from hashlib import md5
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from threading import Lock, Thread
+from time import sleep
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class LocalServer:
+    """
+    Stand-in for the servers Rosie downloads datasets from: serves the
+    contents of `files` (path to bytes) in a local port with ETag and
+    Last-Modified headers (unless `conditional` is False) and records the
+    requests it gets.
+    """
+
+    def __init__(self, files=None, conditional=True, delay=0):
+        self.files = files or {}
+        self.conditional = conditional
+        self.delay = delay
+        self.requests = []
+        self.active, self.max_active = 0, 0
+        self.lock = Lock()
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), self.handler())
+        self.thread = Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def url(self, path):
+        host, port = self.httpd.server_address
+        return f'http://{host}:{port}{path}'
+
+    def paths(self, status=None):
+        return [path for path, code, _ in self.requests
+                if status is None or code == status]
+
+    def handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with server.lock:
+                    server.active += 1
+                    server.max_active = max(server.max_active, server.active)
+                try:
+                    sleep(server.delay)
+                    self.respond()
+                finally:
+                    with server.lock:
+                        server.active -= 1
+
+            def respond(self):
+                contents = server.files.get(self.path)
+                if contents is None:
+                    return self.reply(404)
+
+                etag = f'"{md5(contents).hexdigest()}"'
+                if server.conditional and self.headers.get('If-None-Match') == etag:
+                    return self.reply(304)
+
+                headers = {'Content-Length': str(len(contents))}
+                if server.conditional:
+                    headers['ETag'] = etag
+                    headers['Last-Modified'] = formatdate(usegmt=True)
+                self.reply(200, headers, contents)
+
+            def reply(self, status, headers=None, contents=b''):
+                with server.lock:
+                    server.requests.append((self.path, status, dict(self.headers)))
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                if status != 200:
+                    self.send_header('Content-Length', '0')
+                self.end_headers()
+                self.wfile.write(contents)
+
+        return Handler
@@ -1,11 +1,13 @@
 import os
+from tempfile import TemporaryDirectory
 from unittest import TestCase
-from unittest.mock import MagicMock, call, patch
+from unittest.mock import MagicMock, PropertyMock, call, patch
 
 import numpy as np
 import pandas as pd
 
 from rosie.core import Core
+from rosie.core.models import ModelRegistry
 
 DATAFRAME = pd.DataFrame({'number': (1, 2), 'text': ('one', 'two')})
 
@@ -15,7 +17,9 @@ class TestCore(TestCase):
     def setUp(self):
         self.adapter = MagicMock()
         self.adapter.dataset = DATAFRAME
-        self.adapter.path = os.path.join('tmp', 'test')
+        temp = TemporaryDirectory()
+        self.addCleanup(temp.cleanup)
+        self.adapter.path = temp.name
 
     def test_init_with_unique_ids(self):
         settings = MagicMock()
@@ -29,9 +33,18 @@ class TestCore(TestCase):
         core = Core(settings, self.adapter)
         self.assertTrue(core.suspicions.equals(DATAFRAME))
 
+    def test_init_with_invalid_output_format(self):
+        dataset = PropertyMock(return_value=DATAFRAME)
+        type(self.adapter).dataset = dataset
+        with self.assertRaises(ValueError):
+            Core(MagicMock(), self.adapter, output_format='csv.gz')
+        dataset.assert_not_called()
+
+    @patch('rosie.core.IncrementalRunner')
+    @patch('rosie.core.output.save')
     @patch.object(Core, 'load_trained_model')
     @patch.object(Core, 'predict')
-    def test_call(self, mocked_predict, mocked_load):
+    def test_call(self, mocked_predict, mocked_load, mocked_save, mocked_index):
         mocked_load.return_value = 'model'
         settings = MagicMock()
         settings.UNIQUE_IDS = ['number']
@@ -48,64 +61,73 @@ class TestCore(TestCase):
         ), any_order=True)
 
         # assert suspicions.xz was created
-        expected_path = os.path.join('tmp', 'test', 'suspicions.xz')
-        core.suspicions.to_csv.assert_called_once_with(
-            expected_path,
-            compression='xz',
-            encoding='utf-8',
-            index=False
+        mocked_save.assert_called_once_with(
+            core.suspicions,
+            self.adapter.path,
+            'csv.xz'
         )
 
     @patch('rosie.core.os.path.isfile')
-    @patch('rosie.core.joblib')
-    def test_load_trained_model_without_pickle(self, joblib, isfile):
+    @patch.object(ModelRegistry, 'save')
+    def test_load_trained_model_without_pickle(self, save, isfile):
         isfile.return_value = False
 
         ClassifierClass, classifier_instance = MagicMock(), MagicMock()
         ClassifierClass.return_value = classifier_instance
         ClassifierClass.__name__ = 'ClassifierMock'
+        ClassifierClass.COLS = None
 
         settings = MagicMock()
         settings.UNIQUE_IDS = ['number']
         core = Core(settings, self.adapter)
         core.load_trained_model(ClassifierClass)
 
-        expected_path = os.path.join('tmp', 'test', 'classifiermock.pkl')
+        expected_path = core.model_path(ClassifierClass)
+        self.assertTrue(expected_path.startswith(os.path.join(self.adapter.path, 'models', 'classifiermock-')))
         classifier_instance.fit.assert_called_once_with(core.dataset)
-        joblib.dump.assert_called_once_with(classifier_instance, expected_path)
+        save.assert_called_once_with(classifier_instance, expected_path, ClassifierClass)
 
     @patch('rosie.core.os.path.isfile')
-    @patch('rosie.core.joblib')
-    def test_load_trained_model_with_pickle(self, joblib, isfile):
+    @patch.object(ModelRegistry, 'load')
+    def test_load_trained_model_with_pickle(self, load, isfile):
         isfile.return_value = True
 
         ClassifierClass, classifier_instance = MagicMock(), MagicMock()
         ClassifierClass.return_value = classifier_instance
         ClassifierClass.__name__ = 'ClassifierMock'
+        ClassifierClass.COLS = None
 
         settings = MagicMock()
         settings.UNIQUE_IDS = ['number']
         core = Core(settings, self.adapter)
         core.load_trained_model(ClassifierClass)
 
-        expected_path = os.path.join('tmp', 'test', 'classifiermock.pkl')
         self.assertFalse(classifier_instance.fit.called)
-        joblib.load.assert_called_once_with(expected_path)
+        load.assert_called_once_with(core.model_path(ClassifierClass))
+
+    @patch('rosie.core.os.path.isfile')
+    @patch.object(ModelRegistry, 'load')
+    def test_load_trained_model_for_subquota_with_pickle(self, load, isfile):
+        isfile.return_value = True
 
-    def test_load_trained_model_for_subquota(self):
         ClassifierClass, classifier_instance = MagicMock(), MagicMock()
         ClassifierClass.return_value = classifier_instance
         ClassifierClass.__name__ = 'MonthlySubquotaLimitClassifier'
+        ClassifierClass.COLS = None
 
         settings = MagicMock()
         settings.UNIQUE_IDS = ['number']
         core = Core(settings, self.adapter)
         core.load_trained_model(ClassifierClass)
 
-        classifier_instance.fit.assert_called_once_with(core.dataset)
+        expected_path = core.model_path(ClassifierClass)
+        self.assertIn('monthlysubquotalimitclassifier-', expected_path)
+        self.assertFalse(classifier_instance.fit.called)
+        load.assert_called_once_with(expected_path)
 
     def test_predict(self):
         model = MagicMock()
+        model.COLS = None
         model.predict.return_value = np.array((1, -1), dtype=np.int)
 
         settings = MagicMock()
@@ -116,3 +138,61 @@ class TestCore(TestCase):
         model.predict.assert_called_once_with(core.dataset)
         self.assertFalse(core.suspicions.iloc[0]['hypothesis'])
         self.assertTrue(core.suspicions.iloc[1]['hypothesis'])
+
+    def test_predict_with_declared_columns(self):
+        model = MagicMock()
+        model.COLS = ['text']
+        model.predict.return_value = np.array((True, False))
+
+        settings = MagicMock()
+        settings.UNIQUE_IDS = ['number']
+        core = Core(settings, self.adapter)
+        core.predict(model, 'hypothesis')
+        dataset, = model.predict.call_args[0]
+        self.assertEqual(['text'], list(dataset.columns))
+        self.assertEqual([True, False], list(core.suspicions['hypothesis']))
+
+    @patch('rosie.core.os.path.isfile')
+    @patch.object(ModelRegistry, 'save')
+    def test_fit_with_declared_columns(self, save, isfile):
+        isfile.return_value = False
+
+        ClassifierClass, classifier_instance = MagicMock(), MagicMock()
+        ClassifierClass.return_value = classifier_instance
+        ClassifierClass.__name__ = 'ClassifierMock'
+        ClassifierClass.COLS = ['number']
+
+        settings = MagicMock()
+        settings.UNIQUE_IDS = ['number']
+        core = Core(settings, self.adapter)
+        core.load_trained_model(ClassifierClass)
+        dataset, = classifier_instance.fit.call_args[0]
+        self.assertEqual(['number'], list(dataset.columns))
+
+    def test_columns(self):
+        first, second = MagicMock(), MagicMock()
+        first.COLS = ['text', 'number']
+        second.COLS = ['date', 'text']
+        settings = MagicMock()
+        settings.UNIQUE_IDS = ['number']
+        settings.CLASSIFIERS = {'first': first, 'second': second}
+        core = Core(settings, self.adapter)
+        self.assertEqual(['number', 'text', 'date'], core.columns())
+        self.assertEqual(['number', 'text', 'date'], self.adapter.columns)
+
+    def test_columns_with_undeclared_columns(self):
+        declared, undeclared = MagicMock(), MagicMock()
+        declared.COLS = ['text']
+        undeclared.COLS = None
+        settings = MagicMock()
+        settings.UNIQUE_IDS = ['number']
+        settings.CLASSIFIERS = {'declared': declared, 'undeclared': undeclared}
+        self.assertIsNone(Core(settings, self.adapter).columns())
+
+    def test_columns_without_unique_ids(self):
+        classifier = MagicMock()
+        classifier.COLS = ['text']
+        settings = MagicMock()
+        settings.UNIQUE_IDS = None
+        settings.CLASSIFIERS = {'classifier': classifier}
+        self.assertIsNone(Core(settings, self.adapter).columns())
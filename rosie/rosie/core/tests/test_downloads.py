@@ -0,0 +1,87 @@
+import shutil
+from pathlib import Path
+from tempfile import mkdtemp
+from unittest import TestCase
+from urllib.error import HTTPError
+
+from rosie.core.downloads import Manifest, download
+from rosie.core.tests.server import LocalServer
+
+
+class TestDownload(TestCase):
+
+    def setUp(self):
+        self.temp_path = mkdtemp()
+        self.path = Path(self.temp_path) / 'companies.xz'
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_path)
+
+    def test_download(self):
+        with LocalServer({'/companies.xz': b'42'}) as server:
+            entry, changed = download(server.url('/companies.xz'), self.path)
+        self.assertTrue(changed)
+        self.assertEqual(b'42', self.path.read_bytes())
+        self.assertEqual(2, entry['size'])
+        self.assertIsNotNone(entry['etag'])
+        self.assertIsNotNone(entry['last_modified'])
+        self.assertEqual(64, len(entry['sha256']))
+
+    def test_unchanged_file_is_not_downloaded_again(self):
+        with LocalServer({'/companies.xz': b'42'}) as server:
+            entry, _ = download(server.url('/companies.xz'), self.path)
+            new_entry, changed = download(server.url('/companies.xz'), self.path, entry)
+        self.assertFalse(changed)
+        self.assertEqual(entry, new_entry)
+        self.assertEqual([200, 304], [status for _, status, _ in server.requests])
+        _, _, headers = server.requests[-1]
+        self.assertEqual(entry['etag'], headers['If-None-Match'])
+
+    def test_changed_file(self):
+        with LocalServer({'/companies.xz': b'42'}) as server:
+            entry, _ = download(server.url('/companies.xz'), self.path)
+            server.files['/companies.xz'] = b'43'
+            new_entry, changed = download(server.url('/companies.xz'), self.path, entry)
+        self.assertTrue(changed)
+        self.assertNotEqual(entry['sha256'], new_entry['sha256'])
+        self.assertEqual(b'43', self.path.read_bytes())
+
+    def test_unchanged_file_from_server_without_conditional_requests(self):
+        with LocalServer({'/companies.xz': b'42'}, conditional=False) as server:
+            entry, _ = download(server.url('/companies.xz'), self.path)
+            _, changed = download(server.url('/companies.xz'), self.path, entry)
+        self.assertFalse(changed)
+        self.assertEqual([200, 200], [status for _, status, _ in server.requests])
+
+    def test_missing_local_file_is_downloaded_again(self):
+        with LocalServer({'/companies.xz': b'42'}) as server:
+            entry, _ = download(server.url('/companies.xz'), self.path)
+            self.path.unlink()
+            _, changed = download(server.url('/companies.xz'), self.path, entry)
+        self.assertTrue(changed)
+        self.assertEqual(b'42', self.path.read_bytes())
+        self.assertNotIn('If-None-Match', server.requests[-1][-1])
+
+    def test_failed_download_keeps_local_file(self):
+        self.path.write_bytes(b'42')
+        with LocalServer() as server:
+            with self.assertRaises(HTTPError):
+                download(server.url('/companies.xz'), self.path)
+        self.assertEqual(b'42', self.path.read_bytes())
+        self.assertEqual(['companies.xz'], [p.name for p in Path(self.temp_path).iterdir()])
+
+
+class TestManifest(TestCase):
+
+    def setUp(self):
+        self.temp_path = mkdtemp()
+        self.path = Path(self.temp_path) / 'manifest.json'
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_path)
+
+    def test_update(self):
+        manifest = Manifest(self.path)
+        self.assertIsNone(manifest.get('companies.xz'))
+        manifest.update('companies.xz', {'size': 2})
+        self.assertEqual({'size': 2}, Manifest(self.path).get('companies.xz'))
@@ -0,0 +1,126 @@
+import pickle
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+import numpy as np
+import pandas as pd
+
+from rosie.core import Core
+from rosie.core.features import FeatureStore, get
+
+calls = []
+
+
+def double(X):
+    calls.append('double')
+    return X['value'].values * 2
+
+
+def positive(X):
+    calls.append('positive')
+    return (X['value'] > 0).values
+
+
+def negative(X):
+    calls.append('negative')
+    return (X['value'] < 0).values
+
+
+class DoubleClassifier:
+
+    COLS = ['value']
+
+    def fit(self, X):
+        return self
+
+    def transform(self, X=None):
+        return self
+
+    def predict(self, X):
+        return get(self, double, X) > 4
+
+
+class TestFeatureStore(TestCase):
+
+    def setUp(self):
+        calls.clear()
+        self.dataset = pd.DataFrame({'value': np.arange(-5., 5.)})
+        self.store = FeatureStore(self.dataset)
+
+    def test_computes_feature_once(self):
+        first = self.store.get(double, self.dataset)
+        second = self.store.get(double, self.dataset[['value']])
+        np.testing.assert_array_equal(np.arange(-10., 10., 2), first)
+        self.assertIs(first, second)
+        self.assertEqual(['double'], calls)
+
+    def test_subset_uses_cached_feature(self):
+        self.store.get(double, self.dataset)
+        subset = self.dataset.iloc[[7, 2, 3]]
+        np.testing.assert_array_equal((4., -6., -4.), self.store.get(double, subset))
+        self.assertEqual(['double'], calls)
+
+    def test_subset_is_computed_but_not_cached(self):
+        subset = self.dataset[self.dataset['value'] > 2]
+        np.testing.assert_array_equal((6., 8.), self.store.get(double, subset))
+        self.assertEqual({}, self.store.cache)
+
+    def test_evicts_least_recently_used_features(self):
+        self.store.budget = 95  # 80 bytes of floats, 10 of booleans
+        self.store.get(double, self.dataset)
+        self.store.get(positive, self.dataset)
+        self.assertEqual([double, positive], list(self.store.cache))
+        self.store.get(double, self.dataset)
+        self.assertEqual([positive, double], list(self.store.cache))
+        self.store.get(negative, self.dataset)
+        self.assertEqual([double, negative], list(self.store.cache))
+        self.assertEqual(90, self.store.size)
+
+    def test_does_not_cache_features_over_budget(self):
+        self.store.budget = 50
+        self.store.get(double, self.dataset)
+        self.assertEqual([], list(self.store.cache))
+        self.assertEqual(0, self.store.size)
+
+    def test_reset(self):
+        self.store.get(double, self.dataset)
+        dataset = pd.DataFrame({'value': (1., 2.)})
+        self.store.reset(dataset)
+        np.testing.assert_array_equal((2., 4.), self.store.get(double, dataset))
+        self.assertEqual(['double', 'double'], calls)
+
+    def test_attached_store_is_not_persisted(self):
+        model = DoubleClassifier()
+        with self.store.attached(model):
+            self.assertIs(self.store, model.features)
+        self.assertFalse(hasattr(model, 'features'))
+        self.assertFalse(hasattr(pickle.loads(pickle.dumps(model)), 'features'))
+
+    def test_get_without_store(self):
+        np.testing.assert_array_equal((False, True),
+                                      DoubleClassifier().predict(pd.DataFrame({'value': (1, 3)})))
+
+
+class TestCoreFeatures(TestCase):
+
+    def setUp(self):
+        calls.clear()
+        self.settings = MagicMock()
+        self.settings.UNIQUE_IDS = ['id']
+        self.settings.CLASSIFIERS = {'first': DoubleClassifier,
+                                     'second': DoubleClassifier}
+        self.adapter = MagicMock()
+        self.adapter.dataset = pd.DataFrame({'id': range(4), 'value': range(4)})
+        self.core = Core(self.settings, self.adapter)
+        self.core.load_trained_model = lambda classifier: classifier()
+
+    def test_classifiers_share_features(self):
+        for name, classifier in self.settings.CLASSIFIERS.items():
+            self.core.predict(self.core.load_trained_model(classifier), name)
+        self.assertEqual(['double'], calls)
+        self.assertEqual([False, False, False, True],
+                         list(self.core.suspicions['second']))
+        steps = [step for step in self.core.profiler.steps if step['stage'] == 'feature']
+        self.assertEqual(1, len(steps))
+        self.assertEqual('double', steps[0]['feature'])
+        self.assertNotIn('classifier', steps[0])
@@ -0,0 +1,81 @@
+from unittest import TestCase
+
+import numpy as np
+import pandas as pd
+
+from rosie.benchmarks.synthetic import chamber_of_deputies
+from rosie.chamber_of_deputies.classifiers import (
+    MonthlySubquotaLimitClassifier,
+    TraveledSpeedsClassifier,
+)
+from rosie.core import grouped
+
+
+class DailyTotalClassifier:
+    """Flags expenses of days whose total is above 100."""
+
+    GROUP_KEYS = ['applicant_id', 'day']
+    PARTITION_KEY = 'applicant_id'
+
+    def predict(self, X):
+        totals = X.groupby(self.GROUP_KEYS)['value'].transform('sum')
+        return (totals > 100).values
+
+
+class TestGrouped(TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(42)
+        self.dataset = pd.DataFrame({
+            'applicant_id': random.randint(0, 30, 1000).astype(str),
+            'day': random.randint(0, 10, 1000),
+            'value': random.uniform(0, 50, 1000),
+        })
+
+    def test_partition_rows(self):
+        partitions = [grouped.partition_rows(self.dataset, 'applicant_id', 3, number)
+                      for number in range(3)]
+        positions = np.sort(np.concatenate(partitions))
+        np.testing.assert_array_equal(np.arange(1000), positions)
+        applicants = [set(self.dataset['applicant_id'].iloc[rows]) for rows in partitions]
+        self.assertFalse(applicants[0] & applicants[1])
+        self.assertFalse(applicants[1] & applicants[2])
+        self.assertFalse(applicants[0] & applicants[2])
+
+    def test_reassemble(self):
+        parts = [(np.array((3, 0)), np.array((True, False))),
+                 (np.array(()), np.array(())),
+                 (np.array((1, 2)), np.array((False, True)))]
+        np.testing.assert_array_equal((False, False, True, True),
+                                      grouped.reassemble(4, parts))
+
+    def test_predict(self):
+        classifier = DailyTotalClassifier()
+        expected = classifier.predict(self.dataset)
+        self.assertTrue(expected.any())
+        prediction = grouped.predict(classifier, self.dataset, processes=2, partitions=5)
+        np.testing.assert_array_equal(expected, prediction)
+
+    def test_predict_chamber_of_deputies_classifiers(self):
+        dataset = chamber_of_deputies(20000)
+        for classifier in (MonthlySubquotaLimitClassifier, TraveledSpeedsClassifier):
+            with self.subTest(classifier=classifier.__name__):
+                X = dataset[classifier.COLS]
+                model = classifier().fit(X)
+                expected = np.asarray(model.predict(X))
+                prediction = grouped.predict(model, X, processes=2, partitions=3)
+                np.testing.assert_array_equal(expected, prediction)
+
+    def test_partition_key_must_be_a_group_key(self):
+        class Classifier:
+            GROUP_KEYS = ['recipient_id']
+            PARTITION_KEY = 'applicant_id'
+
+        self.assertIsNone(grouped.partition_key(object))
+        self.assertEqual('applicant_id', grouped.partition_key(DailyTotalClassifier))
+        with self.assertRaises(ValueError):
+            grouped.partition_key(Classifier)
+
+    def test_predict_requires_partition_key(self):
+        with self.assertRaises(ValueError):
+            grouped.predict(object(), self.dataset, processes=2)
@@ -0,0 +1,208 @@
+import os
+import shutil
+from collections import OrderedDict
+from tempfile import mkdtemp
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+import numpy as np
+import pandas as pd
+
+from rosie.benchmarks.synthetic import chamber_of_deputies
+from rosie.chamber_of_deputies import settings
+from rosie.core import Core
+from rosie.core.incremental import IncrementalRunner
+
+SCORED_ROWS = []
+
+
+class OddValueClassifier:
+
+    def fit(self, X):
+        return self
+
+    def transform(self, X=None):
+        pass
+
+    def predict(self, X):
+        SCORED_ROWS.append(('odd', len(X)))
+        return np.r_[X['value'] % 2 == 1]
+
+
+class ExpensiveGroupClassifier:
+
+    GROUP_KEYS = ['group']
+
+    def fit(self, X):
+        return self
+
+    def transform(self, X=None):
+        pass
+
+    def predict(self, X):
+        SCORED_ROWS.append(('group', len(X)))
+        totals = X.groupby('group')['value'].transform('sum')
+        return np.where(totals > 10, -1, 1)
+
+
+class AboveMeanClassifier:
+    """Learns from the data: flags values above the mean."""
+
+    def fit(self, X):
+        self.mean = X['value'].mean()
+        return self
+
+    def transform(self, X=None):
+        pass
+
+    def predict(self, X):
+        SCORED_ROWS.append(('mean', len(X)))
+        return np.r_[X['value'] > self.mean]
+
+
+class TestIncrementalRunner(TestCase):
+
+    def setUp(self):
+        SCORED_ROWS.clear()
+        self.temp_path = mkdtemp()
+        self.dataset = pd.DataFrame({
+            'id': (1, 2, 3, 4, 5),
+            'group': ('a', 'a', 'b', 'b', 'c'),
+            'value': (2, 4, 6, 8, 1),
+        })
+        self.settings = MagicMock()
+        self.settings.UNIQUE_IDS = ['id']
+        self.settings.CLASSIFIERS = OrderedDict((
+            ('odd', OddValueClassifier),
+            ('group', ExpensiveGroupClassifier),
+        ))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_path)
+
+    def run_core(self, dataset, incremental=True):
+        adapter = MagicMock()
+        adapter.dataset = dataset
+        adapter.path = self.temp_path
+        core = Core(self.settings, adapter, incremental=incremental)
+        core()
+        return core
+
+    def test_first_run_scores_everything_and_saves_index(self):
+        self.run_core(self.dataset)
+        self.assertEqual([('odd', 5), ('group', 5)], SCORED_ROWS)
+        path = os.path.join(self.temp_path, IncrementalRunner.FILENAME)
+        self.assertTrue(os.path.isfile(path))
+
+    def test_unchanged_dataset_scores_nothing(self):
+        self.run_core(self.dataset)
+        SCORED_ROWS.clear()
+        core = self.run_core(self.dataset.copy())
+        self.assertEqual([], SCORED_ROWS)
+        self.assertEqual([False, False, False, False, True],
+                         core.suspicions['odd'].tolist())
+
+    def test_ids_with_new_data_types_score_everything(self):
+        self.run_core(self.dataset)
+        SCORED_ROWS.clear()
+        dataset = self.dataset.copy()
+        dataset['id'] = dataset['id'].astype(np.int32)
+        self.run_core(dataset)
+        self.assertEqual([('odd', 5), ('group', 5)], SCORED_ROWS)
+
+    def test_changed_and_new_rows_are_scored_with_their_groups(self):
+        self.run_core(self.dataset)
+        SCORED_ROWS.clear()
+
+        dataset = self.dataset.copy()
+        dataset.loc[1, 'value'] = 9
+        dataset = dataset.append(
+            pd.DataFrame({'id': (6,), 'group': ('c',), 'value': (3,)}),
+            ignore_index=True
+        )
+        core = self.run_core(dataset)
+
+        self.assertEqual([('odd', 2), ('group', 4)], SCORED_ROWS)
+        full = self.run_core(dataset, incremental=False)
+        for name in self.settings.CLASSIFIERS:
+            with self.subTest():
+                self.assertEqual(full.suspicions[name].tolist(),
+                                 core.suspicions[name].tolist())
+
+    def assertSameAsFullRun(self, dataset, incremental):
+        full = self.run_core(dataset, incremental=False)
+        for name in self.settings.CLASSIFIERS:
+            with self.subTest(name=name):
+                self.assertEqual(full.suspicions[name].tolist(),
+                                 incremental.suspicions[name].tolist())
+
+    def test_groups_of_deleted_rows_are_scored(self):
+        self.run_core(self.dataset)
+        SCORED_ROWS.clear()
+
+        dataset = self.dataset[self.dataset['id'] != 3].reset_index(drop=True)
+        core = self.run_core(dataset)
+
+        self.assertEqual([('group', 1)], SCORED_ROWS)  # the other row of b
+        self.assertEqual([False, False, False, False], core.suspicions['group'].tolist())
+        self.assertSameAsFullRun(dataset, core)
+
+    def test_previous_groups_of_moved_rows_are_scored(self):
+        self.run_core(self.dataset)
+        SCORED_ROWS.clear()
+
+        dataset = self.dataset.copy()
+        dataset.loc[3, 'group'] = 'c'
+        core = self.run_core(dataset)
+
+        self.assertEqual([('odd', 1), ('group', 3)], SCORED_ROWS)
+        self.assertEqual([False] * 5, core.suspicions['group'].tolist())
+        self.assertSameAsFullRun(dataset, core)
+
+    def test_new_classifier_scores_everything(self):
+        self.run_core(self.dataset)
+        SCORED_ROWS.clear()
+        self.settings.CLASSIFIERS['another'] = OddValueClassifier
+        self.run_core(self.dataset)
+        self.assertEqual([('odd', 5)], SCORED_ROWS)
+
+    def test_changed_model_scores_everything(self):
+        self.settings.CLASSIFIERS['mean'] = AboveMeanClassifier
+        self.run_core(self.dataset)
+        SCORED_ROWS.clear()
+
+        dataset = self.dataset.copy()
+        dataset.loc[4, 'value'] = 11
+        core = self.run_core(dataset)
+        # the odd and group models learn nothing from the data
+        self.assertEqual([('odd', 1), ('group', 1), ('mean', 5)], SCORED_ROWS)
+        self.assertEqual([False, False, False, True, True],
+                         core.suspicions['mean'].tolist())
+
+    def test_same_suspicions_as_a_full_run_after_data_changes(self):
+        dataset = chamber_of_deputies(20000)
+        self.settings = settings
+        self.run_core(dataset.iloc[:18000])
+
+        # models learn other clusters of companies and another speed threshold
+        dataset = dataset.copy()
+        dataset.loc[:999, 'net_value'] *= 10
+        self.assertSameAsFullRun(dataset, self.run_core(dataset))
+
+    def test_same_suspicions_as_a_full_run_after_rows_leave_groups(self):
+        dataset = chamber_of_deputies(20000)
+        self.settings = settings
+        core = self.run_core(dataset)
+        keys = ['applicant_id', 'month', 'year', 'subquota_number']
+        flagged = dataset[core.suspicions['over_monthly_subquota_limit'].values]
+        self.assertTrue(len(flagged))
+
+        # the first expense of each group over the limit is deleted, and the
+        # other expenses of one of these groups move to the next month
+        deleted = flagged.drop_duplicates(keys).index
+        moved = flagged[(flagged[keys] == flagged.iloc[0][keys]).all(axis=1)].index
+        moved = moved.difference(deleted)
+        dataset = dataset.drop(deleted)
+        dataset.loc[moved, 'month'] = dataset.loc[moved, 'month'] % 12 + 1
+        dataset = dataset.reset_index(drop=True)
+        self.assertSameAsFullRun(dataset, self.run_core(dataset))
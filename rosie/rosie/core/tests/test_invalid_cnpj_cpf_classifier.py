@@ -2,8 +2,9 @@ from unittest import TestCase
 
 import numpy as np
 import pandas as pd
+from brutils import cnpj, cpf
 
-from rosie.core.classifiers import InvalidCnpjCpfClassifier
+from rosie.core.classifiers import InvalidCnpjCpfClassifier, valid_cnpj_cpf
 
 
 class TestInvalidCnpjCpfClassifier(TestCase):
@@ -45,3 +46,20 @@ class TestInvalidCnpjCpfClassifier(TestCase):
 
     def test_transform(self):
         self.assertEqual(self.subject.transform(), self.subject)
+
+
+class TestValidCnpjCpf(TestCase):
+
+    def test_matches_brutils(self):
+        ids = [cpf.generate() for _ in range(100)] + \
+            [cnpj.generate() for _ in range(100)]
+        ids.extend([value[:-1] + '0' for value in ids])  # mostly invalid
+        ids.extend([value.lstrip('0') for value in ids])
+        ids.extend(('', '11111111111', '00000000000000', '123456789012345',
+                    '12.345.678', 'ABC', None, np.nan, 22472225000183))
+        expected = [cpf.validate(str(value).zfill(11)) or
+                    cnpj.validate(str(value).zfill(14)) for value in ids]
+        np.testing.assert_array_equal(expected, valid_cnpj_cpf(ids))
+
+    def test_empty(self):
+        self.assertEqual(0, len(valid_cnpj_cpf(pd.Series((), dtype=object))))
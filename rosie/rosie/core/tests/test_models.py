@@ -0,0 +1,206 @@
+import importlib
+import os
+import shutil
+import sys
+from pathlib import Path
+from tempfile import mkdtemp
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pandas as pd
+
+from rosie.benchmarks.synthetic import chamber_of_deputies
+from rosie.chamber_of_deputies.classifiers import (
+    MonthlySubquotaLimitClassifier,
+    TraveledSpeedsClassifier,
+)
+from rosie.core import Core
+from rosie.core.models import Fingerprint, ModelRegistry
+
+
+class MeanClassifier:
+    """Flags values above the mean of the ones it was fitted on."""
+
+    COLS = ['value']
+
+    def fit(self, X):
+        self.values = X['value'].values.copy()
+        self.mean = self.values.mean()
+        return self
+
+    def transform(self, X=None):
+        return self
+
+    def predict(self, X):
+        return (X['value'] > self.mean).values
+
+
+class AnotherClassifier(MeanClassifier):
+    pass
+
+
+class TestModelRegistry(TestCase):
+
+    def setUp(self):
+        self.temp_path = mkdtemp()
+        self.registry = ModelRegistry(os.path.join(self.temp_path, 'models'))
+        self.data = pd.DataFrame({'value': np.arange(10000, dtype=np.float)})
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_path)
+
+    def save(self, classifier, data):
+        path = self.registry.path(classifier, self.registry.fingerprint(data))
+        self.registry.save(classifier().fit(data), path, classifier)
+        return path
+
+    def test_version_depends_on_source_code(self):
+        self.assertEqual(ModelRegistry.version(MeanClassifier),
+                         ModelRegistry.version(MeanClassifier))
+        self.assertNotEqual(ModelRegistry.version(MeanClassifier),
+                            ModelRegistry.version(AnotherClassifier))
+
+    def test_version_depends_on_module_and_features(self):
+        modules = [module.__name__ for module in ModelRegistry.modules(TraveledSpeedsClassifier)]
+        self.assertEqual(['rosie.chamber_of_deputies.classifiers.traveled_speeds_classifier',
+                          'rosie.chamber_of_deputies.features',
+                          'rosie.core.features'], modules)
+
+        source = 'def double(value):\n    return value * {}\n\n\n' \
+                 'class Classifier:\n    pass\n'
+        path = Path(self.temp_path) / 'classifier_module.py'
+        path.write_text(source.format(2))
+        sys.path.insert(0, self.temp_path)
+        try:
+            module = importlib.import_module('classifier_module')
+            version = ModelRegistry.version(module.Classifier)
+            path.write_text(source.format(3))
+            module = importlib.reload(module)
+            self.assertNotEqual(version, ModelRegistry.version(module.Classifier))
+        finally:
+            sys.path.remove(self.temp_path)
+            sys.modules.pop('classifier_module', None)
+
+    def test_fingerprint_depends_on_data(self):
+        fingerprint = ModelRegistry.fingerprint(self.data)
+        self.assertEqual(fingerprint, ModelRegistry.fingerprint(self.data.copy()))
+        changed = self.data.copy()
+        changed.loc[42, 'value'] = -1
+        self.assertNotEqual(fingerprint, ModelRegistry.fingerprint(changed))
+        renamed = self.data.rename(columns={'value': 'other'})
+        self.assertNotEqual(fingerprint, ModelRegistry.fingerprint(renamed))
+
+    def test_fingerprint_of_parts_in_any_order(self):
+        fingerprint = Fingerprint()
+        for part in (self.data.iloc[50:], self.data.iloc[:50].iloc[::-1]):
+            fingerprint.update(part)
+        self.assertEqual(ModelRegistry.fingerprint(self.data), fingerprint.hexdigest())
+        duplicated = pd.concat([self.data, self.data.iloc[:1]])
+        self.assertNotEqual(fingerprint.hexdigest(), ModelRegistry.fingerprint(duplicated))
+
+    def test_load_memory_maps_arrays(self):
+        path = self.save(MeanClassifier, self.data)
+        model = self.registry.load(path)
+        self.assertIsInstance(model.values, np.memmap)
+        self.assertEqual(self.data['value'].mean(), model.mean)
+
+    def test_evicts_least_recently_used_models(self):
+        first = self.save(MeanClassifier, self.data)
+        second = self.save(MeanClassifier, self.data + 1)
+        os.utime(first, (0, 0))
+        os.utime(second, (1, 1))
+        self.registry.load(first)
+        third = self.save(MeanClassifier, self.data + 2)
+        self.assertEqual([third, first], self.registry.artifacts(MeanClassifier))
+
+    def test_evicts_models_of_the_same_classifier_only(self):
+        another = self.save(AnotherClassifier, self.data)
+        for offset in range(3):
+            self.save(MeanClassifier, self.data + offset)
+        self.assertEqual([another], self.registry.artifacts(AnotherClassifier))
+        self.assertEqual(2, len(self.registry.artifacts(MeanClassifier)))
+
+    def test_evicts_caches_of_other_versions(self):
+        other_version = Path(self.temp_path) / 'models' / 'meanclassifier-0.cache'
+        other_version.parent.mkdir()
+        other_version.touch()
+        current = Path(self.registry.cache_path(MeanClassifier))
+        current.touch()
+        self.save(MeanClassifier, self.data)
+        self.assertFalse(other_version.exists())
+        self.assertTrue(current.exists())
+
+    def test_evicts_legacy_models(self):
+        legacy = Path(self.temp_path) / 'meanclassifier.pkl'
+        legacy.touch()
+        self.save(MeanClassifier, self.data)
+        self.assertFalse(legacy.exists())
+
+
+class TestCoreModels(TestCase):
+
+    def setUp(self):
+        self.temp_path = mkdtemp()
+        self.settings = MagicMock()
+        self.settings.UNIQUE_IDS = ['id']
+        self.settings.CLASSIFIERS = {'mean': MeanClassifier}
+        self.adapter = MagicMock()
+        self.adapter.path = self.temp_path
+        self.adapter.dataset = pd.DataFrame({
+            'id': range(4),
+            'value': (1., 2., 3., 4.),
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_path)
+
+    def test_reuses_model_while_data_does_not_change(self):
+        Core(self.settings, self.adapter).load_trained_model(MeanClassifier)
+        with patch.object(MeanClassifier, 'fit') as fit:
+            model = Core(self.settings, self.adapter).load_trained_model(MeanClassifier)
+        fit.assert_not_called()
+        self.assertEqual(2.5, model.mean)
+
+    def test_refits_stale_model(self):
+        Core(self.settings, self.adapter).load_trained_model(MeanClassifier)
+        self.adapter.dataset = self.adapter.dataset.assign(value=(5., 6., 7., 8.))
+        model = Core(self.settings, self.adapter).load_trained_model(MeanClassifier)
+        self.assertEqual(6.5, model.mean)
+        self.assertEqual(2, len(os.listdir(os.path.join(self.temp_path, 'models'))))
+
+    def test_columns_not_used_by_the_classifier_do_not_matter(self):
+        core = Core(self.settings, self.adapter)
+        path = core.model_path(MeanClassifier)
+        self.adapter.dataset = self.adapter.dataset.assign(id=range(10, 14))
+        self.assertEqual(path, Core(self.settings, self.adapter).model_path(MeanClassifier))
+
+    def test_loaded_models_can_run_twice(self):
+        settings = MagicMock()
+        settings.UNIQUE_IDS = ['document_id']
+        classifier = MonthlySubquotaLimitClassifier
+        self.adapter.dataset = chamber_of_deputies(1000)
+        first = Core(settings, self.adapter).load_trained_model(classifier)
+        core = Core(settings, self.adapter)
+        second = core.load_trained_model(classifier)
+        np.testing.assert_array_equal(first.predict(core.dataset[classifier.COLS]),
+                                      second.predict(core.dataset[classifier.COLS]))
+
+    def test_distances_are_reused_by_later_runs(self):
+        settings = MagicMock()
+        settings.UNIQUE_IDS = ['document_id']
+        dataset = chamber_of_deputies(20000)
+        self.adapter.dataset = dataset
+        first = Core(settings, self.adapter).load_trained_model(TraveledSpeedsClassifier)
+        path = os.path.join(self.temp_path, 'models')
+        self.assertTrue(any(name.endswith('.cache') for name in os.listdir(path)))
+
+        # a run on part of the data fits a new model but measures no distance
+        self.adapter.dataset = dataset.iloc[:15000]
+        module = 'rosie.chamber_of_deputies.classifiers.traveled_speeds_classifier'
+        with patch(f'{module}.haversine') as measure:
+            core = Core(settings, self.adapter)
+            model = core.load_trained_model(TraveledSpeedsClassifier)
+            core.run_classifier(model)
+        measure.assert_not_called()
+        self.assertEqual(len(first.cache), len(model.cache))
@@ -0,0 +1,93 @@
+import lzma
+import os
+import shutil
+from tempfile import mkdtemp
+from unittest import TestCase
+from unittest.mock import patch
+
+import pandas as pd
+import zstandard
+
+from rosie.core import output
+
+
+class TestOutput(TestCase):
+
+    def setUp(self):
+        self.temp_path = mkdtemp()
+        self.suspicions = pd.DataFrame({
+            'applicant_id': [1, 2, 3, 4, 5],
+            'document_id': [10, 20, 30, 40, 50],
+            'year': [2018, 2018, 2019, 2019, 2019],
+            'meal_price_outlier': [True, False, False, True, False],
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_path)
+
+    def test_csv_xz(self):
+        path = output.save(self.suspicions, self.temp_path, 'csv.xz')
+        self.assertEqual(os.path.join(self.temp_path, 'suspicions.xz'), str(path))
+        pd.testing.assert_frame_equal(self.suspicions,
+                                      pd.read_csv(path, compression='xz'))
+
+    @patch('rosie.core.output.shutil.which', return_value=None)
+    def test_csv_xz_without_xz_command(self, _):
+        path = output.save(self.suspicions, self.temp_path, 'csv.xz')
+        with lzma.open(path) as fobj:
+            pd.testing.assert_frame_equal(self.suspicions, pd.read_csv(fobj))
+
+    def test_csv_zst(self):
+        path = output.save(self.suspicions, self.temp_path, 'csv.zst')
+        self.assertEqual(os.path.join(self.temp_path, 'suspicions.zst'), str(path))
+        with open(path, 'rb') as fobj:
+            reader = zstandard.ZstdDecompressor().stream_reader(fobj)
+            pd.testing.assert_frame_equal(self.suspicions, pd.read_csv(reader))
+
+    def test_parquet(self):
+        path = output.save(self.suspicions, self.temp_path, 'parquet')
+        self.assertEqual(os.path.join(self.temp_path, 'suspicions.parquet'), str(path))
+        pd.testing.assert_frame_equal(self.suspicions, pd.read_parquet(path))
+
+    def test_chunks(self):
+        chunks = [chunk for _, chunk in output.chunks(self.suspicions, 2)]
+        self.assertEqual([2, 2, 1], [len(chunk) for chunk in chunks])
+        csv = b''.join(output.csv_chunks(self.suspicions, 2)).decode('utf-8')
+        self.assertEqual(1, csv.count('document_id'))
+        self.assertEqual(6, len(csv.splitlines()))
+
+    def test_empty_dataset(self):
+        empty = self.suspicions.iloc[:0]
+        for output_format in output.WRITERS:
+            with self.subTest(output_format=output_format):
+                path = output.save(empty, self.temp_path, output_format)
+                self.assertTrue(os.path.exists(path))
+
+    def test_invalid_format(self):
+        with self.assertRaises(ValueError):
+            output.save(self.suspicions, self.temp_path, 'xlsx')
+
+    def test_writer_appends_data_frames(self):
+        first, second = self.suspicions.iloc[:2], self.suspicions.iloc[2:]
+        readers = {
+            'csv.xz': lambda path: pd.read_csv(path, compression='xz'),
+            'parquet': pd.read_parquet,
+        }
+        for output_format, read in readers.items():
+            with self.subTest(output_format=output_format):
+                with output.writer(self.temp_path, output_format) as suspicions:
+                    suspicions.write(first)
+                    suspicions.write(second)
+                pd.testing.assert_frame_equal(self.suspicions, read(suspicions.path))
+
+    def test_read(self):
+        for output_format in output.WRITERS:
+            with self.subTest(output_format=output_format):
+                output.save(self.suspicions, self.temp_path, output_format)
+                pd.testing.assert_frame_equal(self.suspicions,
+                                              output.read(self.temp_path, output_format))
+
+    def test_read_with_dtype(self):
+        output.save(self.suspicions, self.temp_path, 'csv.zst')
+        suspicions = output.read(self.temp_path, 'csv.zst', dtype={'applicant_id': str})
+        self.assertEqual(['1', '2', '3', '4', '5'], list(suspicions['applicant_id']))
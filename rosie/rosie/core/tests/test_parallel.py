@@ -0,0 +1,119 @@
+import os
+import shutil
+from collections import OrderedDict
+from tempfile import mkdtemp
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pandas as pd
+from sklearn.externals import joblib
+
+from rosie.benchmarks.synthetic import chamber_of_deputies
+from rosie.chamber_of_deputies import settings as chamber_of_deputies_settings
+from rosie.core import Core
+from rosie.core.parallel import ParallelRunner, Worker, shared
+from rosie.federal_senate import settings
+
+FIXTURE = os.path.join('rosie', 'core', 'tests', 'fixtures',
+                       'invalid_cnpj_cpf_classifier.csv')
+
+
+class TestParallelRunner(TestCase):
+
+    def setUp(self):
+        self.temp_path = mkdtemp()
+        self.adapter = MagicMock()
+        self.adapter.dataset = pd.read_csv(FIXTURE, dtype={'recipient_id': np.str})
+        self.adapter.path = self.temp_path
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_path)
+
+    def test_predictions_match_sequential_run(self):
+        sequential = Core(settings, self.adapter)
+        sequential.predict(sequential.load_trained_model(
+            settings.CLASSIFIERS['invalid_cnpj_cpf']), 'invalid_cnpj_cpf')
+
+        core = Core(settings, self.adapter, jobs=2)
+        predictions = ParallelRunner(core, 2)()
+        self.assertEqual(['invalid_cnpj_cpf'], list(predictions.keys()))
+        np.testing.assert_array_equal(
+            sequential.suspicions['invalid_cnpj_cpf'],
+            predictions['invalid_cnpj_cpf']
+        )
+
+    def test_shared_dataset_is_removed(self):
+        core = Core(settings, self.adapter, jobs=2)
+        ParallelRunner(core, 2)()
+        self.assertEqual(['models'], os.listdir(self.temp_path))
+
+    def test_workers_share_columns_read_by_classifiers(self):
+        core = Core(settings, self.adapter, jobs=2)
+        columns = ParallelRunner(core, 2).columns()
+        self.assertEqual(settings.CLASSIFIERS['invalid_cnpj_cpf'].COLS, columns)
+
+        path = os.path.join(self.temp_path, 'dataset.pkl')
+        joblib.dump(shared(core.dataset, columns), path)
+        dataset, converted = joblib.load(path, mmap_mode='r')
+        self.assertEqual(['document_type', 'recipient_id'], converted)
+        self.assertIsInstance(dataset['recipient_id'].values.codes, np.memmap)
+
+        worker = Worker(Core, settings, dataset, converted, self.temp_path)
+        classifier = settings.CLASSIFIERS['invalid_cnpj_cpf']
+        projection = worker.project(classifier)
+        self.assertEqual(np.object, projection['recipient_id'].dtype)
+        pd.testing.assert_frame_equal(core.project(classifier).reset_index(drop=True),
+                                      projection.reset_index(drop=True))
+        self.assertEqual(core.model_path(classifier), worker.model_path(classifier))
+        self.assertFalse(hasattr(worker, 'suspicions'))
+
+    @patch('rosie.core.ParallelRunner')
+    def test_columns_follow_settings_order(self, runner):
+        runner.return_value.return_value = {
+            'second': np.array((True, False, False)),
+            'first': np.array((False, True, False)),
+        }
+        settings_ = MagicMock()
+        settings_.UNIQUE_IDS = ['recipient_id']
+        settings_.CLASSIFIERS = OrderedDict((('first', 1), ('second', 2)))
+        core = Core(settings_, self.adapter, jobs=2)
+        core.suspicions = core.suspicions.head(3).copy()
+        core.predict_in_parallel()
+        runner.assert_called_once_with(core, 2)
+        self.assertEqual(['recipient_id', 'first', 'second'],
+                         core.suspicions.columns.tolist())
+
+
+class TestParallelRunnerWithPartitions(TestCase):
+
+    def setUp(self):
+        self.temp_path = mkdtemp()
+        self.adapter = MagicMock()
+        self.adapter.dataset = chamber_of_deputies(20000)
+        self.adapter.path = self.temp_path
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_path)
+
+    def test_tasks(self):
+        core = Core(chamber_of_deputies_settings, self.adapter, jobs=3)
+        tasks = list(ParallelRunner(core, 3).tasks())
+        self.assertIn(('meal_price_outlier', None, None), tasks)
+        for name in ('over_monthly_subquota_limit', 'suspicious_traveled_speed_day'):
+            with self.subTest(name=name):
+                self.assertEqual([(name, number, 3) for number in range(3)],
+                                 [task for task in tasks if task[0] == name])
+
+    def test_predictions_match_sequential_run(self):
+        sequential = Core(chamber_of_deputies_settings, self.adapter)
+        for name, classifier in chamber_of_deputies_settings.CLASSIFIERS.items():
+            sequential.predict(sequential.load_trained_model(classifier), name)
+
+        core = Core(chamber_of_deputies_settings, self.adapter, jobs=3)
+        predictions = ParallelRunner(core, 3)()
+        for name in chamber_of_deputies_settings.CLASSIFIERS:
+            with self.subTest(name=name):
+                core.add_suspicions(name, predictions[name])
+                pd.testing.assert_series_equal(sequential.suspicions[name],
+                                               core.suspicions[name])
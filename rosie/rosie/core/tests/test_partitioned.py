@@ -0,0 +1,159 @@
+import os
+import shutil
+from tempfile import mkdtemp
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pandas as pd
+from sklearn.externals import joblib
+
+from rosie.chamber_of_deputies import settings
+from rosie.core import Core
+from rosie.core.partitioned import PartitionedRunner
+
+
+def synthetic_dataset(rows=3000, seed=42):
+    random = np.random.RandomState(seed)
+    start = np.datetime64('2015-01-01')
+    days = random.randint(0, 700, rows)
+    issue_date = start + days * np.timedelta64(1, 'D')
+    legal_entities = ('409-0 - CANDIDATO A CARGO POLITICO ELETIVO', '')
+    return pd.DataFrame({
+        'applicant_id': random.randint(0, 10, rows).astype(str),
+        'category': random.choice(('Meal', 'Fuel'), rows),
+        'document_id': np.arange(rows),
+        'document_type': random.choice(('bill_of_sale', 'simple_receipt'), rows),
+        'is_party_expense': random.rand(rows) < .1,
+        'issue_date': issue_date,
+        'latitude': random.uniform(-30, 0, rows),
+        'legal_entity': random.choice(legal_entities, rows),
+        'longitude': random.uniform(-60, -40, rows),
+        'month': pd.DatetimeIndex(issue_date).month,
+        'net_value': random.gamma(2, 600, rows).round(2),
+        'recipient': random.choice(('Hotel X', 'Restaurant', 'Bar'), rows),
+        'recipient_id': random.choice(
+            [f'{number:014d}' for number in range(20)] + ['52998224725', '1'],
+            rows
+        ),
+        'situation': random.choice(('ABERTA', 'BAIXADA'), rows),
+        'situation_date': start + random.randint(0, 700, rows) * np.timedelta64(1, 'D'),
+        'subquota_number': random.choice(('3', '120', '13'), rows),
+        'year': pd.DatetimeIndex(issue_date).year,
+    })
+
+
+class FakeAdapter:
+
+    def __init__(self, path, dataset):
+        self.path = path
+        self.dataset = dataset
+        self.columns = None
+
+    def partitions(self, columns=None):
+        for _, df in self.dataset.groupby('year'):
+            yield df[columns] if columns else df
+
+
+class TestPartitionedRunner(TestCase):
+
+    def setUp(self):
+        self.temp_path = mkdtemp()
+        self.dataset = synthetic_dataset()
+        self.adapter = FakeAdapter(self.temp_path, self.dataset)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_path)
+
+    def read_suspicions(self):
+        path = os.path.join(self.temp_path, 'suspicions.parquet')
+        df = pd.read_parquet(path)
+        return df.sort_values('document_id').reset_index(drop=True)
+
+    def test_same_suspicions_as_loading_the_whole_dataset(self):
+        Core(settings, self.adapter, output_format='parquet')()
+        expected = self.read_suspicions()
+        Core(settings, self.adapter, output_format='parquet', partitions=4)()
+        pd.testing.assert_frame_equal(expected, self.read_suspicions())
+        for name in settings.CLASSIFIERS:
+            with self.subTest(name=name):
+                self.assertTrue(expected[name].any())
+
+    def test_fit_from_aggregates(self):
+        Core(settings, self.adapter, output_format='parquet', partitions=3)()
+        self.assertEqual(len(self.dataset), len(self.read_suspicions()))
+
+        classifier = settings.CLASSIFIERS['suspicious_traveled_speed_day']
+        core = Core(settings, self.adapter)
+        path, = core.models.artifacts(classifier)
+        model = joblib.load(path)
+        expected = classifier().fit(self.dataset)
+        self.assertAlmostEqual(expected.threshold, model.threshold)
+        np.testing.assert_allclose(expected.polynomial, model.polynomial)
+
+    def test_shares_models_with_runs_loading_the_whole_dataset(self):
+        Core(settings, self.adapter, output_format='parquet')()
+        core = Core(settings, self.adapter)
+        artifacts = {name: core.models.artifacts(classifier)
+                     for name, classifier in settings.CLASSIFIERS.items()}
+
+        core = Core(settings, self.adapter, output_format='parquet', partitions=3)
+        core()
+        for name, classifier in settings.CLASSIFIERS.items():
+            with self.subTest(name=name):
+                self.assertEqual(1, len(artifacts[name]))
+                self.assertEqual(artifacts[name], core.models.artifacts(classifier))
+        self.assertNotIn('fit', [step['step'] for step in core.profiler.steps])
+
+    @patch.object(PartitionedRunner, 'projection')
+    def test_fits_without_the_whole_dataset(self, projection):
+        core = Core(settings, self.adapter, output_format='parquet', partitions=3)
+        core()
+        fitted = [step['classifier'] for step in core.profiler.steps if step['step'] == 'fit']
+        self.assertEqual(sorted(classifier.__name__ for classifier in settings.CLASSIFIERS.values()),
+                         sorted(fitted))
+        projection.assert_not_called()
+
+    def test_fingerprints_projections_of_the_whole_dataset(self):
+        core = Core(settings, self.adapter, partitions=3)
+        runner = PartitionedRunner(core, 3)
+        runner.directory = self.temp_path
+        runner.split()
+        for name, classifier in settings.CLASSIFIERS.items():
+            with self.subTest(name=name):
+                projection = self.dataset[classifier.COLS]
+                self.assertEqual(core.models.fingerprint(projection),
+                                 runner.fingerprints[name])
+
+    def test_split(self):
+        core = Core(settings, self.adapter, partitions=3)
+        runner = PartitionedRunner(core, 3)
+        runner.directory = self.temp_path
+        runner.split()
+        partitions = [runner.read(partition) for partition in sorted(runner.files)]
+        self.assertEqual(len(self.dataset), sum(len(df) for df in partitions))
+        applicants = [set(df['applicant_id']) for df in partitions]
+        for index, current in enumerate(applicants):
+            for other in applicants[index + 1:]:
+                with self.subTest():
+                    self.assertFalse(current & other)
+
+    def test_requires_partition_key(self):
+        settings_ = MagicMock()
+        settings_.PARTITION_KEY = None
+        with self.assertRaises(ValueError):
+            Core(settings_, self.adapter, partitions=2)
+
+    def test_does_not_run_incrementally(self):
+        with self.assertRaises(ValueError):
+            Core(settings, self.adapter, incremental=True, partitions=2)
+
+    def test_requires_aggregate_for_groups_crossing_partitions(self):
+        classifier = MagicMock(spec=('GROUP_KEYS', 'COLS'))
+        classifier.GROUP_KEYS = ['recipient_id']
+        settings_ = MagicMock()
+        settings_.PARTITION_KEY = 'applicant_id'
+        settings_.UNIQUE_IDS = ['document_id']
+        settings_.CLASSIFIERS = {'classifier': classifier}
+        with self.assertRaises(ValueError):
+            Core(settings_, self.adapter, partitions=2)
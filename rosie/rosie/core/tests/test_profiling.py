@@ -0,0 +1,85 @@
+import json
+import os
+import shutil
+from tempfile import mkdtemp
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+import numpy as np
+import pandas as pd
+
+from rosie.core import Core
+from rosie.core.profiling import Profiler
+from rosie.federal_senate import settings
+
+FIXTURE = os.path.join('rosie', 'core', 'tests', 'fixtures',
+                       'invalid_cnpj_cpf_classifier.csv')
+
+
+class TestProfiler(TestCase):
+
+    def setUp(self):
+        self.temp_path = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_path)
+
+    def test_records_a_step(self):
+        profiler = Profiler()
+        with profiler('adapter', 'load', rows_in=3) as step:
+            step['rows_out'] = 2
+
+        record, *_ = profiler.steps
+        self.assertEqual('adapter', record['stage'])
+        self.assertEqual('load', record['step'])
+        self.assertEqual(3, record['rows_in'])
+        self.assertEqual(2, record['rows_out'])
+        self.assertNotIn('classifier', record)
+        for key in ('wall_time', 'cpu_time', 'peak_rss_mb', 'peak_rss_delta_mb'):
+            with self.subTest():
+                self.assertGreaterEqual(record[key], 0)
+
+    def test_records_a_step_even_when_it_fails(self):
+        profiler = Profiler()
+        with self.assertRaises(ValueError):
+            with profiler('classifier', 'fit', 'MyClassifier'):
+                raise ValueError()
+        self.assertEqual('MyClassifier', profiler.steps[0]['classifier'])
+
+    def test_records_a_feature_step(self):
+        profiler = Profiler()
+        with profiler('feature', 'compute', feature='is_meal', rows_in=3):
+            pass
+        self.assertEqual('is_meal', profiler.steps[0]['feature'])
+        self.assertNotIn('classifier', profiler.steps[0])
+
+    def test_save(self):
+        profiler = Profiler()
+        with profiler('output', 'save'):
+            pass
+        path = os.path.join(self.temp_path, 'report.json')
+        profiler.save(path)
+        with open(path) as fobj:
+            report = json.load(fobj)
+        self.assertIn('started_at', report)
+        self.assertEqual(['output'], [step['stage'] for step in report['steps']])
+
+    def test_core_records_each_classifier_step(self):
+        adapter = MagicMock()
+        adapter.dataset = pd.read_csv(FIXTURE, dtype={'recipient_id': np.str})
+        adapter.path = self.temp_path
+        profiler = Profiler()
+        Core(settings, adapter, profiler=profiler)()
+
+        steps = [(step['stage'], step['step']) for step in profiler.steps]
+        self.assertEqual([
+            ('classifier', 'fingerprint'),
+            ('classifier', 'fit'),
+            ('classifier', 'transform'),
+            ('classifier', 'predict'),
+            ('output', 'save'),
+        ], steps)
+        predict = profiler.steps[3]
+        self.assertEqual('InvalidCnpjCpfClassifier', predict['classifier'])
+        self.assertEqual(9, predict['rows_in'])
+        self.assertEqual(9, predict['rows_out'])
@@ -0,0 +1,134 @@
+import json
+import os
+import shutil
+import socket
+from http.client import HTTPConnection
+from tempfile import mkdtemp
+from threading import Thread
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+import numpy as np
+import pandas as pd
+
+from rosie.benchmarks.synthetic import chamber_of_deputies
+from rosie.chamber_of_deputies import settings
+from rosie.core import Core
+from rosie.core.serving import GroupIndex, Scorer, server
+
+
+class UnixHTTPConnection(HTTPConnection):
+
+    def __init__(self, path):
+        super().__init__('localhost')
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+
+def records(df):
+    return json.loads(df.to_json(orient='records', date_format='iso'))
+
+
+class TestGroupIndex(TestCase):
+
+    def test_rows(self):
+        df = pd.DataFrame({'applicant_id': ['a', 'b', 'a', 'c', 'b'],
+                           'month': [1, 1, 1, 1, 2]})
+        index = GroupIndex(df, ['applicant_id', 'month'])
+        other = pd.DataFrame({'applicant_id': ['a', 'b', 'a', 'd'],
+                              'month': [1, 2, 1, 1]})
+        np.testing.assert_array_equal((0, 2, 4), index.rows(other))
+        np.testing.assert_array_equal((), index.rows(other.iloc[3:]))
+
+
+class TestScorer(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_path = mkdtemp()
+        cls.dataset = chamber_of_deputies(20000)
+        # the last rows are new reimbursements, submitted to the scorer
+        cls.known, cls.new = cls.dataset.iloc[:-200], cls.dataset.iloc[-200:]
+        adapter = MagicMock()
+        adapter.path = cls.temp_path
+        adapter.dataset = cls.known.copy()
+        cls.core = Core(settings, adapter)
+        cls.scorer = Scorer(cls.core)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.temp_path)
+
+    def expected(self, dataset, rows):
+        """Predictions of the same models in a run on the dataset."""
+        adapter = MagicMock()
+        adapter.path = self.temp_path
+        adapter.dataset = dataset
+        core = Core(settings, adapter)
+        for name, model in self.scorer.models.items():
+            core.add_suspicions(name, core.run_classifier(model))
+        return core.suspicions.iloc[-rows:].reset_index(drop=True)
+
+    def assertSuspicions(self, expected, suspicions):
+        self.assertEqual(list(expected.columns), list(suspicions.columns))
+        for name in settings.CLASSIFIERS:
+            with self.subTest(classifier=name):
+                np.testing.assert_array_equal(expected[name].values,
+                                              suspicions[name].values)
+
+    def test_same_suspicions_as_a_whole_run(self):
+        expected = self.expected(self.dataset, 200)
+        rows = self.new.drop(columns=settings.COMPANY_COLUMNS)
+        suspicions = self.scorer(records(rows))
+        self.assertSuspicions(expected, suspicions)
+        self.assertTrue(suspicions[list(settings.CLASSIFIERS)].values.any())
+
+    def test_resubmitted_rows_are_not_counted_twice(self):
+        expected = self.expected(self.known, 300)
+        suspicions = self.scorer(records(self.known.iloc[-300:]))
+        self.assertSuspicions(expected, suspicions)
+
+    def test_missing_columns(self):
+        with self.assertRaises(KeyError):
+            self.scorer([{'applicant_id': '1', 'year': 2017, 'document_id': 1}])
+
+    def test_server(self):
+        path = os.path.join(self.temp_path, 'rosie.sock')
+        for address in ({'port': 0}, {'socket': path}):
+            with self.subTest(address=address):
+                httpd = server(self.scorer, **address)
+                thread = Thread(target=httpd.serve_forever)
+                thread.start()
+                try:
+                    if 'socket' in address:
+                        connection = UnixHTTPConnection(path)
+                    else:
+                        connection = HTTPConnection('127.0.0.1', httpd.server_address[1])
+
+                    connection.request('GET', '/')
+                    response = connection.getresponse()
+                    status = json.loads(response.read())
+                    self.assertEqual(200, response.status)
+                    self.assertEqual(len(self.known), status['rows'])
+
+                    body = json.dumps(records(self.new.iloc[:3]))
+                    connection.request('POST', '/score', body)
+                    response = connection.getresponse()
+                    content = json.loads(response.read())
+                    self.assertEqual(200, response.status)
+                    self.assertEqual(3, len(content['suspicions']))
+                    self.assertEqual(set(settings.UNIQUE_IDS) | set(settings.CLASSIFIERS),
+                                     set(content['suspicions'][0]))
+
+                    connection.request('POST', '/score', '{"rows": []}')
+                    response = connection.getresponse()
+                    self.assertEqual(400, response.status)
+                    self.assertIn('error', json.loads(response.read()))
+                    connection.close()
+                finally:
+                    httpd.shutdown()
+                    httpd.server_close()
+                    thread.join()
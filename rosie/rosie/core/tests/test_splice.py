@@ -0,0 +1,133 @@
+import os
+import shutil
+from tempfile import mkdtemp
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+import pandas as pd
+
+from rosie.core import Core, output
+from rosie.core.incremental import IncrementalRunner
+
+
+class ThresholdClassifier:
+    """Flags values above a threshold."""
+
+    COLS = ['value']
+    THRESHOLD = 2
+
+    def fit(self, X):
+        return self
+
+    def transform(self, X=None):
+        return self
+
+    def predict(self, X):
+        return (X['value'] > self.THRESHOLD).values
+
+
+class ParityClassifier(ThresholdClassifier):
+    """Flags odd numbers of items."""
+
+    COLS = ['items']
+
+    def predict(self, X):
+        return (X['items'] % 2 == 1).values
+
+
+class TestSpliceRunner(TestCase):
+
+    def setUp(self):
+        self.temp_path = mkdtemp()
+        self.settings = MagicMock()
+        self.settings.UNIQUE_IDS = ['applicant_id', 'document_id']
+        self.settings.CLASSIFIERS = {
+            'above_threshold': ThresholdClassifier,
+            'odd_items': ParityClassifier,
+        }
+        self.adapter = MagicMock()
+        self.adapter.path = self.temp_path
+        self.adapter.dataset = pd.DataFrame({
+            'applicant_id': ['001', '002', '003', '004'],
+            'document_id': [10, 20, 30, 40],
+            'value': [1., 2., 3., 4.],
+            'items': [1, 2, 3, 4],
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_path)
+        ThresholdClassifier.THRESHOLD = 2
+
+    def run_core(self, **kwargs):
+        Core(self.settings, self.adapter, **kwargs)()
+
+    def test_replaces_the_column_of_the_classifier(self):
+        for output_format in output.WRITERS:
+            with self.subTest(output_format=output_format):
+                self.run_core(output_format=output_format)
+                ThresholdClassifier.THRESHOLD = 0
+                self.run_core(output_format=output_format, only='above_threshold')
+                suspicions = output.read(self.temp_path, output_format,
+                                         {'applicant_id': str})
+                self.assertEqual(['applicant_id', 'document_id', 'above_threshold', 'odd_items'],
+                                 list(suspicions.columns))
+                self.assertEqual(['001', '002', '003', '004'],
+                                 list(suspicions['applicant_id']))
+                self.assertEqual([True] * 4, list(suspicions['above_threshold']))
+                self.assertEqual([True, False, True, False], list(suspicions['odd_items']))
+                ThresholdClassifier.THRESHOLD = 2
+
+    def test_reads_only_the_columns_of_the_classifier(self):
+        core = Core(self.settings, self.adapter, only='odd_items')
+        self.assertEqual(['applicant_id', 'document_id', 'items'], core.columns())
+
+    def test_rows_are_matched_by_unique_ids(self):
+        self.run_core()
+        # a reimbursement left and another arrived since the previous run
+        new = pd.DataFrame({'applicant_id': ['005'], 'document_id': [50],
+                            'value': [5.], 'items': [5]})
+        self.adapter.dataset = pd.concat([self.adapter.dataset.iloc[::-1].iloc[1:], new])
+        ThresholdClassifier.THRESHOLD = 0
+        self.run_core(only='above_threshold')
+        suspicions = output.read(self.temp_path, dtype={'applicant_id': str})
+        self.assertEqual(['001', '002', '003', '004'], list(suspicions['applicant_id']))
+        self.assertEqual([True, True, True, True], list(suspicions['above_threshold']))
+
+        ThresholdClassifier.THRESHOLD = 10
+        self.adapter.dataset = self.adapter.dataset.iloc[1:]
+        self.run_core(only='above_threshold')
+        suspicions = output.read(self.temp_path, dtype={'applicant_id': str})
+        # 003 is missing from the dataset now, it keeps its previous value
+        self.assertEqual([False, False, True, True], list(suspicions['above_threshold']))
+
+    def test_adds_a_new_classifier(self):
+        self.settings.CLASSIFIERS = {'odd_items': ParityClassifier}
+        self.run_core()
+        self.settings.CLASSIFIERS['above_threshold'] = ThresholdClassifier
+        self.run_core(only='above_threshold')
+        suspicions = output.read(self.temp_path)
+        self.assertEqual([False, False, True, True], list(suspicions['above_threshold']))
+
+    def test_patches_the_incremental_index(self):
+        self.run_core(incremental=True)
+        ThresholdClassifier.THRESHOLD = 0
+        self.run_core(only='above_threshold')
+        index, _ = IncrementalRunner.read(os.path.join(self.temp_path, IncrementalRunner.FILENAME))
+        self.assertEqual([True] * 4, list(index['above_threshold']))
+
+        self.run_core(incremental=True)
+        suspicions = output.read(self.temp_path)
+        self.assertEqual([True] * 4, list(suspicions['above_threshold']))
+
+    def test_requires_a_previous_run(self):
+        with self.assertRaises(FileNotFoundError):
+            self.run_core(only='above_threshold')
+
+    def test_unknown_classifier(self):
+        with self.assertRaises(ValueError):
+            Core(self.settings, self.adapter, only='unknown')
+
+    def test_requires_unique_ids(self):
+        self.settings.UNIQUE_IDS = None
+        with self.assertRaises(ValueError):
+            Core(self.settings, self.adapter, only='odd_items')
@@ -1,9 +1,23 @@
 from rosie.federal_senate import settings
 from rosie.federal_senate.adapter import Adapter
 from rosie.core import Core
+from rosie.core.profiling import Profiler
+from rosie.core.serving import serve as serve_core
 
 
-def main(target_directory='/tmp/serenata-data'):
-    adapter = Adapter(target_directory)
-    core = Core(settings, adapter)
-    core()
\ No newline at end of file
+def main(target_directory='/tmp/serenata-data', jobs=1, incremental=False,
+         profile=None, output_format='csv.xz', partitions=None, offline=False,
+         only=None):
+    profiler = Profiler()
+    adapter = Adapter(target_directory, profiler, offline)
+    core = Core(settings, adapter, jobs, incremental, profiler, output_format,
+                partitions, only)
+    core()
+    if profile:
+        profiler.save(profile)
+
+
+def serve(target_directory='/tmp/serenata-data', offline=False, port=None,
+          socket=None):
+    adapter = Adapter(target_directory, offline=offline)
+    serve_core(Core(settings, adapter), port, socket)
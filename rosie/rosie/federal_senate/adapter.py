@@ -1,10 +1,19 @@
+import logging
 import os
+from datetime import date
+from urllib.error import URLError
 
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+from pandas.api.types import is_numeric_dtype
+from pyarrow import feather
 
 from serenata_toolbox.federal_senate.dataset import Dataset
 
+from rosie.core.downloads import Manifest, download
+from rosie.core.profiling import Profiler
+
 COLUMNS = {
     'net_value': 'reimbursement_value',
     'recipient_id': 'cnpj_cpf',
@@ -14,14 +23,42 @@ COLUMNS = {
 
 class Adapter:
 
-    def __init__(self, path):
+    STARTING_YEAR = 2008
+    DATASET = 'federal-senate-reimbursements.feather'
+    MANIFEST = 'manifest.json'
+    CATEGORIES = ('congressperson_name', 'expense_type')
+
+    def __init__(self, path, profiler=None, offline=False):
         self.path = path
+        self.log = logging.getLogger(__name__)
+        self.profiler = profiler or Profiler()
+        self.offline = offline
+        self._dataset = None
 
     @property
     def dataset(self):
-        path = self.update_datasets()
-        self._dataset = pd.read_csv(path, dtype={'cnpj_cpf': np.str}, encoding='utf-8')
-        self.prepare_dataset()
+        if self._dataset is not None:
+            return self._dataset
+
+        path = os.path.join(self.path, self.DATASET)
+        if self.offline:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f'Cannot run offline, missing {path}')
+        else:
+            with self.profiler('adapter', 'update'):
+                try:
+                    path = self.update_datasets()
+                except URLError as error:
+                    if not os.path.exists(path):
+                        raise
+                    self.log.error(f'Could not update datasets ({error.reason}), '
+                                   f'using previously downloaded files')
+        with self.profiler('adapter', 'load') as step:
+            self._dataset = self.read_dataset(path)
+            step['rows_out'] = len(self._dataset)
+        with self.profiler('adapter', 'prepare', rows_in=len(self._dataset)) as step:
+            self.prepare_dataset()
+            step['rows_out'] = len(self._dataset)
         return self._dataset
 
     def prepare_dataset(self):
@@ -30,7 +67,8 @@ class Adapter:
         self.create_columns()
 
     def drop_null_cnpj_cpf(self):
-        self._dataset[self._dataset['cnpj_cpf'].notnull()]
+        self._dataset.dropna(subset=['cnpj_cpf'], inplace=True)
+        self._dataset.reset_index(drop=True, inplace=True)
 
     def rename_columns(self):
         columns = {v: k for k, v in COLUMNS.items()}
@@ -41,11 +79,104 @@ class Adapter:
         # is required by Rosie's core module, so we add all of them as 'unknown'
         self._dataset['document_type'] = 'unknown'
 
+    def years(self):
+        return list(range(self.STARTING_YEAR, date.today().year + 1))
+
+    def url(self, year):
+        return Dataset.URL.format(year)
+
     def update_datasets(self):
+        """
+        Fetches, translates and cleans the reimbursements, skipping each
+        stage when its inputs did not change: only years whose downloaded
+        file changed (see `rosie.core.downloads`) are translated again, and
+        the cleaned dataset is only rebuilt if some year changed. Returns
+        the path to the cleaned dataset.
+        """
         os.makedirs(self.path, exist_ok=True)
-        federal_senate = Dataset(self.path)
-        federal_senate.fetch()
-        federal_senate.translate()
-        federal_senate_reimbursements_path = federal_senate.clean()
+        manifest = Manifest(os.path.join(self.path, self.MANIFEST))
+        changed = self.fetch(manifest)
+
+        translate = set(changed) | {
+            year for year in self.years()
+            if not os.path.exists(self.year_path(year, 'xz'))
+        }
+        if translate:
+            self.log.info(f'Translating reimbursements from {sorted(translate)}')
+            Dataset(self.path, years=sorted(translate)).translate()
+
+        path = os.path.join(self.path, self.DATASET)
+        if translate or not os.path.exists(path):
+            self.clean(path)
+        else:
+            self.log.info('Federal Senate reimbursements are up to date')
+
+        # entries are saved at last so a failure in any stage repeats it
+        for year, entry in changed.items():
+            manifest.update(os.path.basename(self.year_path(year, 'csv')), entry)
+        return path
+
+    def year_path(self, year, extension):
+        return os.path.join(self.path, f'federal-senate-{year}.{extension}')
+
+    def fetch(self, manifest):
+        """Downloads each year and returns the entries of the changed ones."""
+        changed = {}
+        for year in self.years():
+            self.log.info(f'Updating reimbursements from {year}')
+            path = self.year_path(year, 'csv')
+            entry, is_changed = download(self.url(year), path,
+                                         manifest.get(os.path.basename(path)))
+            if is_changed:
+                changed[year] = entry
+        return changed
+
+    def clean(self, path):
+        """Merges the translated years and saves them as a typed dataset."""
+        self.log.info('Cleaning Federal Senate reimbursements')
+        df = pd.concat(
+            (pd.read_csv(self.year_path(year, 'xz'), dtype={'cnpj_cpf': np.str},
+                         encoding='utf-8')
+             for year in self.years()),
+            ignore_index=True,
+            sort=False
+        )
+        self.write_dataset(df, path)
+
+    def write_dataset(self, df, path):
+        """
+        Saves the cleaned reimbursements as a Feather file, with dates,
+        numbers and categories parsed once, instead of at every run.
+        """
+        df['date'] = pd.to_datetime(df['date'], errors='coerce')
+        df['cnpj_cpf'] = df['cnpj_cpf'].str.replace(r'\D', '')
+        df['reimbursement_value'] = self.parse_values(df['reimbursement_value'])
+        for column in ('year', 'month'):
+            df[column] = pd.to_numeric(df[column], downcast='integer')
+        for column in self.CATEGORIES:
+            df[column] = df[column].astype('category')
+        for column in df.columns[df.dtypes == np.object]:
+            df[column] = df[column].where(df[column].isnull(), df[column].astype(np.str))
+
+        df.reset_index(drop=True).to_feather(path)
+        return path
+
+    @staticmethod
+    def parse_values(values):
+        """
+        Reimbursement values as floats. The Federal Senate writes them in
+        Brazilian format (e.g. `1.234,56`), thus in values with a decimal
+        comma dots are thousands separators.
+        """
+        if is_numeric_dtype(values):
+            return values
+
+        text = values.astype(np.str)
+        decimal_comma = text.str.contains(',', regex=False)
+        brazilian = text.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+        return pd.to_numeric(text.where(~decimal_comma, brazilian), errors='coerce')
 
-        return federal_senate_reimbursements_path
+    @staticmethod
+    def read_dataset(path):
+        """Reads the cleaned reimbursements through a memory map."""
+        return feather.read_table(pa.memory_map(path)).to_pandas()
@@ -5,8 +5,11 @@ from unittest import TestCase
 from unittest.mock import patch
 
 import pandas as pd
+from freezegun import freeze_time
+from serenata_toolbox.federal_senate.dataset import Dataset
 
 from rosie.federal_senate.adapter import COLUMNS as ADAPTER_COLUMNS
+from rosie.core.tests.server import LocalServer
 from rosie.federal_senate.adapter import Adapter as subject_class
 
 FIXTURE_PATH = os.path.join('rosie',
@@ -20,10 +23,13 @@ class TestAdapter(TestCase):
 
     def setUp(self):
         self.temp_path = mkdtemp()
-        subject = subject_class(self.temp_path)
+        self.subject = subject_class(self.temp_path)
+        self.path = os.path.join(self.temp_path, subject_class.DATASET)
+        fixture = pd.read_csv(FIXTURE_PATH, dtype={'cnpj_cpf': str})
+        self.subject.write_dataset(fixture, self.path)
         with patch.object(subject_class, 'update_datasets') as mocked_update:
-            mocked_update.return_value = FIXTURE_PATH
-            self.dataset = subject.dataset
+            mocked_update.return_value = self.path
+            self.dataset = self.subject.dataset
 
     def tearDown(self):
         shutil.rmtree(self.temp_path)
@@ -44,3 +50,105 @@ class TestAdapter(TestCase):
 
     def test_droped_all_null_values(self):
         self.assertTrue(self.dataset['recipient_id'].all())
+        self.assertFalse(self.dataset['recipient_id'].isnull().any())
+        self.assertEqual(20, len(self.dataset))
+        self.assertEqual(list(range(20)), self.dataset.index.tolist())
+
+    def test_typed_dataset(self):
+        self.assertEqual('datetime64[ns]', self.dataset['date'].dtype.name)
+        self.assertEqual('float64', self.dataset['net_value'].dtype.name)
+        self.assertEqual('category', self.dataset['expense_type'].dtype.name)
+        self.assertIn(319.43, self.dataset['net_value'].tolist())
+
+    def test_parse_values(self):
+        values = pd.Series(['1.234,56', '300,00', '12.345.678,90', '42', None])
+        self.assertEqual([1234.56, 300., 12345678.9, 42.],
+                         subject_class.parse_values(values).dropna().tolist())
+        self.assertTrue(subject_class.parse_values(values).isnull()[4])
+        numbers = pd.Series([319.43, 1234.5])
+        self.assertIs(numbers, subject_class.parse_values(numbers))
+
+    @patch.object(subject_class, 'update_datasets')
+    def test_dataset_is_memoized(self, mocked_update):
+        self.assertIs(self.dataset, self.subject.dataset)
+        mocked_update.assert_not_called()
+
+    @patch.object(subject_class, 'update_datasets')
+    def test_offline(self, mocked_update):
+        subject = subject_class(self.temp_path, offline=True)
+        self.assertEqual(len(self.dataset), len(subject.dataset))
+        mocked_update.assert_not_called()
+
+    def test_offline_without_downloaded_dataset(self):
+        os.remove(self.path)
+        subject = subject_class(self.temp_path, offline=True)
+        with self.assertRaises(FileNotFoundError):
+            subject.dataset
+
+
+def raw_csv(year, value='300,00'):
+    lines = (
+        'ULTIMA ATUALIZACAO;01/01/2019',
+        'ANO;MES;SENADOR;TIPO_DESPESA;CNPJ_CPF;FORNECEDOR;DOCUMENTO;DATA;DETALHAMENTO;VALOR_REEMBOLSADO',
+        f'{year};1;FULANO;Divulgação da atividade parlamentar;08.509.060/0001-46;Editora;214;05/01/{year};;{value}',
+        f'{year};2;FULANO;Divulgação da atividade parlamentar;;Editora;215;05/02/{year};;10,50',
+    )
+    return '\n'.join(lines).encode('ISO-8859-1')
+
+
+class TestUpdate(TestCase):
+
+    def setUp(self):
+        self.temp_path = mkdtemp()
+        self.files = {f'/{year}.csv': raw_csv(year) for year in (2008, 2009)}
+        self.files['/2009.csv'] = raw_csv(2009, '1.300,00')
+        self.subject = subject_class(self.temp_path)
+        self.subject.log.disabled = True
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_path)
+
+    def update(self, server):
+        def url(year):
+            return server.url(f'/{year}.csv')
+
+        with patch.object(self.subject, 'url', url), \
+                patch.object(Dataset, 'translate', autospec=True,
+                             side_effect=Dataset.translate) as translate, \
+                patch.object(subject_class, 'clean', autospec=True,
+                             side_effect=subject_class.clean) as clean:
+            path = self.subject.update_datasets()
+        return path, translate, clean
+
+    @freeze_time('2009-06-01')
+    def test_update(self):
+        with LocalServer(self.files) as server:
+            path, translate, clean = self.update(server)
+        translate.assert_called_once()
+        self.assertEqual([2008, 2009], translate.call_args[0][0].years)
+        clean.assert_called_once()
+        df = subject_class.read_dataset(path)
+        self.assertEqual(4, len(df))
+        self.assertEqual([300., 10.5, 1300., 10.5], df['reimbursement_value'].tolist())
+        self.assertEqual('08509060000146', df['cnpj_cpf'][0])
+
+    @freeze_time('2009-06-01')
+    def test_update_skips_unchanged_stages(self):
+        with LocalServer(self.files) as server:
+            self.update(server)
+            path, translate, clean = self.update(server)
+        translate.assert_not_called()
+        clean.assert_not_called()
+        self.assertEqual(2, len(server.paths(304)))
+        self.assertEqual(4, len(subject_class.read_dataset(path)))
+
+    @freeze_time('2009-06-01')
+    def test_update_changed_year(self):
+        with LocalServer(self.files, conditional=False) as server:
+            self.update(server)
+            self.files['/2009.csv'] = raw_csv(2009, '42,00')
+            path, translate, clean = self.update(server)
+        translate.assert_called_once()
+        self.assertEqual([2009], translate.call_args[0][0].years)
+        clean.assert_called_once()
+        self.assertIn(42., subject_class.read_dataset(path)['reimbursement_value'].tolist())